@@ -0,0 +1,772 @@
+"""
+Dashboard transforms: the pure pandas side of app.py (no Streamlit, no DB),
+so the same code can be imported by benchmark.py.
+"""
+import re
+import difflib
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+
+# =========================================================
+# HELPERS
+# =========================================================
+def _to_float_rm(x):
+    """Cleans currency strings like 'RM 1,200.00' to float."""
+    s = str(x or "").strip()
+    s = s.replace("RM", "").replace(",", "").strip()
+    try:
+        return float(s) if s else 0.0
+    except:
+        return 0.0
+
+def create_display_name(df):
+    """Combines Code + Name into the one display column the UI keys on."""
+    if not df.empty and "project_code" in df.columns and "project_name" in df.columns:
+        # Handle potential None/NaN values
+        code = df["project_code"].fillna("")
+        name = df["project_name"].fillna("")
+        return code + " " + name
+    return ""
+
+def compact_frame(df, categorical=(), whole_money=(), rates=(), drop=()):
+    """
+    Shrinks a frame before it goes into the cache (st.cache_data copies it on
+    every hit): drops unused columns, low-cardinality text -> category, money
+    shown as whole RM -> int64, rates -> float32, other integers -> smallest int.
+    Memory before/after is kept in df.attrs["memory"] for the debug panel.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    df = df.drop(columns=[c for c in drop if c in df.columns])
+    for col in df.columns:
+        if col in categorical:
+            df[col] = df[col].astype("category")
+        elif col in whole_money:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).round().astype("int64")
+        elif col in rates:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+        elif pd.api.types.is_integer_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    df.attrs["memory"] = (before, int(df.memory_usage(deep=True).sum()))
+    return df
+
+def get_last_sync(df_list):
+    """Finds the latest scraped timestamp across all dataframes."""
+    times = []
+    for df in df_list:
+        if df is None or df.empty:
+            continue
+        # Check both naming conventions just in case
+        for col in ["scraped_timestamp", "Scraped_Timestamp", "scraped_date", "Scraped_Date"]:
+            if col in df.columns:
+                t = pd.to_datetime(df[col], errors="coerce")
+                times.append(t.max())
+                break
+    times = [x for x in times if pd.notna(x)]
+    return max(times) if times else None
+
+def get_pemaju_list(df_master):
+    """Extracts unique developer names."""
+    # Check for English column name first, then fallback
+    if "pemaju_name" in df_master.columns:
+        return sorted(df_master["pemaju_name"].dropna().unique().tolist())
+    elif "Pemaju" in df_master.columns:
+        return sorted(df_master["Pemaju"].dropna().unique().tolist())
+    return []
+
+
+# =========================================================
+# PROJECT OVERVIEW & KPIs
+# =========================================================
+# Project overview aggregated in the database: one row per (developer, project)
+# from each project's latest snapshot, instead of shipping every unit row to pandas.
+# Used when the publisher's project_summary table is not there yet; mirrors
+# build_project_overview (the last-resort fallback for the untyped text schema).
+SOLD_SQL = "(u.status_lc LIKE '%telah dijual%' OR u.status_lc LIKE '%sold%')"
+
+PROJECT_OVERVIEW_SQL = f"""
+WITH latest_dates AS (
+    SELECT project_code, MAX(scraped_date) AS scraped_date
+    FROM units_detail
+    GROUP BY project_code
+),
+units AS (
+    SELECT
+        d.pemaju_name,
+        COALESCE(d.project_code, '') || ' ' || COALESCE(d.project_name, '') AS project_label,
+        d.unit_no,
+        LOWER(COALESCE(d.status, '')) AS status_lc,
+        d.price_sales,
+        LOWER(TRIM(COALESCE(d.bumi_quota, ''))) AS bumi_lc
+    FROM units_detail d
+    JOIN latest_dates l ON l.project_code = d.project_code AND l.scraped_date = d.scraped_date
+    WHERE d.pemaju_name IS NOT NULL
+),
+latest_master AS (
+    SELECT project_label, location_district, location_state, status_overall
+    FROM (
+        SELECT
+            COALESCE(project_code, '') || ' ' || COALESCE(project_name, '') AS project_label,
+            location_district, location_state, status_overall,
+            ROW_NUMBER() OVER (PARTITION BY project_code, project_name ORDER BY scraped_timestamp DESC) AS rn
+        FROM projects_master
+    ) m
+    WHERE rn = 1
+)
+SELECT
+    u.pemaju_name AS "Pemaju",
+    u.project_label AS "Kod Projek & Nama Projek",
+    m.status_overall AS "Status Projek",
+    COUNT(u.unit_no) AS "Total Unit",
+    SUM(CASE WHEN {SOLD_SQL} THEN 1 ELSE 0 END) AS "Unit Terjual",
+    SUM(CASE WHEN u.status_lc LIKE '%belum dijual%' OR u.status_lc LIKE '%unsold%' THEN 1 ELSE 0 END) AS "Unit Belum Jual",
+    SUM(CASE WHEN {SOLD_SQL} THEN COALESCE(u.price_sales, 0) ELSE 0 END) AS "Jumlah Jualan (RM)",
+    SUM(CASE WHEN u.bumi_lc = 'ya' THEN 1 ELSE 0 END) AS "Unit Bumi",
+    m.location_district AS "Daerah",
+    m.location_state AS "Negeri"
+FROM units u
+LEFT JOIN latest_master m ON m.project_label = u.project_label
+GROUP BY u.pemaju_name, u.project_label, m.status_overall, m.location_district, m.location_state;
+"""
+
+# project_summary (materialized by publish_data.py) -> overview UI headers
+PROJECT_SUMMARY_COLUMNS = {
+    "pemaju_name": "Pemaju",
+    "status_overall": "Status Projek",
+    "total_units": "Total Unit",
+    "units_sold": "Unit Terjual",
+    "units_unsold": "Unit Belum Jual",
+    "sales_value": "Jumlah Jualan (RM)",
+    "units_bumi": "Unit Bumi",
+    "location_district": "Daerah",
+    "location_state": "Negeri",
+}
+
+def build_project_overview(df_master_all: pd.DataFrame, df_units_all: pd.DataFrame):
+    """
+    Aggregates unit-level data into project-level statistics.
+    Now includes 'status_overall' from the master table.
+    """
+    if df_units_all is None or df_units_all.empty:
+        # Return empty structure with expected headers
+        return pd.DataFrame(columns=["No.", "Pemaju", "Kod Projek & Nama Projek", "Status Projek", "Total Unit", "Unit Terjual", 
+                                   "Unit Belum Jual", "Take-Up %", "Jumlah Jualan (RM)", 
+                                   "Unit Bumi", "Unit Non Bumi", "Daerah", "Negeri"])
+
+    dfu = df_units_all.copy()
+
+    # Current view = each project's latest snapshot (units_detail keeps every archived date)
+    if "scraped_date" in dfu.columns and "project_code" in dfu.columns:
+        dates = dfu["scraped_date"].astype(str)
+        dfu = dfu[dates == dates.groupby(dfu["project_code"]).transform("max")].copy()
+    
+    # --- 1. Prepare Calculation Columns ---
+    dfu["__status"] = dfu.get("status", "").astype(str).str.lower()
+    dfu["__is_sold"] = dfu["__status"].str.contains("telah dijual", na=False) | dfu["__status"].str.contains("sold", na=False)
+    dfu["__is_unsold"] = dfu["__status"].str.contains("belum dijual", na=False) | dfu["__status"].str.contains("unsold", na=False)
+    # Typed warehouse (schema v2+) ships price_sales as a number; older text schema still parses
+    price = dfu.get("price_sales", pd.Series("", index=dfu.index))
+    dfu["__harga"] = price.fillna(0.0) if pd.api.types.is_numeric_dtype(price) else price.apply(_to_float_rm)
+    dfu["__is_bumi"] = dfu.get("bumi_quota", "").astype(str).str.strip().str.lower().eq("ya")
+
+    # --- 2. Group By (Developer & Project) ---
+    gcols = ["pemaju_name", "Kod Projek & Nama Projek"]
+    
+    if "pemaju_name" not in dfu.columns or "Kod Projek & Nama Projek" not in dfu.columns:
+        return pd.DataFrame()
+
+    agg = dfu.groupby(gcols, as_index=False).agg(
+        **{
+            "Total Unit": ("unit_no", "count"),
+            "Unit Terjual": ("__is_sold", "sum"),
+            "Unit Belum Jual": ("__is_unsold", "sum"),
+            "Jumlah Jualan (RM)": ("__harga", lambda s: float(s[dfu.loc[s.index, "__is_sold"]].sum())),
+            "Unit Bumi": ("__is_bumi", "sum"),
+        }
+    )
+
+    # --- 3. Merge Location & STATUS Data from Master ---
+    if df_master_all is not None and not df_master_all.empty:
+        dfm = df_master_all.copy()
+        
+        # We grab 'status_overall' here alongside location
+        keep_cols = ["Kod Projek & Nama Projek", "location_district", "location_state", "status_overall"]
+        keep_cols = [c for c in keep_cols if c in dfm.columns]
+        
+        # Latest master row per project (same as the SQL / summary paths)
+        if "scraped_timestamp" in dfm.columns:
+            dfm = dfm.sort_values("scraped_timestamp", ascending=False, kind="stable")
+        df_loc = dfm[keep_cols].drop_duplicates(subset=["Kod Projek & Nama Projek"])
+        
+        if not df_loc.empty:
+            agg = agg.merge(df_loc, on="Kod Projek & Nama Projek", how="left")
+            # Rename DB columns to UI headers
+            agg = agg.rename(columns={
+                "location_district": "Daerah", 
+                "location_state": "Negeri",
+                "status_overall": "Status Projek"  # <--- NEW COLUMN MAPPING
+            })
+        else:
+            agg["Daerah"] = ""; agg["Negeri"] = ""; agg["Status Projek"] = ""
+    else:
+        agg["Daerah"] = ""; agg["Negeri"] = ""; agg["Status Projek"] = ""
+
+    agg = agg.rename(columns={"pemaju_name": "Pemaju"})
+    return finalize_project_overview(agg)
+
+def finalize_project_overview(agg: pd.DataFrame):
+    """Derived columns, column order, sort and row numbers shared by the SQL and pandas overviews."""
+    count_cols = ["Total Unit", "Unit Terjual", "Unit Belum Jual", "Unit Bumi"]
+    for col in count_cols:
+        if col in agg.columns:
+            # Postgres SUM(bigint) comes back as Decimal
+            agg[col] = pd.to_numeric(agg[col], errors="coerce").fillna(0).astype(int)
+    agg["Jumlah Jualan (RM)"] = pd.to_numeric(agg["Jumlah Jualan (RM)"], errors="coerce").fillna(0.0).astype(float)
+    agg["Unit Non Bumi"] = agg["Total Unit"] - agg["Unit Bumi"]
+    agg["Take-Up %"] = (agg["Unit Terjual"] / agg["Total Unit"] * 100).fillna(0).round(1)
+
+    # Select and Reorder columns (Added 'Status Projek')
+    target_cols = [
+        "Pemaju", "Kod Projek & Nama Projek", "Status Projek",
+        "Total Unit", "Unit Terjual",
+        "Unit Belum Jual", "Take-Up %", "Jumlah Jualan (RM)", "Unit Bumi",
+        "Unit Non Bumi", "Daerah", "Negeri",
+    ]
+    
+    final_cols = [c for c in target_cols if c in agg.columns]
+    agg = agg[final_cols].copy()
+
+    agg = agg.sort_values(["Pemaju", "Kod Projek & Nama Projek"], na_position="last").reset_index(drop=True)
+    agg.insert(0, "No.", agg.index + 1)
+    return agg
+
+def calculate_kpis(df):
+    """Returns a dictionary of KPI values for a given dataframe."""
+    if df.empty:
+        return {
+            "projects": 0, "units": 0, "sold": 0, "unsold": 0, 
+            "sales_rm": 0.0, "bumi": 0, "non_bumi": 0, "take_up": 0.0
+        }
+    
+    total_units = int(df["Total Unit"].sum())
+    total_sold = int(df["Unit Terjual"].sum())
+    
+    return {
+        "projects": int(df.shape[0]),
+        "units": total_units,
+        "sold": total_sold,
+        "unsold": int(df["Unit Belum Jual"].sum()),
+        "sales_rm": float(df["Jumlah Jualan (RM)"].sum()),
+        "bumi": int(df["Unit Bumi"].sum()),
+        "non_bumi": int(df["Unit Non Bumi"].sum()),
+        "take_up": (total_sold / total_units * 100) if total_units > 0 else 0.0
+    }
+
+def developer_kpis(df_dev, selected):
+    """calculate_kpis() equivalent read straight off the developer_summary rows."""
+    rows = df_dev if selected == "All" else df_dev[df_dev["pemaju_name"] == selected]
+    total_units = int(rows["total_units"].sum())
+    total_sold = int(rows["units_sold"].sum())
+    return {
+        "projects": int(rows["projects"].sum()),
+        "units": total_units,
+        "sold": total_sold,
+        "unsold": int(rows["units_unsold"].sum()),
+        "sales_rm": float(rows["sales_value"].sum()),
+        "bumi": int(rows["units_bumi"].sum()),
+        "non_bumi": int(rows["units_non_bumi"].sum()),
+        "take_up": (total_sold / total_units * 100) if total_units > 0 else 0.0
+    }
+
+
+# =========================================================
+# COMPARISON & TIME TRAVEL
+# =========================================================
+# N-way comparison: one groupby over every developer / district, from which the
+# selected groups, their market ranks and the whole-market row are all read.
+# Projects without a district / developer count towards the market but are
+# not a group of their own.
+MARKET_LABEL = "Whole market"
+
+def build_comparison(df, dim_col, groups):
+    """Comparison matrix (one row per selected group + market) with ranks among all groups."""
+    grouped = df.groupby(dim_col, observed=True, dropna=False).agg(
+        projects=("Kod Projek & Nama Projek", "count"),
+        units=("Total Unit", "sum"),
+        sold=("Unit Terjual", "sum"),
+        unsold=("Unit Belum Jual", "sum"),
+        sales_rm=("Jumlah Jualan (RM)", "sum"),
+        bumi=("Unit Bumi", "sum"),
+        non_bumi=("Unit Non Bumi", "sum"),
+    )
+    market = grouped.sum().to_frame(MARKET_LABEL).T
+    grouped = grouped[grouped.index.notna()]
+    n_groups = len(grouped)
+
+    def derive(t):
+        t = t.astype("float64")
+        t["take_up"] = (t["sold"] / t["units"] * 100).where(t["units"] > 0, 0.0)
+        t["bumi_share"] = (t["bumi"] / t["units"] * 100).where(t["units"] > 0, 0.0)
+        t["sales_per_project"] = (t["sales_rm"] / t["projects"]).where(t["projects"] > 0, 0.0)
+        return t
+
+    grouped = derive(grouped)
+    for col in ["sales_rm", "units", "take_up"]:
+        grouped[f"rank_{col}"] = grouped[col].rank(ascending=False, method="min")
+
+    matrix = pd.concat([grouped.loc[[g for g in groups if g in grouped.index]], derive(market)])
+    matrix.attrs["n_groups"] = n_groups
+    return matrix
+
+def diff_overviews(df_new, df_old):
+    """Per-project change between two overviews (new / dropped projects included)."""
+    key = ["Pemaju", "Kod Projek & Nama Projek"]
+    cols = ["Total Unit", "Unit Terjual", "Jumlah Jualan (RM)", "Take-Up %"]
+    new = df_new[key + cols].astype({"Pemaju": str})
+    old = df_old[key + cols].astype({"Pemaju": str})
+    merged = new.merge(old, on=key, how="outer", suffixes=("", " (before)"), indicator=True)
+    merged["Change"] = merged["_merge"].map({"both": "", "left_only": "new", "right_only": "dropped"}).astype(str)
+    for col in cols:
+        merged[f"Δ {col}"] = merged[col].fillna(0).astype(float) - merged[f"{col} (before)"].fillna(0).astype(float)
+    return merged.drop(columns="_merge").sort_values("Δ Unit Terjual", ascending=False, kind="stable")
+
+
+# Time travel: history_logs holds one aggregated row per project per snapshot
+# date, so "as of D" is each project's latest row with scraped_date <= D (the
+# Trends index serves it); GROUP BY folds rows appended twice by repeated
+# publishes. history_logs.units_unsold is total - sold (legacy tracker rows
+# carry nothing else), not the by-status count of the current overview, so it
+# is shown as ASOF_UNSOLD_LABEL.
+ASOF_UNSOLD_LABEL = "Baki Unit"
+
+OVERVIEW_AS_OF_SQL = """
+WITH asof AS (
+    SELECT developer_name, project_code, MAX(scraped_date) AS scraped_date
+    FROM history_logs
+    WHERE scraped_date <= :as_of
+    GROUP BY developer_name, project_code
+),
+rows_asof AS (
+    SELECT
+        h.developer_name, h.project_code, MAX(h.project_name) AS project_name,
+        MAX(h.total_units) AS total_units, MAX(h.units_sold) AS units_sold,
+        MAX(h.units_unsold) AS units_unsold, MAX(h.units_bumi) AS units_bumi,
+        MAX(h.sales_value) AS sales_value
+    FROM history_logs h
+    JOIN asof a
+      ON a.developer_name = h.developer_name
+     AND a.project_code = h.project_code
+     AND a.scraped_date = h.scraped_date
+    GROUP BY h.developer_name, h.project_code
+),
+master_asof AS (
+    SELECT project_code, status_overall, location_district, location_state
+    FROM (
+        SELECT
+            project_code, status_overall, location_district, location_state,
+            ROW_NUMBER() OVER (PARTITION BY project_code ORDER BY scraped_timestamp DESC) AS rn
+        FROM projects_master
+        WHERE scraped_date <= :as_of
+    ) m
+    WHERE rn = 1
+)
+SELECT
+    r.developer_name AS pemaju_name, r.project_code, r.project_name,
+    m.status_overall, r.total_units, r.units_sold, r.units_unsold,
+    r.sales_value, r.units_bumi, m.location_district, m.location_state
+FROM rows_asof r
+LEFT JOIN master_asof m ON m.project_code = r.project_code;
+"""
+
+
+# =========================================================
+# SALES VELOCITY
+# =========================================================
+VELOCITY_WINDOWS = {"sold_7d": 7, "sold_30d": 30, "sold_90d": 90, "sold_365d": 365}
+
+def compute_sales_velocity(df_hist):
+    """
+    Units sold in each VELOCITY_WINDOWS window, for all projects in one pass.
+
+    Each project's latest row is as-of joined (merge_asof, backward) to the
+    last snapshot on or before latest_date - window, per window, instead of
+    filtering the history once per project and window. No snapshot that far
+    back counts as 0, like the per-project view always did.
+    """
+    key = ["developer_name", "project_code"]
+    hist = df_hist[key + ["project_name", "scraped_date", "units_sold", "total_units"]].copy()
+    hist["scraped_date"] = pd.to_datetime(hist["scraped_date"], errors="coerce")
+    hist = (
+        hist.dropna(subset=["scraped_date"])
+        .sort_values("scraped_date", kind="stable")
+        .drop_duplicates(key + ["scraped_date"], keep="last")
+    )
+    if hist.empty:
+        return pd.DataFrame(columns=key + ["project_name", "scraped_date", "units_sold", "total_units",
+                                           "units_unsold", "history_days"] + list(VELOCITY_WINDOWS))
+
+    first_date = hist.groupby(key)["scraped_date"].min()
+    current = hist.groupby(key).tail(1)
+    past = hist[key + ["scraped_date", "units_sold"]].rename(
+        columns={"scraped_date": "past_date", "units_sold": "past_sold"}
+    )
+
+    out = current.set_index(key)
+    out["units_unsold"] = out["total_units"] - out["units_sold"]
+    out["history_days"] = (out["scraped_date"] - first_date).dt.days
+    for col, days in VELOCITY_WINDOWS.items():
+        probe = current[key + ["units_sold"]].assign(target=current["scraped_date"] - pd.Timedelta(days=days))
+        matched = pd.merge_asof(
+            probe.sort_values("target"), past,
+            left_on="target", right_on="past_date", by=key, direction="backward",
+        ).set_index(key)
+        out[col] = (matched["units_sold"] - matched["past_sold"]).fillna(0).astype(int)
+    return out.reset_index()
+
+
+# =========================================================
+# SEARCH INDEX
+# =========================================================
+# Search boxes match on project code + name, developer and district. The index
+# is built once per overview load instead of lowercasing the whole frame on
+# every keystroke rerun, and resolves a query to row positions:
+#   - every query term must match (AND), terms being runs of letters/digits
+#   - a term of 3+ chars matches a row when it occurs inside one of the row's
+#     tokens (trigram lookup on the vocabulary) or, failing that, a close
+#     spelling of one (typos such as "meaka" -> "melaka"); typo candidates are
+#     only the tokens with the same first letter and a length difflib's 0.8
+#     cutoff can accept, at most FUZZY_CANDIDATES of them
+#   - a 1-2 char term is a substring match, like the original str.contains
+#     search (too short for trigrams or typos), served from postings of every
+#     1-2 char substring built with the index
+#   - a blank query matches every row, a query with no letters/digits none
+SEARCH_FIELDS = ["Kod Projek & Nama Projek", "Pemaju", "Daerah"]
+FUZZY_CUTOFF = 0.8
+FUZZY_CANDIDATES = 2000
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+def _trigrams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _short_grams(s):
+    return {s[i:i + n] for n in (1, 2) for i in range(len(s) - n + 1)}
+
+def build_search_index(df, fields=SEARCH_FIELDS):
+    """Lowercase key per row, token -> rows postings and the lookups that resolve query terms to tokens."""
+    cols = [df[c].astype("string").fillna("") for c in fields if c in df.columns]
+    if not cols or df.empty:
+        keys = [""] * len(df)
+    else:
+        joined = cols[0].str.cat(cols[1:], sep=" | ") if len(cols) > 1 else cols[0]
+        keys = joined.str.lower().tolist()
+
+    token_rows = {}
+    for pos, key in enumerate(keys):
+        for tok in set(_TOKEN_RE.findall(key)):
+            token_rows.setdefault(tok, []).append(pos)
+
+    tokens = sorted(token_rows)
+    postings = [np.array(token_rows[t], dtype=np.int32) for t in tokens]
+    gram_tokens, short_tokens, fuzzy = {}, {}, {}
+    for tid, tok in enumerate(tokens):
+        for gram in _trigrams(tok):
+            gram_tokens.setdefault(gram, []).append(tid)
+        for gram in _short_grams(tok):
+            short_tokens.setdefault(gram, []).append(tid)
+        fuzzy.setdefault((tok[0], len(tok)), []).append(tid)
+
+    return {
+        "size": len(keys),
+        "keys": keys,
+        "tokens": tokens,
+        "postings": postings,
+        "grams": {g: np.array(t, dtype=np.int32) for g, t in gram_tokens.items()},
+        # 1-2 char substring -> rows (a token's rows are distinct, tokens of one row overlap)
+        "short": {g: postings[t[0]] if len(t) == 1 else np.unique(np.concatenate([postings[i] for i in t]))
+                  for g, t in short_tokens.items()},
+        "fuzzy": fuzzy,
+    }
+
+def _term_tokens(index, term):
+    """Vocabulary ids of the tokens a query term matches."""
+    tokens = index["tokens"]
+    cand = None
+    for gram in _trigrams(term):
+        ids = index["grams"].get(gram)
+        if ids is None:
+            return []
+        cand = ids if cand is None else np.intersect1d(cand, ids, assume_unique=True)
+    return [t for t in cand if term in tokens[t]]
+
+def _fuzzy_tokens(index, term):
+    """Vocabulary ids of up to 3 close spellings of term."""
+    # ratio = 2 * matches / (len(a) + len(b)) can only reach the cutoff for nearby lengths
+    # (difflib's real_quick_ratio); at 0.8 that is 2/3 to 3/2 of the term's length
+    n = len(term)
+    cand = []
+    for length in range(1, 2 * n):
+        if 2 * min(n, length) / (n + length) < FUZZY_CUTOFF:
+            continue
+        cand += index["fuzzy"].get((term[0], length), [])
+        if len(cand) >= FUZZY_CANDIDATES:
+            break
+    tokens = index["tokens"]
+    close = difflib.get_close_matches(term, [tokens[t] for t in cand[:FUZZY_CANDIDATES]], n=3, cutoff=FUZZY_CUTOFF)
+    return [bisect_left(tokens, tok) for tok in close]
+
+def _term_rows(index, term):
+    if len(term) < 3:
+        return index["short"].get(term, np.empty(0, dtype=np.int32))
+    postings = index["postings"]
+    ids = list(_term_tokens(index, term)) or _fuzzy_tokens(index, term)
+    if not ids:
+        return np.empty(0, dtype=np.int32)
+    if len(ids) == 1:
+        return postings[ids[0]]
+    return np.unique(np.concatenate([postings[t] for t in ids]))
+
+def search_positions(index, query):
+    """Row positions matching every term of query (all rows for a blank query, none for punctuation only)."""
+    if not query.strip():
+        return np.arange(index["size"])
+    terms = _TOKEN_RE.findall(query.lower())
+    if not terms:
+        return np.empty(0, dtype=np.int32)
+    result = None
+    for term in terms:
+        rows = _term_rows(index, term)
+        result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        if not result.size:
+            break
+    return result
+
+
+# =========================================================
+# SPATIAL INDEX
+# =========================================================
+# Projects with coordinates are bucketed into a uniform grid of cell_km
+# squares on a local equirectangular projection (accurate enough at state
+# scale). A radius query visits only the cells overlapping the circle's
+# bounding box and measures great-circle distance on those candidates, so it
+# does not touch every project; nearest-k doubles the radius until k
+# eligible projects are inside it.
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQUATOR = 111.320
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (numpy-vectorised)."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def build_spatial_index(df, lat_col="latitude", lon_col="longitude", cell_km=1.0):
+    """Grid index over the rows of df that have coordinates."""
+    lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=float) if lat_col in df.columns else np.empty(0)
+    lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=float) if lon_col in df.columns else np.empty(0)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    positions = np.flatnonzero(ok)
+    lat, lon = lat[ok], lon[ok]
+
+    lat0 = float(lat.mean()) if len(lat) else 0.0
+    kx = KM_PER_DEG_LON_EQUATOR * np.cos(np.radians(lat0))
+    ix = np.floor(lon * kx / cell_km).astype(np.int64)
+    iy = np.floor(lat * KM_PER_DEG_LAT / cell_km).astype(np.int64)
+
+    order = np.lexsort((iy, ix))
+    cells = {}
+    if len(order):
+        keys = np.stack([ix[order], iy[order]], axis=1)
+        starts = np.flatnonzero(np.r_[True, (np.diff(keys, axis=0) != 0).any(axis=1)])
+        for s, e in zip(starts, np.r_[starts[1:], len(order)]):
+            cells[(int(keys[s, 0]), int(keys[s, 1]))] = order[s:e]
+
+    return {
+        "size": len(df),
+        "positions": positions,
+        "lat": lat,
+        "lon": lon,
+        "cells": cells,
+        "cell_km": cell_km,
+        "kx": kx,
+        "max_abs_lat": float(np.abs(lat).max()) if len(lat) else 0.0,
+    }
+
+def projects_within(index, lat, lon, radius_km):
+    """(row positions, distances in km) of indexed rows within radius_km, nearest first."""
+    if not index["cells"] or radius_km < 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    cell_km, kx = index["cell_km"], index["kx"]
+    # The projection squeezes east-west distance away from lat0: widen the box to compensate
+    widest = np.cos(np.radians(min(max(index["max_abs_lat"], abs(lat)), 89.0)))
+    reach = radius_km * 1.01 * max(1.0, kx / (KM_PER_DEG_LON_EQUATOR * widest))
+    x, y = lon * kx, lat * KM_PER_DEG_LAT
+    x0, x1 = int(np.floor((x - reach) / cell_km)), int(np.floor((x + reach) / cell_km))
+    y0, y1 = int(np.floor((y - reach) / cell_km)), int(np.floor((y + reach) / cell_km))
+
+    if (x1 - x0 + 1) * (y1 - y0 + 1) >= len(index["cells"]):
+        # Radius spans most of the grid: scanning the occupied cells is cheaper
+        parts = [ids for (cx, cy), ids in index["cells"].items() if x0 <= cx <= x1 and y0 <= cy <= y1]
+    else:
+        cells = index["cells"]
+        parts = [cells[(cx, cy)] for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1) if (cx, cy) in cells]
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    cand = np.concatenate(parts)
+    dist = haversine_km(lat, lon, index["lat"][cand], index["lon"][cand])
+    keep = dist <= radius_km
+    cand, dist = cand[keep], dist[keep]
+    order = np.argsort(dist, kind="stable")
+    return index["positions"][cand[order]], dist[order]
+
+def nearest_projects(index, lat, lon, k=5, eligible=None):
+    """
+    (row positions, distances in km) of the k nearest indexed rows.
+    eligible: optional boolean array over the frame's rows (e.g. other developers only).
+    """
+    if not index["cells"] or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    radius = index["cell_km"]
+    span = haversine_km(index["lat"].min(), index["lon"].min(), index["lat"].max(), index["lon"].max())
+    limit = span + float(haversine_km(lat, lon, index["lat"][0], index["lon"][0])) + radius
+    while True:
+        pos, dist = projects_within(index, lat, lon, radius)
+        if eligible is not None:
+            keep = np.asarray(eligible, dtype=bool)[pos]
+            pos, dist = pos[keep], dist[keep]
+        if len(pos) >= k or radius >= limit:
+            return pos[:k], dist[:k]
+        radius *= 2
+
+
+# =========================================================
+# PRICE PER M² (house types)
+# =========================================================
+# Percentiles are unit-weighted: a house type with 200 units counts 200 times,
+# so a segment's median is the price per m² of its median unit, not of its
+# median listing. The publisher materializes the per-dimension tables
+# (price_percentiles); the dashboard drills down on build_price_index arrays,
+# which are presorted by price per m² so any filter is a mask, never a re-sort.
+PRICE_DIMENSIONS = {"District": "location_district", "House type": "house_type", "Developer": "pemaju_name"}
+PRICE_QUANTILES = (0.10, 0.25, 0.50, 0.75, 0.90)
+
+def weighted_quantiles(values, weights, qs=PRICE_QUANTILES, presorted=False):
+    """Lower weighted quantiles of values (NaN for an empty selection)."""
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    if not len(values):
+        return np.full(len(qs), np.nan)
+    if not presorted:
+        order = np.argsort(values, kind="stable")
+        values, weights = values[order], weights[order]
+    cum = np.cumsum(weights)
+    idx = np.searchsorted(cum, np.asarray(qs) * cum[-1], side="left")
+    return values[np.clip(idx, 0, len(values) - 1)]
+
+def _price_weights(df):
+    # Unknown / zero unit counts still count once
+    return pd.to_numeric(df["total_units"], errors="coerce").fillna(0).clip(lower=1).to_numpy(dtype=float)
+
+def price_percentile_table(df_pricing, dim_col=None):
+    """
+    Unit-weighted price per m² percentiles per value of dim_col (one "All" row
+    when dim_col is None), over the house types with a known psm_mid. No priced
+    house types -> an empty table.
+    """
+    cols = ["group_name", "house_types", "projects", "units"] + [f"psm_p{int(q * 100)}" for q in PRICE_QUANTILES] + ["psm_mean", "price_p50"]
+    df = df_pricing[df_pricing["psm_mid"].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=cols)
+    df = df.assign(_group="All" if dim_col is None else df[dim_col].astype("string").fillna("-"))
+    df = df.sort_values(["_group", "psm_mid"], kind="stable")
+    weights = _price_weights(df)
+    psm = df["psm_mid"].to_numpy(dtype=float)
+    price = df["price_mid"].to_numpy(dtype=float)
+
+    rows = []
+    bounds = np.flatnonzero(np.r_[True, df["_group"].to_numpy()[1:] != df["_group"].to_numpy()[:-1]])
+    for start, end in zip(bounds, np.r_[bounds[1:], len(df)]):
+        w = weights[start:end]
+        if w.sum() <= 0:
+            continue
+        qs = weighted_quantiles(psm[start:end], w, presorted=True)
+        ok = ~np.isnan(price[start:end])
+        rows.append({
+            "group_name": df["_group"].iat[start],
+            "house_types": int(end - start),
+            "projects": int(df["project_code"].iloc[start:end].nunique()),
+            "units": int(w.sum()),
+            **{f"psm_p{int(q * 100)}": float(v) for q, v in zip(PRICE_QUANTILES, qs)},
+            "psm_mean": float(np.average(psm[start:end], weights=w)),
+            "price_p50": float(weighted_quantiles(price[start:end][ok], w[ok], (0.5,))[0]),
+        })
+    return pd.DataFrame(rows, columns=cols)
+
+def build_price_index(df_pricing, dims=tuple(PRICE_DIMENSIONS.values())):
+    """House types with a known price per m², as arrays sorted by psm_mid plus factorized dims."""
+    df = df_pricing[df_pricing["psm_mid"].notna()].sort_values("psm_mid", kind="stable")
+    index = {
+        "psm": df["psm_mid"].to_numpy(dtype=float),
+        "price": df["price_mid"].to_numpy(dtype=float),
+        "units": _price_weights(df),
+        "rooms": pd.to_numeric(df["num_rooms"], errors="coerce").to_numpy(dtype=float),
+        "projects": df["project_code"].astype(str).to_numpy(),
+        "codes": {},
+        "labels": {},
+    }
+    for col in dims:
+        codes, labels = pd.factorize(df[col].astype("string").fillna("-"), sort=True)
+        index["codes"][col] = codes
+        index["labels"][col] = list(labels)
+    return index
+
+def price_stats(index, filters=None, rooms=None, bins=30):
+    """
+    Percentiles, weighted mean and a psm histogram for the house types matching
+    filters ({dim column: selected values}, empty = any) and rooms (allowed room counts).
+    """
+    mask = np.ones(len(index["psm"]), dtype=bool)
+    for col, values in (filters or {}).items():
+        if values:
+            wanted = [i for i, label in enumerate(index["labels"][col]) if label in set(values)]
+            mask &= np.isin(index["codes"][col], wanted)
+    if rooms:
+        mask &= np.isin(index["rooms"], list(rooms))
+
+    psm, units, price = index["psm"][mask], index["units"][mask], index["price"][mask]
+    qs = weighted_quantiles(psm, units, presorted=True)
+    counts, edges = np.histogram(psm, bins=bins, weights=units) if len(psm) else (np.zeros(0), np.zeros(1))
+    ok = ~np.isnan(price)
+    return {
+        "house_types": int(mask.sum()),
+        "projects": int(len(np.unique(index["projects"][mask]))),
+        "units": int(units.sum()),
+        "quantiles": {q: float(v) for q, v in zip(PRICE_QUANTILES, qs)},
+        "mean": float(np.average(psm, weights=units)) if len(psm) else float("nan"),
+        "price_p50": float(weighted_quantiles(price[ok], units[ok], (0.5,))[0]),
+        "histogram": pd.DataFrame({"RM/m²": ((edges[:-1] + edges[1:]) / 2).round(0), "Units": counts}),
+    }
+
+def price_segments(df_pricing, dims=("location_district", "house_type")):
+    """
+    District x house type (by default) segments: price per m² percentiles plus
+    the unit-weighted take-up of the projects behind them (the oversupply signal).
+    """
+    df = df_pricing.assign(**{c: df_pricing[c].astype("string").fillna("-") for c in dims})
+    df["segment"] = df[dims[0]].str.cat([df[c] for c in dims[1:]], sep=" · ") if len(dims) > 1 else df[dims[0]]
+    df["_w"] = _price_weights(df)
+    take_up = pd.to_numeric(df["take_up_rate"], errors="coerce")
+    df["_take_up_w"] = (take_up * df["_w"]).fillna(0)
+    df["_w_known"] = df["_w"].where(take_up.notna(), 0)
+
+    agg = df.groupby(["segment"] + list(dims), as_index=False).agg(
+        all_house_types=("segment", "size"), all_units=("_w", "sum"),
+        take_up_w=("_take_up_w", "sum"), w_known=("_w_known", "sum"),
+    )
+    agg["take_up"] = (agg["take_up_w"] / agg["w_known"].where(agg["w_known"] > 0)).round(1)
+    table = price_percentile_table(df, "segment").rename(columns={"group_name": "segment"})
+    agg = agg.drop(columns=["take_up_w", "w_known"]).merge(table, on="segment", how="left")
+    return agg.sort_values("all_units", ascending=False, kind="stable").reset_index(drop=True)
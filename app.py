@@ -2,11 +2,29 @@ import os
 import csv
 import glob
 import io
+import time
+import cProfile
+import functools
+import marshal
+import pstats
+import gzip
+import importlib.util
+import numpy as np
 import streamlit as st
 import pandas as pd
 from datetime import datetime
 from sqlalchemy import text
 
+from backend import DB_BACKEND, is_local_backend, local_db_url
+from analytics import (
+    ASOF_UNSOLD_LABEL, MARKET_LABEL, OVERVIEW_AS_OF_SQL, PRICE_DIMENSIONS, PRICE_QUANTILES, PROJECT_OVERVIEW_SQL,
+    PROJECT_SUMMARY_COLUMNS, VELOCITY_WINDOWS,
+    build_comparison, build_price_index, build_project_overview, build_search_index, build_spatial_index,
+    calculate_kpis, compact_frame, compute_sales_velocity, create_display_name, developer_kpis,
+    diff_overviews, finalize_project_overview, get_last_sync, get_pemaju_list, nearest_projects,
+    price_segments, price_stats, projects_within, search_positions,
+)
+
 # =========================
 # DATA CONFIG
 # =========================
@@ -16,6 +34,20 @@ DATA_DIR = "data/pemaju" # Kept for fallback, though we use DB now
 HISTORY_FILE = "data/history_tracker.csv"
 ACCESS_LOG_FILE = "data/access_logs.csv"
 
+# =========================================================
+# DATABASE CONNECTION
+# =========================================================
+def get_connection():
+    """
+    Supabase (secrets: [connections.supabase]) by default.
+    With DB_BACKEND=sqlite/duckdb the dashboard reads the local file the publisher wrote.
+    """
+    if is_local_backend():
+        return st.connection("local", type="sql", url=local_db_url())
+    return st.connection("supabase", type="sql")
+
+DB_LABEL = f"Local {DB_BACKEND}" if is_local_backend() else "Supabase"
+
 # =========================================================
 # PAGE CONFIG
 # =========================================================
@@ -74,7 +106,7 @@ apply_theme()
 def log_access(name, org):
     """Log user access to Supabase."""
     try:
-        conn = st.connection("supabase", type="sql")
+        conn = get_connection()
         # specific SQL query to insert data
         with conn.session as session:
             session.execute(
@@ -127,42 +159,66 @@ if "selected_pemaju" not in st.session_state:
     st.session_state.selected_pemaju = "All"
 
 # =========================================================
-# DATABASE LOADERS & HELPERS
+# PROFILING (per rerun, shown in the Debug Panel)
 # =========================================================
+# PERF is rebuilt on every script run. Cached loaders use @perf_cached, which
+# counts calls outside the cache and executions inside it (= misses); plain
+# helpers use @profiled. The page render time is measured around the page block.
+PERF = {"started": time.perf_counter(), "calls": {}, "misses": {}, "ms": {}, "rows": {}}
+PERF_CACHED = set()
+
+def _perf_record(name, ms, result):
+    PERF["calls"][name] = PERF["calls"].get(name, 0) + 1
+    PERF["ms"][name] = PERF["ms"].get(name, 0.0) + ms
+    if isinstance(result, pd.DataFrame):
+        PERF["rows"][name] = len(result)
+
+def profiled(fn):
+    """Times every call of fn into PERF."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        _perf_record(fn.__name__, (time.perf_counter() - t0) * 1000, result)
+        return result
+    return wrapper
+
+def perf_cached(cache=st.cache_data, **cache_kwargs):
+    """cache(**cache_kwargs) around fn, plus call/miss counts and timings in PERF."""
+    def decorate(fn):
+        PERF_CACHED.add(fn.__name__)
+
+        @functools.wraps(fn)
+        def on_miss(*args, **kwargs):
+            PERF["misses"][fn.__name__] = PERF["misses"].get(fn.__name__, 0) + 1
+            return fn(*args, **kwargs)
+        return profiled(functools.wraps(fn)(cache(**cache_kwargs)(on_miss)))
+    return decorate
+
+# Transforms from analytics.py that show up in the timings
+build_project_overview = profiled(build_project_overview)
+get_last_sync = profiled(get_last_sync)
+calculate_kpis = profiled(calculate_kpis)
+developer_kpis = profiled(developer_kpis)
+
+# Optional cProfile of this whole rerun (toggled in the Debug Panel). The
+# profiler is kept in session_state so a rerun that never reached the Debug
+# Panel (an exception, an st.stop) has its profiler disabled by the next one.
+_leaked = st.session_state.pop("_rerun_profiler", None)
+if _leaked is not None:
+    _leaked.disable()
+_profiler = None
+if st.session_state.get("profile_rerun"):
+    _profiler = cProfile.Profile()
+    st.session_state["_rerun_profiler"] = _profiler
+    _profiler.enable()
 
-def _to_float_rm(x):
-    """Cleans currency strings like 'RM 1,200.00' to float."""
-    s = str(x or "").strip()
-    s = s.replace("RM", "").replace(",", "").strip()
-    try:
-        return float(s) if s else 0.0
-    except:
-        return 0.0
-
-@st.cache_data(ttl=600, show_spinner=False)
-def load_data_from_supabase():
-    """Fetches data from Supabase and formats it for the dashboard."""
-    # Connect using Streamlit's secrets
-    conn = st.connection("supabase", type="sql")
+# =========================================================
+# DATABASE LOADERS & HELPERS
+# =========================================================
 
-    try:
-        df_projects = conn.query("SELECT * FROM projects_master;", ttl=600)
-        df_units = conn.query("SELECT * FROM units_detail;", ttl=600)
-        df_house = conn.query("SELECT * FROM house_types;", ttl=600)
-    except Exception as e:
-        st.error(f"Failed to connect to database: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-    # Helper to combine Code + Name into one display column
-    def create_display_name(df):
-        if not df.empty and "project_code" in df.columns and "project_name" in df.columns:
-            # Handle potential None/NaN values
-            code = df["project_code"].fillna("")
-            name = df["project_name"].fillna("")
-            return code + " " + name
-        return ""
-
-    # 1. PREPARE PROJECTS MASTER
+def _load_projects_master(conn):
+    df_projects = conn.query("SELECT * FROM projects_master;", ttl=0)
     if not df_projects.empty:
         # Create the unified name column (Crucial for UI)
         df_projects["Kod Projek & Nama Projek"] = create_display_name(df_projects)
@@ -171,142 +227,351 @@ def load_data_from_supabase():
         for col in ["scraped_date", "scraped_timestamp"]:
             if col in df_projects.columns:
                 df_projects[col] = pd.to_datetime(df_projects[col], errors='coerce')
+    return df_projects
+
+def _overview_from_summary(conn):
+    cols = ", ".join(["project_code", "project_name"] + list(PROJECT_SUMMARY_COLUMNS))
+    df = conn.query(f"SELECT {cols} FROM project_summary;", ttl=0)
+    df["Kod Projek & Nama Projek"] = create_display_name(df)
+    return finalize_project_overview(df.rename(columns=PROJECT_SUMMARY_COLUMNS))
+
+def _overview_from_sql(conn):
+    return finalize_project_overview(conn.query(PROJECT_OVERVIEW_SQL, ttl=0))
 
-    # 2. PREPARE UNITS DETAIL
+def _overview_from_units(conn):
+    # Untyped (text) price_sales: aggregate unit rows in pandas as before
+    df_units = conn.query("SELECT * FROM units_detail;", ttl=0)
     if not df_units.empty:
         df_units["Kod Projek & Nama Projek"] = create_display_name(df_units)
-        
-    # 3. PREPARE HOUSE TYPES
+    return build_project_overview(_load_projects_master(conn), df_units)
+
+# Page-scoped loaders: each page only pulls (and caches) what it renders.
+# Every loader takes the published data_version first, so its cache entries
+# live until the publisher bumps data_version (polled below) rather than for a
+# fixed TTL; the inner conn.query calls use ttl=0 so they never serve stale rows.
+DATA_VERSION_POLL_SECONDS = int(os.getenv("DATA_VERSION_POLL_SECONDS", "30"))
+UNVERSIONED_REFRESH_SECONDS = 600
+
+@perf_cached(ttl=DATA_VERSION_POLL_SECONDS, show_spinner=False)
+def load_data_version():
+    """Current data_version from the publisher (the only query on a warm rerun)."""
+    try:
+        df = get_connection().query("SELECT version FROM data_version;", ttl=0)
+        if not df.empty:
+            return str(df.iloc[0, 0])
+    except Exception:
+        pass
+    # Published before data_version existed: keep the old 10-minute refresh
+    return f"unversioned-{int(time.time() // UNVERSIONED_REFRESH_SECONDS)}"
+
+@perf_cached(max_entries=2, show_spinner=False)
+def load_project_overview(data_version):
+    """One row per project (Overview + Projects pages)."""
+    conn = get_connection()
+    errors = []
+    # Pre-aggregated by the publisher, else aggregated in SQL / pandas
+    for loader in (_overview_from_summary, _overview_from_sql, _overview_from_units):
+        try:
+            df = loader(conn)
+            break
+        except Exception as e:
+            errors.append(e)
+    else:
+        st.error(f"Failed to connect to database: {errors[-1]}")
+        df = build_project_overview(pd.DataFrame(), pd.DataFrame())
+    return compact_frame(
+        df,
+        categorical=["Pemaju", "Status Projek", "Daerah", "Negeri"],
+        whole_money=["Jumlah Jualan (RM)"],
+        rates=["Take-Up %"],
+    )
+
+@perf_cached(max_entries=2, show_spinner=False)
+def load_developer_summary(data_version):
+    """Developer-level KPIs materialized by the publisher (empty if not published yet)."""
+    try:
+        df = get_connection().query("SELECT * FROM developer_summary;", ttl=0)
+    except Exception:
+        return pd.DataFrame()
+    return compact_frame(df, whole_money=["sales_value"], rates=["take_up_rate", "bumi_share"])
+
+# house_types carries no developer column; resolve it through projects_master
+HOUSE_TYPES_BY_PEMAJU_SQL = """
+SELECT h.*
+FROM house_types h
+WHERE h.project_code IN (
+    SELECT project_code FROM projects_master WHERE pemaju_name = :pemaju
+);
+"""
+
+@perf_cached(max_entries=64, show_spinner=False)
+def load_house_types(data_version, pemaju="All"):
+    """House types of one developer ("All" = every developer), fetched on demand."""
+    conn = get_connection()
+    try:
+        if pemaju == "All":
+            df_house = conn.query("SELECT * FROM house_types;", ttl=0)
+        else:
+            df_house = conn.query(HOUSE_TYPES_BY_PEMAJU_SQL, params={"pemaju": pemaju}, ttl=0)
+    except Exception as e:
+        st.error(f"Failed to load house types: {e}")
+        return pd.DataFrame()
+
     if not df_house.empty:
         df_house["Kod Projek & Nama Projek"] = create_display_name(df_house)
+    # Prices keep float64: house prices carry sen
+    return compact_frame(
+        df_house,
+        categorical=["project_code", "project_name", "Kod Projek & Nama Projek", "house_type",
+                     "component_status", "scraped_date"],
+        rates=["percent_actual"],
+        drop=["id", "created_at", "scraped_timestamp"],
+    )
 
-    return df_projects, df_units, df_house
-
-def get_last_sync(df_list):
-    """Finds the latest scraped timestamp across all dataframes."""
-    times = []
-    for df in df_list:
-        if df is None or df.empty:
-            continue
-        # Check both naming conventions just in case
-        for col in ["scraped_timestamp", "Scraped_Timestamp", "scraped_date", "Scraped_Date"]:
-            if col in df.columns:
-                t = pd.to_datetime(df[col], errors="coerce")
-                times.append(t.max())
-                break
-    times = [x for x in times if pd.notna(x)]
-    return max(times) if times else None
-
-def build_project_overview(df_master_all: pd.DataFrame, df_units_all: pd.DataFrame):
-    """
-    Aggregates unit-level data into project-level statistics.
-    Now includes 'status_overall' from the master table.
-    """
-    if df_units_all is None or df_units_all.empty:
-        # Return empty structure with expected headers
-        return pd.DataFrame(columns=["No.", "Pemaju", "Kod Projek & Nama Projek", "Status Projek", "Total Unit", "Unit Terjual", 
-                                   "Unit Belum Jual", "Take-Up %", "Jumlah Jualan (RM)", 
-                                   "Unit Bumi", "Unit Non Bumi", "Daerah", "Negeri"])
+@perf_cached(max_entries=2, show_spinner=False)
+def load_last_sync(data_version):
+    """Latest scrape time, computed in the database instead of over full tables."""
+    try:
+        df = get_connection().query(
+            "SELECT MAX(scraped_timestamp) AS scraped_timestamp FROM projects_master "
+            "UNION ALL SELECT MAX(scraped_timestamp) FROM house_types;",
+            ttl=0,
+        )
+    except Exception:
+        return None
+    return get_last_sync([df])
+
+# Trends: a small developer/project list, then one project's series at a time.
+# Both filter on the publisher's (developer_name, project_code, scraped_date) index.
+HISTORY_INDEX_SQL = """
+SELECT developer_name, project_code, MAX(project_name) AS project_name
+FROM history_logs
+GROUP BY developer_name, project_code;
+"""
+
+PROJECT_HISTORY_SQL = """
+SELECT *
+FROM history_logs
+WHERE developer_name = :d AND project_code = :p
+ORDER BY scraped_date ASC;
+"""
+
+@perf_cached(max_entries=2, show_spinner=False)
+def load_history_index(data_version):
+    """Developers and their projects present in history_logs."""
+    df = get_connection().query(HISTORY_INDEX_SQL, ttl=0)
+    # "CODE | NAME" label handles duplicate names with different codes
+    df["project_label"] = df["project_code"].astype(str) + " | " + df["project_name"].astype(str)
+    return compact_frame(df, categorical=["developer_name"])
+
+@perf_cached(max_entries=256, show_spinner=False)
+def load_project_history(data_version, developer, project_code):
+    """history_logs series of one project, oldest first (cached per developer/project)."""
+    df = get_connection().query(PROJECT_HISTORY_SQL, params={"d": developer, "p": project_code}, ttl=0)
+    df["scraped_date"] = pd.to_datetime(df["scraped_date"])
+    return df
+
+# Time travel: the overview as of any past scraped_date (OVERVIEW_AS_OF_SQL)
+HISTORY_DATES_SQL = "SELECT DISTINCT scraped_date FROM history_logs ORDER BY scraped_date;"
+
+@perf_cached(max_entries=2, show_spinner=False)
+def load_history_dates(data_version):
+    """Snapshot dates available for time travel, oldest first."""
+    return get_connection().query(HISTORY_DATES_SQL, ttl=0)["scraped_date"].astype(str).tolist()
+
+@perf_cached(max_entries=16, show_spinner=False)
+def load_overview_as_of(data_version, as_of):
+    """Project overview (same columns as load_project_overview) as it stood on as_of."""
+    df = get_connection().query(OVERVIEW_AS_OF_SQL, params={"as_of": as_of}, ttl=0)
+    df["Kod Projek & Nama Projek"] = create_display_name(df)
+    df = finalize_project_overview(df.rename(columns=PROJECT_SUMMARY_COLUMNS))
+    return compact_frame(
+        df,
+        categorical=["Pemaju", "Status Projek", "Daerah", "Negeri"],
+        whole_money=["Jumlah Jualan (RM)"],
+        rates=["Take-Up %"],
+    )
 
-    dfu = df_units_all.copy()
-    
-    # --- 1. Prepare Calculation Columns ---
-    dfu["__status"] = dfu.get("status", "").astype(str).str.lower()
-    dfu["__is_sold"] = dfu["__status"].str.contains("telah dijual", na=False) | dfu["__status"].str.contains("sold", na=False)
-    dfu["__is_unsold"] = dfu["__status"].str.contains("belum dijual", na=False) | dfu["__status"].str.contains("unsold", na=False)
-    dfu["__harga"] = dfu.get("price_sales", "").apply(_to_float_rm)
-    dfu["__is_bumi"] = dfu.get("bumi_quota", "").astype(str).str.strip().str.lower().eq("ya")
-
-    # --- 2. Group By (Developer & Project) ---
-    gcols = ["pemaju_name", "Kod Projek & Nama Projek"]
-    
-    if "pemaju_name" not in dfu.columns or "Kod Projek & Nama Projek" not in dfu.columns:
-        return pd.DataFrame()
+# Sales velocity for every project at once (Trends metrics + leaderboard)
+VELOCITY_HISTORY_SQL = """
+SELECT developer_name, project_code, project_name, scraped_date, units_sold, total_units
+FROM history_logs;
+"""
 
-    agg = dfu.groupby(gcols, as_index=False).agg(
-        **{
-            "Total Unit": ("unit_no", "count"),
-            "Unit Terjual": ("__is_sold", "sum"),
-            "Unit Belum Jual": ("__is_unsold", "sum"),
-            "Jumlah Jualan (RM)": ("__harga", lambda s: float(s[dfu.loc[s.index, "__is_sold"]].sum())),
-            "Unit Bumi": ("__is_bumi", "sum"),
-        }
+@perf_cached(max_entries=2, show_spinner="Computing sales velocity...")
+def load_sales_velocity(data_version):
+    """Velocity of all projects, computed once per publish."""
+    df = compute_sales_velocity(get_connection().query(VELOCITY_HISTORY_SQL, ttl=0))
+    return compact_frame(df, categorical=["developer_name"])
+
+# N-way comparison (analytics.build_comparison), by developer or district
+COMPARE_DIMENSIONS = {"Developer": "Pemaju", "District": "Daerah"}
+
+@perf_cached(max_entries=2, show_spinner=False)
+def load_pemaju_list(data_version):
+    """Developer names of the cached overview (the Single View selector)."""
+    return get_pemaju_list(load_project_overview(data_version))
+
+@perf_cached(max_entries=8, show_spinner=False)
+def load_dimension_options(data_version, dim_col):
+    """Distinct values of one COMPARE_DIMENSIONS column (the compare selector)."""
+    return sorted(load_project_overview(data_version)[dim_col].dropna().astype(str).unique())
+
+@perf_cached(max_entries=64, show_spinner=False)
+def load_comparison(data_version, dim_col, groups):
+    """build_comparison() cached per selection set (groups = sorted tuple)."""
+    return build_comparison(load_project_overview(data_version), dim_col, list(groups))
+
+# =========================================================
+# SEARCH INDEX
+# =========================================================
+# analytics.build_search_index / search_positions over the cached overview.
+# cache_resource: the index is read-only, so sessions share it instead of
+# unpickling a copy on every hit like cache_data would.
+@perf_cached(st.cache_resource, max_entries=2, show_spinner=False)
+def load_project_search_index(data_version):
+    return build_search_index(load_project_overview(data_version))
+
+@profiled
+def search_projects(df_all, query, data_version):
+    """Rows of the cached project overview (of data_version) matching query."""
+    if not query.strip():
+        return df_all
+    return df_all.iloc[search_positions(load_project_search_index(data_version), query)]
+
+def filter_projects(df_all, pemaju, query, data_version):
+    """Overview rows for a developer ("All" = every developer) matching query."""
+    df = search_projects(df_all, query, data_version)
+    if pemaju != "All":
+        df = df[df["Pemaju"] == pemaju]
+    return df
+
+# =========================================================
+# SPATIAL INDEX
+# =========================================================
+# Coordinates parsed by the publisher from "Lokasi Projek" map links: each
+# project's latest located projects_master row, joined to the cached overview
+# for its sales figures, and indexed once per publish (analytics.build_spatial_index).
+PROJECT_LOCATIONS_SQL = """
+SELECT project_code, project_name, latitude, longitude
+FROM (
+    SELECT
+        project_code, project_name, latitude, longitude,
+        ROW_NUMBER() OVER (PARTITION BY project_code ORDER BY scraped_timestamp DESC) AS rn
+    FROM projects_master
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+) m
+WHERE rn = 1;
+"""
+MAP_COLUMNS = ["Pemaju", "Kod Projek & Nama Projek", "Status Projek", "Daerah", "Total Unit",
+               "Unit Belum Jual", "Take-Up %", "Jumlah Jualan (RM)", "latitude", "longitude"]
+
+@perf_cached(max_entries=2, show_spinner=False)
+def load_project_locations(data_version):
+    """Overview rows of the projects that have coordinates (empty before the first geo publish)."""
+    try:
+        df = get_connection().query(PROJECT_LOCATIONS_SQL, ttl=0)
+    except Exception:
+        return pd.DataFrame(columns=MAP_COLUMNS)
+    df["Kod Projek & Nama Projek"] = create_display_name(df)
+    df = load_project_overview(data_version).merge(
+        df[["Kod Projek & Nama Projek", "latitude", "longitude"]], on="Kod Projek & Nama Projek", how="inner"
     )
-    agg["Unit Non Bumi"] = agg["Total Unit"] - agg["Unit Bumi"]
+    return df[MAP_COLUMNS].reset_index(drop=True)
 
-    # --- 3. Merge Location & STATUS Data from Master ---
-    if df_master_all is not None and not df_master_all.empty:
-        dfm = df_master_all.copy()
-        
-        # We grab 'status_overall' here alongside location
-        keep_cols = ["Kod Projek & Nama Projek", "location_district", "location_state", "status_overall"]
-        keep_cols = [c for c in keep_cols if c in dfm.columns]
-        
-        df_loc = dfm[keep_cols].drop_duplicates(subset=["Kod Projek & Nama Projek"])
-        
-        if not df_loc.empty:
-            agg = agg.merge(df_loc, on="Kod Projek & Nama Projek", how="left")
-            # Rename DB columns to UI headers
-            agg = agg.rename(columns={
-                "location_district": "Daerah", 
-                "location_state": "Negeri",
-                "status_overall": "Status Projek"  # <--- NEW COLUMN MAPPING
-            })
-        else:
-            agg["Daerah"] = ""; agg["Negeri"] = ""; agg["Status Projek"] = ""
-    else:
-        agg["Daerah"] = ""; agg["Negeri"] = ""; agg["Status Projek"] = ""
+@perf_cached(st.cache_resource, max_entries=2, show_spinner=False)
+def load_project_spatial_index(data_version):
+    return build_spatial_index(load_project_locations(data_version))
 
-    # --- 4. Final Formatting ---
-    agg["Take-Up %"] = (agg["Unit Terjual"] / agg["Total Unit"] * 100).fillna(0).round(1)
-    
-    agg = agg.rename(columns={"pemaju_name": "Pemaju"})
-
-    # Select and Reorder columns (Added 'Status Projek')
-    target_cols = [
-        "Pemaju", "Kod Projek & Nama Projek", "Status Projek",
-        "Total Unit", "Unit Terjual",
-        "Unit Belum Jual", "Take-Up %", "Jumlah Jualan (RM)", "Unit Bumi",
-        "Unit Non Bumi", "Daerah", "Negeri",
-    ]
-    
-    final_cols = [c for c in target_cols if c in agg.columns]
-    agg = agg[final_cols].copy()
+# =========================================================
+# PRICE PER M²
+# =========================================================
+# house_pricing / price_percentiles are materialized by the publisher; the
+# drill-down reads analytics.build_price_index arrays built once per publish.
+@perf_cached(max_entries=2, show_spinner=False)
+def load_price_percentiles(data_version):
+    """Unit-weighted price per m² percentiles per district / house type / developer."""
+    try:
+        df = get_connection().query("SELECT * FROM price_percentiles;", ttl=0)
+    except Exception:
+        return pd.DataFrame()
+    return compact_frame(df, categorical=["dimension"])
 
-    agg = agg.sort_values(["Pemaju", "Kod Projek & Nama Projek"], na_position="last").reset_index(drop=True)
-    agg.insert(0, "No.", agg.index + 1)
-    return agg
+@perf_cached(max_entries=2, show_spinner=False)
+def load_house_pricing(data_version):
+    """One row per house type of each project's latest snapshot, with price per m²."""
+    try:
+        df = get_connection().query("SELECT * FROM house_pricing;", ttl=0)
+    except Exception:
+        return pd.DataFrame()
+    return compact_frame(df, categorical=["pemaju_name", "location_district", "house_type", "scraped_date"])
 
-def calculate_kpis(df):
-    """Returns a dictionary of KPI values for a given dataframe."""
-    if df.empty:
-        return {
-            "projects": 0, "units": 0, "sold": 0, "unsold": 0, 
-            "sales_rm": 0.0, "bumi": 0, "non_bumi": 0, "take_up": 0.0
-        }
-    
-    total_units = int(df["Total Unit"].sum())
-    total_sold = int(df["Unit Terjual"].sum())
-    
-    return {
-        "projects": int(df.shape[0]),
-        "units": total_units,
-        "sold": total_sold,
-        "unsold": int(df["Unit Belum Jual"].sum()),
-        "sales_rm": float(df["Jumlah Jualan (RM)"].sum()),
-        "bumi": int(df["Unit Bumi"].sum()),
-        "non_bumi": int(df["Unit Non Bumi"].sum()),
-        "take_up": (total_sold / total_units * 100) if total_units > 0 else 0.0
-    }
-
-def get_pemaju_list(df_master):
-    """Extracts unique developer names."""
-    # Check for English column name first, then fallback
-    if "pemaju_name" in df_master.columns:
-        return sorted(df_master["pemaju_name"].dropna().unique().tolist())
-    elif "Pemaju" in df_master.columns:
-        return sorted(df_master["Pemaju"].dropna().unique().tolist())
-    return []
+@perf_cached(st.cache_resource, max_entries=2, show_spinner=False)
+def load_price_index(data_version):
+    return build_price_index(load_house_pricing(data_version))
+
+@perf_cached(max_entries=2, show_spinner=False)
+def load_price_segments(data_version):
+    """District x house type segments (analytics.price_segments), once per publish."""
+    return price_segments(load_house_pricing(data_version))
+
+# =========================================================
+# EXPORTS
+# =========================================================
+# Built only when a download button is clicked (st.download_button with a
+# callable) and cached per filter fingerprint, so reruns never serialise data.
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+EXPORT_MODULES = {"Parquet": "pyarrow", "Excel": "openpyxl"}
+UNIT_EXPORT_CHUNKSIZE = 20000
+
+def available_export_formats():
+    return [f for f in EXPORT_FORMATS if importlib.util.find_spec(EXPORT_MODULES.get(f, "pandas"))]
+
+def frame_to_bytes(df, fmt):
+    buf = io.BytesIO()
+    if fmt == "CSV":
+        return df.to_csv(index=False).encode("utf-8-sig")
+    if fmt == "Parquet":
+        df.to_parquet(buf, index=False)
+    elif fmt == "Excel":
+        df.to_excel(buf, index=False, sheet_name="Projects")
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return buf.getvalue()
+
+@perf_cached(max_entries=32, show_spinner="Preparing export...")
+def export_projects(fingerprint, fmt):
+    """Filtered project overview as file bytes; fingerprint = (data_version, pemaju, search query)."""
+    data_version, pemaju, query = fingerprint
+    df = filter_projects(load_project_overview(data_version), pemaju, query, data_version)
+    return frame_to_bytes(df, fmt)
+
+@profiled
+def export_units_csv_gz(data_version, pemaju):
+    """
+    Every units_detail row of a developer ("All" = everything) as gzipped CSV.
+    Rows are streamed from the database in UNIT_EXPORT_CHUNKSIZE chunks and
+    compressed as they arrive, so the full table is never held as a DataFrame.
+    st.download_button reads whatever it is given into memory before serving
+    it (file objects included), so the gzip is built in memory once rather
+    than through a temp file. Only built on a click and deliberately not cached.
+    """
+    sql, params = "SELECT * FROM units_detail", {}
+    if pemaju != "All":
+        sql, params = sql + " WHERE pemaju_name = :pemaju", {"pemaju": pemaju}
+
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb") as gz:
+        with get_connection().engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True)
+            chunks = pd.read_sql(text(sql), conn, params=params, chunksize=UNIT_EXPORT_CHUNKSIZE)
+            for i, chunk in enumerate(chunks):
+                gz.write(chunk.to_csv(index=False, header=(i == 0)).encode("utf-8-sig" if i == 0 else "utf-8"))
+    return buf.getvalue()
 
 # =========================================================
 # SIDEBAR
@@ -316,25 +581,18 @@ with st.sidebar:
     st.markdown('<span class="pill">Beta</span>', unsafe_allow_html=True)
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
     
-    nav_items = ["Overview", "Projects", "Trends"]
+    nav_items = ["Overview", "Projects", "Trends", "Time Travel", "Map", "Pricing"]
     page = st.radio("Navigation", nav_items, index=0)
 
 
 # =========================================================
 # LOAD DATA (EXECUTION)
 # =========================================================
-df_master_all, df_units_all, df_house_all = load_data_from_supabase()
-
-# Build the main overview table
-df_projects_all = build_project_overview(df_master_all, df_units_all)
-
-# Get Sync Time
-last_sync = get_last_sync([df_master_all, df_units_all, df_house_all])
-
-# Get Developer List
-# We use the master DF which has 'pemaju_name', pass that to helper
-pemaju_list = get_pemaju_list(df_master_all)
-pemaju_options = ["All"] + pemaju_list
+# Nothing is loaded up front: each page calls its own cached loader below, so
+# the Trends page never pays for the overview and vice versa. Only the
+# data_version poll runs on every rerun.
+data_version = load_data_version()
+loaded_frames = {}
 
 
 # =========================================================
@@ -352,34 +610,43 @@ def card(title: str, value: str, sub: str = ""):
         unsafe_allow_html=True,
     )
 
-def compare_card(title, val_a, val_b, is_currency=False):
-    """Visual component for comparing two values side by side"""
-    
-    fmt_a = f"RM {val_a:,.0f}" if is_currency else f"{val_a:,}"
-    fmt_b = f"RM {val_b:,.0f}" if is_currency else f"{val_b:,}"
-    
-    color_a = "#E6EAF2"
-    color_b = "#E6EAF2"
+PAGE_SIZES = [25, 50, 100, 200]
 
-    st.markdown(
-        f"""
-        <div class="card" style="border-radius:12px; padding:16px; margin-bottom:12px;">
-            <div class="titleSmall" style="margin-bottom:8px;">{title}</div>
-            <div style="display:flex; justify-content:space-between; align-items:center;">
-                <div style="text-align:left;">
-                    <div style="font-size:10px; color:#A9B4C7; margin-bottom:2px;">DEVEL. A</div>
-                    <div style="font-size:20px; font-weight:700; color:{color_a};">{fmt_a}</div>
-                </div>
-                <div style="width:1px; height:30px; background:#203454;"></div>
-                <div style="text-align:right;">
-                    <div style="font-size:10px; color:#A9B4C7; margin-bottom:2px;">DEVEL. B</div>
-                    <div style="font-size:20px; font-weight:700; color:{color_b};">{fmt_b}</div>
-                </div>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+@st.fragment
+@profiled
+def paged_table(df, key, format_dict=None, sort_default=None):
+    """
+    Server-side paged, sorted table: sort + slice here, then format and send
+    only the visible page (Styler work and payload no longer grow with row count).
+    A fragment, so paging / sorting reruns just the table.
+    """
+    if df.empty:
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        return
+
+    cols = list(df.columns)
+    c_sort, c_order, c_size, c_page = st.columns([2, 1, 1, 1])
+    with c_sort:
+        sort_col = st.selectbox("Sort by", cols, index=cols.index(sort_default) if sort_default in cols else 0, key=f"{key}_sort")
+    with c_order:
+        descending = st.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order") == "Descending"
+    with c_size:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_size")
+    n_pages = max(1, -(-len(df) // page_size))
+    with c_page:
+        page_no = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key=f"{key}_page")
+    page_no = min(int(page_no), n_pages)
+
+    ordered = df.sort_values(sort_col, ascending=not descending, na_position="last", kind="stable")
+    start = (page_no - 1) * page_size
+    page_df = ordered.iloc[start:start + page_size]
+
+    if format_dict:
+        fmt = {c: f for c, f in format_dict.items() if c in page_df.columns}
+        st.dataframe(page_df.style.format(fmt), use_container_width=True, hide_index=True)
+    else:
+        st.dataframe(page_df, use_container_width=True, hide_index=True)
+    st.caption(f"Rows {start + 1:,}–{start + len(page_df):,} of {len(df):,} · page {page_no} of {n_pages}")
 
 def hero_total_sales(value_rm: float, subtitle="Across selected projects"):
     pretty = f"RM {value_rm:,.0f}"
@@ -394,10 +661,309 @@ def hero_total_sales(value_rm: float, subtitle="Across selected projects"):
         unsafe_allow_html=True,
     )
 
+# =========================================================
+# INTERACTIVE REGIONS (partial reruns)
+# =========================================================
+# Each region below is an st.fragment: changing one of its widgets (search box,
+# compare selectors, Trends pickers) reruns only that function against the
+# cached frames, not the whole script. Selections that drive other regions
+# (the Single View developer, the Time Travel dates) stay in the page body.
+@st.fragment
+def project_table(df_projects_all, selected, data_version, has_projects=True):
+    """Single View: search, export and the paged project table."""
+    bar1, bar2, bar3 = st.columns([3, 1, 1])
+    with bar1:
+        q = st.text_input("Search", value="", placeholder="Search project...")
+    with bar2:
+        export_fmt = st.selectbox("Format", available_export_formats())
+    with bar3:
+        st.markdown("<div style='height: 28px;'></div>", unsafe_allow_html=True)
+        ext, mime = EXPORT_FORMATS[export_fmt]
+        st.download_button(
+            f"⬇️ {export_fmt}",
+            data=lambda: export_projects((data_version, selected, q), export_fmt),
+            file_name=f"projects.{ext}", mime=mime,
+            use_container_width=True, disabled=not has_projects,
+        )
+
+    show_df = filter_projects(df_projects_all, selected, q, data_version)
+
+    format_dict = {"Jumlah Jualan (RM)": "RM {:,.0f}", "Take-Up %": "{:.1f}%"}
+    paged_table(show_df, "overview_projects", format_dict, sort_default="No.")
+
+@st.fragment
+def compare_panel(df_projects_all, data_version):
+    """Compare mode: dimension / group selectors and everything derived from them."""
+    col_dim, col_sel = st.columns([1, 3])
+    with col_dim:
+        dim_label = st.radio("Compare by", list(COMPARE_DIMENSIONS), horizontal=True)
+    dim_col = COMPARE_DIMENSIONS[dim_label]
+    options = load_dimension_options(data_version, dim_col)
+    with col_sel:
+        chosen = st.multiselect(f"{dim_label}s", options, default=options[:2], key=f"compare_{dim_col}")
+
+    if not chosen:
+        st.info(f"Pick one or more {dim_label.lower()}s to compare.")
+    else:
+        # One grouped pass over the whole market, cached per selection set
+        matrix = load_comparison(data_version, dim_col, tuple(sorted(chosen)))
+        n_groups = matrix.attrs.get("n_groups", 0)
+        groups = [g for g in matrix.index if g != MARKET_LABEL]
+
+        # Headline cards, one column per selected group (4 per row)
+        for start in range(0, len(groups), 4):
+            row = st.columns(4)
+            for col, g in zip(row, groups[start:start + 4]):
+                m = matrix.loc[g]
+                with col:
+                    st.markdown(f"#### {g}")
+                    hero_total_sales(m["sales_rm"], f"Rank {int(m['rank_sales_rm'])} of {n_groups} by sales")
+                    st.write("")
+                    r1, r2 = st.columns(2)
+                    with r1: card("Projects", f"{int(m['projects'])}")
+                    with r2: card("Take-Up Rate", f"{m['take_up']:.1f}%", f"Rank {int(m['rank_take_up'])} of {n_groups}")
+
+        # Comparison matrix (selected groups + whole market benchmark)
+        st.markdown("#### Side-by-Side Breakdown")
+        show = matrix.rename(columns={
+            "projects": "Projects", "units": "Total Units", "sold": "Units Sold", "unsold": "Units Unsold",
+            "sales_rm": "Sales (RM)", "bumi": "Bumi Units", "non_bumi": "Non-Bumi Units",
+            "take_up": "Take-Up %", "bumi_share": "Bumi Share %", "sales_per_project": "Sales / Project (RM)",
+            "rank_sales_rm": "Sales Rank", "rank_units": "Units Rank", "rank_take_up": "Take-Up Rank",
+        })
+        count_fmt = "{:,.0f}"
+        st.dataframe(
+            show.style.format({
+                "Projects": count_fmt, "Total Units": count_fmt, "Units Sold": count_fmt,
+                "Units Unsold": count_fmt, "Bumi Units": count_fmt, "Non-Bumi Units": count_fmt,
+                "Sales (RM)": "RM {:,.0f}", "Sales / Project (RM)": "RM {:,.0f}",
+                "Take-Up %": "{:.1f}%", "Bumi Share %": "{:.1f}%",
+                "Sales Rank": count_fmt, "Units Rank": count_fmt, "Take-Up Rank": count_fmt,
+            }, na_rep="—"),
+            use_container_width=True,
+        )
+        st.bar_chart(matrix["take_up"].rename("Take-Up %"))
+
+        # Detailed project tables per group
+        st.markdown("#### Project Lists")
+        for tab, g in zip(st.tabs(groups), groups):
+            with tab:
+                df_g = df_projects_all[df_projects_all[dim_col] == g]
+                st.dataframe(df_g[["Pemaju", "Kod Projek & Nama Projek", "Total Unit", "Unit Terjual", "Take-Up %", "Jumlah Jualan (RM)"]], use_container_width=True, hide_index=True)
+
+@st.fragment
+def project_directory(df_projects_all, data_version):
+    """Projects page: search box and the paged directory."""
+    search_term = st.text_input("Search Projects", placeholder="Type to search...")
+
+    display_df = search_projects(df_projects_all, search_term, data_version)
+
+    format_dict = {"Jumlah Jualan (RM)": "RM {:,.0f}", "Take-Up %": "{:.1f}%"}
+    paged_table(display_df, "projects_directory", format_dict, sort_default="No.")
+
+@st.fragment
+def project_trends(df_index, data_version):
+    """Trends: developer / project pickers, velocity cards and the sales chart."""
+    # 3. Filter by Developer
+    dev_list = sorted(df_index["developer_name"].dropna().unique())
+    sel_dev = st.selectbox("Select Developer", dev_list)
+    
+    df_dev_projects = df_index[df_index["developer_name"] == sel_dev]
+    
+    if df_dev_projects.empty:
+        st.info("No data for this developer.")
+    else:
+        # 4. Filter by Project (Using the new Unique Label)
+        # Sort by project name for easier finding
+        label_to_code = dict(zip(df_dev_projects["project_label"], df_dev_projects["project_code"]))
+        projects = sorted(label_to_code)
+        selected_label = st.selectbox("Select Project (Code | Name)", projects)
+        
+        # Fetch only this project's series (parameterised, cached per key)
+        chart_data = load_project_history(data_version, sel_dev, label_to_code[selected_label]).copy()
+        loaded_frames["history_logs rows"] = chart_data
+        
+        # 5. Velocity Metrics (Weekly, Monthly, etc.), precomputed for all projects
+        df_velocity = load_sales_velocity(data_version)
+        loaded_frames["velocity projects"] = df_velocity
+        vel = df_velocity[
+            (df_velocity["developer_name"] == sel_dev)
+            & (df_velocity["project_code"] == label_to_code[selected_label])
+        ]
+        
+        if not vel.empty:
+            v = vel.iloc[0]
+
+            # 6. Display Metrics Cards
+            st.markdown("### Sales Velocity")
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Weekly Sold", f"{v['sold_7d']} Units", help="Change in last 7 days")
+            c2.metric("Monthly Sold", f"{v['sold_30d']} Units", help="Change in last 30 days")
+            c3.metric("Quarterly Sold", f"{v['sold_90d']} Units", help="Change in last 90 days")
+            c4.metric("Yearly Sold", f"{v['sold_365d']} Units", help="Change in last 365 days")
+
+        # 7. Render Chart
+        st.divider()
+        st.subheader(f"Total Sales Trajectory")
+        # We ensure chart_data is sorted ASC for the line chart
+        chart_data_asc = chart_data.sort_values(by="scraped_date", ascending=True)
+        
+        st.line_chart(chart_data_asc, x="scraped_date", y="units_sold")
+        
+        st.caption(f"Tracking metric: Cumulative units_sold for project {selected_label}")
+
+        # Optional: Show raw data table below chart
+        with st.expander("View Raw Historical Data"):
+            st.dataframe(chart_data_asc[["scraped_date", "units_sold", "total_units", "take_up_rate"]], use_container_width=True)
+
+@st.fragment
+def velocity_leaderboard(data_version):
+    """Trends: leaderboard across all projects for the chosen window."""
+    # 8. Leaderboard across all projects (same precomputed velocity)
+    st.divider()
+    st.subheader("🏁 Velocity Leaderboard")
+    window_labels = {"Weekly": "sold_7d", "Monthly": "sold_30d", "Quarterly": "sold_90d", "Yearly": "sold_365d"}
+    window = window_labels[st.radio("Window", list(window_labels), index=1, horizontal=True)]
+    window_days = VELOCITY_WINDOWS[window]
+    board = load_sales_velocity(data_version)
+    board_cols = ["developer_name", "project_code", "project_name", window,
+                  "units_sold", "units_unsold", "total_units", "scraped_date"]
+
+    tab_fast, tab_stalled = st.tabs(["Fastest sellers", "Stalled projects"])
+    with tab_fast:
+        fastest = board[board[window] > 0].sort_values(window, ascending=False)
+        st.dataframe(fastest[board_cols].head(50), use_container_width=True, hide_index=True)
+    with tab_stalled:
+        # Only projects tracked for the whole window, with stock left and no sales in it
+        stalled = board[
+            (board["history_days"] >= window_days) & (board["units_unsold"] > 0) & (board[window] <= 0)
+        ].sort_values("units_unsold", ascending=False)
+        if stalled.empty:
+            st.info(f"No stalled projects (history must cover {window_days} days).")
+        else:
+            st.dataframe(stalled[board_cols], use_container_width=True, hide_index=True)
+
+MAP_COLORS = {"selected": "#E5484D", "same developer": "#3E9BFF", "competitor": "#F5A524"}
+
+@st.fragment
+def project_map(df_loc, data_version):
+    """Map page: pick a project, then projects within a radius and its nearest competitors."""
+    c_proj, c_radius, c_k = st.columns([3, 1, 1])
+    with c_proj:
+        labels = df_loc["Kod Projek & Nama Projek"].astype(str).tolist()
+        label = st.selectbox("Project", labels)
+    with c_radius:
+        radius_km = st.slider("Radius (km)", 1, 50, 5)
+    with c_k:
+        k = int(st.number_input("Nearest competitors", min_value=1, max_value=50, value=5, step=1))
+
+    index = load_project_spatial_index(data_version)
+    center = df_loc.iloc[labels.index(label)]
+    lat, lon = float(center["latitude"]), float(center["longitude"])
+    pemaju = df_loc["Pemaju"].astype(str).to_numpy()
+
+    pos, dist = projects_within(index, lat, lon, radius_km)
+    nearby = df_loc.iloc[pos].assign(**{"Distance (km)": dist.round(2)})
+    nearby["Role"] = np.where(
+        nearby["Kod Projek & Nama Projek"] == label, "selected",
+        np.where(nearby["Pemaju"].astype(str) == str(center["Pemaju"]), "same developer", "competitor"),
+    )
+
+    # Map layer: the radius result, coloured by role
+    layer = nearby[["latitude", "longitude", "Role"]].copy()
+    layer["color"] = layer["Role"].map(MAP_COLORS)
+    layer["size"] = np.where(layer["Role"] == "selected", 120, 60)
+    st.map(layer, latitude="latitude", longitude="longitude", color="color", size="size")
+    st.caption(" · ".join(f"{role}: {color}" for role, color in MAP_COLORS.items()))
+
+    table_cols = ["Distance (km)", "Role"] + [c for c in MAP_COLUMNS if c not in ("latitude", "longitude")]
+    format_dict = {"Jumlah Jualan (RM)": "RM {:,.0f}", "Take-Up %": "{:.1f}%", "Distance (km)": "{:.2f}"}
+    st.markdown(f"### Projects within {radius_km} km ({len(nearby) - 1:,} besides the selected one)")
+    st.dataframe(nearby[table_cols].style.format(format_dict), use_container_width=True, hide_index=True)
+
+    st.markdown(f"### {k} nearest competitor projects")
+    comp_pos, comp_dist = nearest_projects(index, lat, lon, k, eligible=pemaju != str(center["Pemaju"]))
+    competitors = df_loc.iloc[comp_pos].assign(**{"Distance (km)": comp_dist.round(2)})
+    if competitors.empty:
+        st.info("No other developer has a located project.")
+    else:
+        st.dataframe(competitors[["Distance (km)"] + table_cols[2:]].style.format(format_dict),
+                     use_container_width=True, hide_index=True)
+
+PSM_FORMAT = {f"P{int(q * 100)} (RM/m²)": "RM {:,.0f}" for q in PRICE_QUANTILES}
+PSM_COLUMNS = {f"psm_p{int(q * 100)}": f"P{int(q * 100)} (RM/m²)" for q in PRICE_QUANTILES}
+
+@st.fragment
+def price_percentiles_panel(df_pct):
+    """Pricing: percentile table and median chart for one dimension."""
+    dim_label = st.radio("Percentiles by", list(PRICE_DIMENSIONS), horizontal=True)
+    rows = df_pct[df_pct["dimension"] == PRICE_DIMENSIONS[dim_label]].sort_values("units", ascending=False)
+    show = rows.drop(columns=["dimension"]).rename(columns={
+        "group_name": dim_label, "house_types": "House Types", "projects": "Projects", "units": "Units",
+        "psm_mean": "Mean (RM/m²)", "price_p50": "Median Price (RM)", **PSM_COLUMNS,
+    })
+    st.dataframe(
+        show.style.format({**PSM_FORMAT, "Mean (RM/m²)": "RM {:,.0f}", "Median Price (RM)": "RM {:,.0f}",
+                           "Units": "{:,.0f}"}, na_rep="—"),
+        use_container_width=True, hide_index=True,
+    )
+    st.bar_chart(show.head(25).set_index(dim_label)["P50 (RM/m²)"])
+
+@st.fragment
+def price_drilldown(data_version):
+    """Pricing: percentiles and distribution of any district / house type / developer / rooms selection."""
+    index = load_price_index(data_version)
+    cols = st.columns(len(PRICE_DIMENSIONS) + 1)
+    filters = {}
+    for col, (label, dim_col) in zip(cols, PRICE_DIMENSIONS.items()):
+        with col:
+            filters[dim_col] = st.multiselect(label, index["labels"][dim_col], key=f"price_{dim_col}")
+    with cols[-1]:
+        room_options = sorted(int(r) for r in set(index["rooms"][~np.isnan(index["rooms"])]))
+        rooms = st.multiselect("Rooms", room_options, key="price_rooms")
+
+    stats = price_stats(index, filters, rooms)
+    if not stats["house_types"]:
+        st.info("No priced house types match this selection.")
+        return
+    q = stats["quantiles"]
+    m1, m2, m3, m4, m5 = st.columns(5)
+    m1.metric("P10 (RM/m²)", f"RM {q[0.10]:,.0f}")
+    m2.metric("Median (RM/m²)", f"RM {q[0.50]:,.0f}")
+    m3.metric("P90 (RM/m²)", f"RM {q[0.90]:,.0f}")
+    m4.metric("Median Price", f"RM {stats['price_p50']:,.0f}")
+    m5.metric("Units", f"{stats['units']:,}", f"{stats['house_types']:,} house types · {stats['projects']:,} projects",
+              delta_color="off")
+    st.bar_chart(stats["histogram"], x="RM/m²", y="Units")
+
+@st.fragment
+def oversupply_segments(data_version):
+    """Pricing: district x house type segments, by stock or by weakest take-up."""
+    seg = load_price_segments(data_version)
+    order = st.radio("Sort segments by", ["Most units", "Lowest take-up"], horizontal=True)
+    seg = seg.sort_values(["take_up", "all_units"] if order == "Lowest take-up" else "all_units",
+                          ascending=[True, False] if order == "Lowest take-up" else False, na_position="last")
+    show = seg.drop(columns=["segment", "house_types", "units", "psm_mean", "psm_p10", "psm_p90"]).rename(columns={
+        "location_district": "Daerah", "house_type": "Jenis Rumah", "all_house_types": "House Types",
+        "all_units": "Units", "take_up": "Take-Up %", "projects": "Priced Projects",
+        "price_p50": "Median Price (RM)", **PSM_COLUMNS,
+    })
+    st.dataframe(
+        show.style.format({**PSM_FORMAT, "Median Price (RM)": "RM {:,.0f}", "Units": "{:,.0f}",
+                           "Take-Up %": "{:.1f}%", "Priced Projects": "{:,.0f}"}, na_rep="—"),
+        use_container_width=True, hide_index=True,
+    )
+
 # =========================================================
 # PAGE: OVERVIEW
 # =========================================================
+page_started = time.perf_counter()
 if page == "Overview":
+    df_projects_all = load_project_overview(data_version)
+    df_developers = load_developer_summary(data_version)
+    last_sync = load_last_sync(data_version)
+    pemaju_options = ["All"] + load_pemaju_list(data_version)
+    loaded_frames["project overview"] = df_projects_all
     
     # 1. Header & View Mode Switch
     c1, c2 = st.columns([2, 1])
@@ -421,26 +987,16 @@ if page == "Overview":
         selected = st.selectbox("Select Pemaju", pemaju_options, index=default_index)
         st.session_state.selected_pemaju = selected
 
-        # Data subset
+        # Data subset (house types fetched for this developer only)
         if selected != "All":
-            df_projects = df_projects_all[df_projects_all["Pemaju"] == selected].copy()
-            # Note: df_house has 'pemaju_name' from DB, we didn't rename it in loader
-            # but we should check which column to filter on.
-            if not df_house_all.empty:
-                if "pemaju_name" in df_house_all.columns:
-                     df_house = df_house_all[df_house_all["pemaju_name"] == selected].copy()
-                elif "Pemaju" in df_house_all.columns:
-                     df_house = df_house_all[df_house_all["Pemaju"] == selected].copy()
-                else:
-                    df_house = pd.DataFrame()
-            else:
-                df_house = pd.DataFrame()
+            df_projects = df_projects_all[df_projects_all["Pemaju"] == selected]
         else:
-            df_projects = df_projects_all.copy()
-            df_house = df_house_all.copy()
+            df_projects = df_projects_all
+        df_house = load_house_types(data_version, selected)
+        loaded_frames["house types"] = df_house
 
-        # KPIs
-        kpis = calculate_kpis(df_projects)
+        # KPIs (pre-aggregated per developer when the publisher has built developer_summary)
+        kpis = developer_kpis(df_developers, selected) if not df_developers.empty else calculate_kpis(df_projects)
 
         # Layout
         left, hero, right = st.columns([1.1, 2.2, 1.1])
@@ -464,272 +1020,231 @@ if page == "Overview":
 
         # Table
         st.markdown("### Project Overview")
-        bar1, bar2 = st.columns([3, 1])
-        with bar1:
-            q = st.text_input("Search", value="", placeholder="Search project...")
-        with bar2:
-            st.markdown("<div style='height: 28px;'></div>", unsafe_allow_html=True)
-            csv_data = df_projects.to_csv(index=False).encode("utf-8-sig") if not df_projects.empty else b""
-            st.download_button("⬇️ CSV", data=csv_data, file_name="data.csv", mime="text/csv", use_container_width=True, disabled=df_projects.empty)
-
-        show_df = df_projects.copy()
-        if q.strip() and not show_df.empty:
-            qq = q.strip().lower()
-            mask = show_df.astype(str).apply(lambda col: col.str.lower().str.contains(qq, na=False))
-            show_df = show_df[mask.any(axis=1)]
-
-        if not show_df.empty:
-            format_dict = {"Jumlah Jualan (RM)": "RM {:,.0f}", "Take-Up %": "{:.1f}%"}
-            st.dataframe(show_df.style.format(format_dict), use_container_width=True, hide_index=True)
-        else:
-            st.dataframe(show_df, use_container_width=True, hide_index=True)
+        project_table(df_projects_all, selected, data_version, has_projects=not df_projects.empty)
 
         # House Types
         st.markdown("### House Type Details")
         if not df_house.empty:
             # Drop technical ID/Timestamp columns for cleaner view if desired
             display_cols = [c for c in df_house.columns if c not in ['id', 'created_at', 'scraped_timestamp']]
-            st.dataframe(df_house[display_cols], use_container_width=True, hide_index=True)
+            paged_table(df_house[display_cols], "overview_house_types", sort_default="project_code")
         else:
             st.info("No house type data.")
 
+        # Bulk export (unit level, built from the database on click, never cached)
+        with st.expander("⬇️ Bulk export: unit-level data"):
+            scope = "all developers" if selected == "All" else selected
+            st.caption(f"Every unit row in units_detail for {scope}, as gzipped CSV.")
+            st.download_button(
+                "⬇️ Units CSV (.csv.gz)",
+                data=lambda: export_units_csv_gz(data_version, selected),
+                file_name="units_detail.csv.gz", mime="application/gzip",
+            )
+
     # ==========================
     # MODE: COMPARE VIEW
     # ==========================
     else:
         st.markdown("### ⚔️ Developer Comparison")
         
-        # Selectors
-        col_sel_a, col_sel_b = st.columns(2)
-        with col_sel_a:
-            pemaju_a = st.selectbox("Developer A", pemaju_list, index=0 if len(pemaju_list) > 0 else 0)
-        with col_sel_b:
-            # Try to pick a different default for B if possible
-            default_b = 1 if len(pemaju_list) > 1 else 0
-            pemaju_b = st.selectbox("Developer B", pemaju_list, index=default_b)
-
-        # Get Data & Project Lists
-        # ------------------------------------------------
-        # Developer A
-        raw_df_a = df_projects_all[df_projects_all["Pemaju"] == pemaju_a]
-        projects_a = sorted(raw_df_a["Kod Projek & Nama Projek"].unique()) if not raw_df_a.empty else []
-        
-        with col_sel_a:
-            sel_projects_a = st.multiselect("Projects (Dev A)", projects_a, default=[])
-            
-        if sel_projects_a:
-            df_a = raw_df_a[raw_df_a["Kod Projek & Nama Projek"].isin(sel_projects_a)]
-        else:
-            # Default to all if none selected, or strict? 
-            # Original logic: "fallback... usually showing nothing or everything". 
-            # Let's show ALL projects by default if none selected for easier comparison.
-            df_a = raw_df_a 
-
-        # Developer B
-        raw_df_b = df_projects_all[df_projects_all["Pemaju"] == pemaju_b]
-        projects_b = sorted(raw_df_b["Kod Projek & Nama Projek"].unique()) if not raw_df_b.empty else []
-        
-        with col_sel_b:
-            sel_projects_b = st.multiselect("Projects (Dev B)", projects_b, default=[])
-            
-        if sel_projects_b:
-            df_b = raw_df_b[raw_df_b["Kod Projek & Nama Projek"].isin(sel_projects_b)]
-        else:
-            df_b = raw_df_b
-
-        # Calculate KPIs
-        kpi_a = calculate_kpis(df_a)
-        kpi_b = calculate_kpis(df_b)
-
-        # Visual Comparison
-        c_left, c_right = st.columns(2)
-
-        with c_left:
-            st.markdown(f"#### {pemaju_a}")
-            hero_total_sales(kpi_a['sales_rm'], "Total Sales Value")
-            st.write("")
-            r1, r2 = st.columns(2)
-            with r1: card("Projects", str(kpi_a['projects']))
-            with r2: card("Take-Up Rate", f"{kpi_a['take_up']:.1f}%")
-            
-        with c_right:
-            st.markdown(f"#### {pemaju_b}")
-            hero_total_sales(kpi_b['sales_rm'], "Total Sales Value")
-            st.write("")
-            r1, r2 = st.columns(2)
-            with r1: card("Projects", str(kpi_b['projects']))
-            with r2: card("Take-Up Rate", f"{kpi_b['take_up']:.1f}%")
-
-        # Side by Side Metrics
-        st.markdown("#### Side-by-Side Breakdown")
-        
-        row1_1, row1_2, row1_3 = st.columns(3)
-        with row1_1: compare_card("Total Units", kpi_a['units'], kpi_b['units'])
-        with row1_2: compare_card("Units Sold", kpi_a['sold'], kpi_b['sold'])
-        with row1_3: compare_card("Units Unsold", kpi_a['unsold'], kpi_b['unsold'])
-        
-        row2_1, row2_2, row2_3 = st.columns(3)
-        with row2_1: compare_card("Bumi Units", kpi_a['bumi'], kpi_b['bumi'])
-        with row2_2: compare_card("Non-Bumi Units", kpi_a['non_bumi'], kpi_b['non_bumi'])
-        # Placeholder or gap
-        
-        # Detailed Projects Table for both
-        st.markdown(f"#### Project List: {pemaju_a}")
-        if not df_a.empty:
-            st.dataframe(df_a[["Kod Projek & Nama Projek", "Total Unit", "Unit Terjual", "Take-Up %", "Jumlah Jualan (RM)"]], use_container_width=True, hide_index=True)
-        else:
-            st.info("No data")
-        
-        st.markdown(f"#### Project List: {pemaju_b}")
-        if not df_b.empty:
-            st.dataframe(df_b[["Kod Projek & Nama Projek", "Total Unit", "Unit Terjual", "Take-Up %", "Jumlah Jualan (RM)"]], use_container_width=True, hide_index=True)
-        else:
-            st.info("No data")
-
+        compare_panel(df_projects_all, data_version)
 
 # =========================================================
 # PAGE: PROJECTS
 # =========================================================
 elif page == "Projects":
     st.markdown("## Project Directory")
+    df_projects_all = load_project_overview(data_version)
+    loaded_frames["project overview"] = df_projects_all
     
     # Simple table of all projects
     if not df_projects_all.empty:
-        search_term = st.text_input("Search Projects", placeholder="Type to search...")
-        
-        display_df = df_projects_all.copy()
-        if search_term:
-            display_df = display_df[display_df.astype(str).apply(lambda x: x.str.contains(search_term, case=False, na=False)).any(axis=1)]
-
-        format_dict = {"Jumlah Jualan (RM)": "RM {:,.0f}", "Take-Up %": "{:.1f}%"}
-        st.dataframe(
-            display_df.style.format(format_dict),
-            use_container_width=True,
-            hide_index=True,
-            height=600
-        )
+        project_directory(df_projects_all, data_version)
     else:
         st.info("No projects found.")
 
 
-# =========================================================
-# PAGE: TRENDS
-# =========================================================
-# =========================================================
-# PAGE: TRENDS (Connected to Supabase)
-# =========================================================
 # =========================================================
 # PAGE: TRENDS (Connected to Supabase)
 # =========================================================
 elif page == "Trends":
     st.markdown("## 📈 Sales Trends")
-    st.caption("Data source: Supabase (history_logs)")
+    st.caption(f"Data source: {DB_LABEL} (history_logs)")
 
-    # 1. Connect to Database
-    conn = st.connection("supabase", type="sql")
-    
-    # 2. Fetch History Data
+    # 1. Fetch the developer / project list (small, cached)
     try:
-        # We order by date ASC initially for the chart
-        df_hist = conn.query("SELECT * FROM history_logs ORDER BY scraped_date ASC;", ttl=0)
+        df_index = load_history_index(data_version)
+        loaded_frames["history_logs projects"] = df_index
     except Exception as e:
+        # No st.stop(): the Debug Panel still renders (and ends the rerun's cProfile)
         st.error(f"Error connecting to database: {e}")
-        st.stop()
+        df_index = None
 
-    if df_hist.empty:
+    if df_index is None:
+        pass
+    elif df_index.empty:
         st.info("No history logs available yet. (Run the publisher script to generate data!)")
     else:
-        # --- PRE-PROCESSING ---
-        # Create a "Combined Label" to handle duplicate names with different codes
-        # Format: "CODE | NAME"
-        df_hist["project_label"] = df_hist["project_code"].astype(str) + " | " + df_hist["project_name"].astype(str)
-        
-        # Ensure date is datetime
-        df_hist["scraped_date"] = pd.to_datetime(df_hist["scraped_date"])
-
-        # 3. Filter by Developer
-        dev_list = sorted(df_hist["developer_name"].unique())
-        sel_dev = st.selectbox("Select Developer", dev_list)
-        
-        df_dev_hist = df_hist[df_hist["developer_name"] == sel_dev]
-        
-        if df_dev_hist.empty:
-            st.info("No data for this developer.")
-        else:
-            # 4. Filter by Project (Using the new Unique Label)
-            # Sort by project name for easier finding
-            projects = sorted(df_dev_hist["project_label"].unique())
-            selected_label = st.selectbox("Select Project (Code | Name)", projects)
-            
-            # Filter data to this specific project
-            chart_data = df_dev_hist[df_dev_hist["project_label"] == selected_label].copy()
-            
-            # 5. Calculate Velocity Metrics (Weekly, Monthly, etc.)
-            # We need to sort DESCENDING by date to find "Latest" vs "Past"
-            df_sorted = chart_data.sort_values(by="scraped_date", ascending=False).reset_index(drop=True)
-            
-            if not df_sorted.empty:
-                current_record = df_sorted.iloc[0]
-                current_sold = current_record["units_sold"]
-                current_date = current_record["scraped_date"]
-                
-                # Helper function to find sales X days ago
-                def get_sales_delta(days_ago):
-                    target_date = current_date - pd.Timedelta(days=days_ago)
-                    # Find records on or before target date
-                    past_records = df_sorted[df_sorted["scraped_date"] <= target_date]
-                    
-                    if past_records.empty:
-                        return 0 # No data that far back
-                    
-                    # Get the most recent record from that time (closest to target)
-                    past_record = past_records.iloc[0] 
-                    past_sold = past_record["units_sold"]
-                    
-                    delta = current_sold - past_sold
-                    # If delta is negative (e.g. returns/cancellation), show 0 or actual neg
-                    return delta
-
-                # Calculate Deltas
-                sold_week = get_sales_delta(7)
-                sold_month = get_sales_delta(30)
-                sold_quarter = get_sales_delta(90)
-                sold_year = get_sales_delta(365)
-
-                # 6. Display Metrics Cards
-                st.markdown("### Sales Velocity")
-                c1, c2, c3, c4 = st.columns(4)
-                c1.metric("Weekly Sold", f"{sold_week} Units", help="Change in last 7 days")
-                c2.metric("Monthly Sold", f"{sold_month} Units", help="Change in last 30 days")
-                c3.metric("Quarterly Sold", f"{sold_quarter} Units", help="Change in last 90 days")
-                c4.metric("Yearly Sold", f"{sold_year} Units", help="Change in last 365 days")
-
-            # 7. Render Chart
-            st.divider()
-            st.subheader(f"Total Sales Trajectory")
-            # We ensure chart_data is sorted ASC for the line chart
-            chart_data_asc = chart_data.sort_values(by="scraped_date", ascending=True)
-            
-            st.line_chart(chart_data_asc, x="scraped_date", y="units_sold")
-            
-            st.caption(f"Tracking metric: Cumulative units_sold for project {selected_label}")
-
-            # Optional: Show raw data table below chart
-            with st.expander("View Raw Historical Data"):
-                st.dataframe(chart_data_asc[["scraped_date", "units_sold", "total_units", "take_up_rate"]], use_container_width=True)
+        project_trends(df_index, data_version)
+        velocity_leaderboard(data_version)
 
 # =========================================================
-# DEBUG PANEL
+# PAGE: TIME TRAVEL
 # =========================================================
-with st.expander("🛠 Debug Panel", expanded=False):
-    st.write(f"Supabase Connection Active")
-    st.write(f"Projects Loaded: {len(df_projects_all)}")
+elif page == "Time Travel":
+    st.markdown("## 🕰️ Time Travel")
+    st.caption(f"Project overview reconstructed from {DB_LABEL} history_logs as of any scraped date")
 
+    try:
+        dates = load_history_dates(data_version)
+    except Exception as e:
+        # No st.stop(): the Debug Panel still renders (and ends the rerun's cProfile)
+        st.error(f"Error connecting to database: {e}")
+        dates = None
 
+    if dates is None:
+        pass
+    elif not dates:
+        st.info("No history logs available yet. (Run the publisher script to generate data!)")
+    else:
+        c_asof, c_before = st.columns(2)
+        with c_asof:
+            as_of = st.selectbox("As of", dates[::-1], index=0)
+        with c_before:
+            earlier = [d for d in dates[::-1] if d < as_of]
+            before = st.selectbox("Compare with", earlier, index=0) if earlier else None
+
+        df_asof = load_overview_as_of(data_version, as_of)
+        loaded_frames[f"overview as of {as_of}"] = df_asof
+        kpis = calculate_kpis(df_asof)
+        kpis_before = calculate_kpis(load_overview_as_of(data_version, before)) if before else None
+
+        def delta(k):
+            return None if kpis_before is None else kpis[k] - kpis_before[k]
+
+        st.markdown(f"### KPIs as of {as_of}" + (f" (vs {before})" if before else ""))
+        k1, k2, k3, k4, k5 = st.columns(5)
+        k1.metric("Projects", f"{kpis['projects']:,}", delta("projects"))
+        k2.metric("Total Units", f"{kpis['units']:,}", delta("units"))
+        k3.metric("Units Sold", f"{kpis['sold']:,}", delta("sold"))
+        k4.metric("Sales (RM)", f"RM {kpis['sales_rm']:,.0f}",
+                  None if kpis_before is None else f"RM {delta('sales_rm'):,.0f}")
+        k5.metric("Take-Up Rate", f"{kpis['take_up']:.1f}%",
+                  None if kpis_before is None else f"{delta('take_up'):.1f} pp")
+
+        st.markdown(f"### Project Overview as of {as_of}")
+        st.caption(f"{ASOF_UNSOLD_LABEL}: history_logs keeps no per-status counts, so this is every unit "
+                   "not sold (the current overview's Unit Belum Jual counts only units listed as Belum Dijual)")
+        format_dict = {"Jumlah Jualan (RM)": "RM {:,.0f}", "Take-Up %": "{:.1f}%"}
+        paged_table(df_asof.rename(columns={"Unit Belum Jual": ASOF_UNSOLD_LABEL}), "time_travel_overview",
+                    format_dict, sort_default="No.")
+
+        if before:
+            st.markdown(f"### What changed between {before} and {as_of}")
+            df_diff = diff_overviews(df_asof, load_overview_as_of(data_version, before))
+            changed = df_diff[
+                (df_diff["Change"] != "")
+                | (df_diff["Δ Unit Terjual"] != 0)
+                | (df_diff["Δ Total Unit"] != 0)
+            ]
+            if changed.empty:
+                st.info("No project changed between these dates.")
+            else:
+                paged_table(changed, "time_travel_diff", {
+                    "Jumlah Jualan (RM)": "RM {:,.0f}", "Jumlah Jualan (RM) (before)": "RM {:,.0f}",
+                    "Δ Jumlah Jualan (RM)": "RM {:+,.0f}", "Take-Up %": "{:.1f}%",
+                    "Take-Up % (before)": "{:.1f}%", "Δ Take-Up %": "{:+.1f}",
+                    "Δ Total Unit": "{:+,.0f}", "Δ Unit Terjual": "{:+,.0f}",
+                }, sort_default="Δ Unit Terjual")
 
+# =========================================================
+# PAGE: MAP
+# =========================================================
+elif page == "Map":
+    st.markdown("## 🗺️ Project Map")
+    st.caption(f"Project coordinates from the \"Lokasi Projek\" map links ({DB_LABEL} projects_master)")
+
+    df_loc = load_project_locations(data_version)
+    loaded_frames["located projects"] = df_loc
+    if df_loc.empty:
+        st.info("No project coordinates published yet. (Run the publisher script to parse Lokasi Projek!)")
+    else:
+        project_map(df_loc, data_version)
 
+# =========================================================
+# PAGE: PRICING
+# =========================================================
+elif page == "Pricing":
+    st.markdown("## 📐 Price per m²")
+    st.caption(f"House-type prices over built-up area from {DB_LABEL} house_types (each project's latest snapshot), weighted by units")
+
+    df_pct = load_price_percentiles(data_version)
+    loaded_frames["price percentiles"] = df_pct
+    if df_pct.empty:
+        st.info("No price analytics published yet. (Run the publisher script to build them!)")
+    else:
+        market = df_pct[df_pct["dimension"] == "market"]
+        if not market.empty:
+            m = market.iloc[0]
+            c1, c2, c3, c4 = st.columns(4)
+            with c1: card("Market Median", f"RM {m['psm_p50']:,.0f}/m²", "Unit-weighted")
+            with c2: card("P25 – P75", f"RM {m['psm_p25']:,.0f} – {m['psm_p75']:,.0f}", "Per m²")
+            with c3: card("Median Price", f"RM {m['price_p50']:,.0f}", "Mid of min/max price")
+            with c4: card("Priced Units", f"{int(m['units']):,}", f"{int(m['house_types']):,} house types")
 
+        st.markdown("### Percentiles")
+        price_percentiles_panel(df_pct)
 
+        st.markdown("### Drill Down")
+        price_drilldown(data_version)
 
+        st.markdown("### Segments: price vs take-up")
+        st.caption("District × house type. Low take-up on many units flags oversupply; take-up is the projects' overall rate.")
+        oversupply_segments(data_version)
 
+# =========================================================
+# DEBUG PANEL
+# =========================================================
+page_ms = (time.perf_counter() - page_started) * 1000
+if _profiler is not None:
+    _profiler.disable()
+    st.session_state.pop("_rerun_profiler", None)
 
+with st.expander("🛠 Debug Panel", expanded=False):
+    st.write(f"{DB_LABEL} Connection Active")
+    st.write(f"Data version: {data_version}")
+    st.write(f"Rerun: {(time.perf_counter() - PERF['started']) * 1000:,.0f} ms total · page '{page}' rendered in {page_ms:,.0f} ms")
+    st.caption("Figures are from the last full rerun. Interactions inside a fragment (tables, charts, map, "
+               "pricing drill-down) rerun only that fragment and show up here on the next full rerun.")
+
+    # Timings + cache hit/miss per loader / helper (this rerun)
+    if PERF["calls"]:
+        cached = PERF_CACHED
+        perf_df = pd.DataFrame([
+            {
+                "function": name,
+                "calls": calls,
+                "cache hits": (calls - PERF["misses"].get(name, 0)) if name in cached else None,
+                "cache misses": PERF["misses"].get(name, 0) if name in cached else None,
+                "total ms": round(PERF["ms"][name], 1),
+                "rows": PERF["rows"].get(name),
+            }
+            for name, calls in PERF["calls"].items()
+        ]).astype({"cache hits": "Int64", "cache misses": "Int64", "rows": "Int64"}).sort_values("total ms", ascending=False)
+        st.dataframe(perf_df, use_container_width=True, hide_index=True)
+
+    # Frames the page used: rows + memory (before -> after compaction)
+    for name, df in loaded_frames.items():
+        before, after = df.attrs.get("memory", (None, int(df.memory_usage(deep=True).sum())))
+        mem = f"{after / 1024:,.0f} KB" if before is None else f"{before / 1024:,.0f} KB -> {after / 1024:,.0f} KB"
+        st.write(f"Rows loaded ({name}): {len(df):,} · memory {mem}")
+
+    st.checkbox("Profile reruns with cProfile", key="profile_rerun")
+    if _profiler is not None:
+        out = io.StringIO()
+        pstats.Stats(_profiler, stream=out).sort_stats("cumulative").print_stats(30)
+        st.code(out.getvalue()[:20000], language="text")
+        # Same bytes as Profile.dump_stats, without a temp file
+        prof_bytes = marshal.dumps(pstats.Stats(_profiler).stats)
+        st.download_button("⬇️ cProfile dump (.prof)", data=prof_bytes, file_name="devintel_rerun.prof",
+                           mime="application/octet-stream")
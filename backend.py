@@ -0,0 +1,45 @@
+import os
+
+from sqlalchemy import event
+
+# =========================================================
+# DATABASE BACKEND (shared by publisher + dashboard)
+# =========================================================
+# DB_BACKEND=postgres (default) -> Supabase pooler, configured as before.
+# DB_BACKEND=sqlite / duckdb    -> local embedded file at DB_PATH, same tables.
+# DuckDB additionally needs `pip install duckdb duckdb-engine`.
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres").strip().lower()
+
+LOCAL_DB_DEFAULT_PATHS = {
+    "sqlite": "data/devintel.db",
+    "duckdb": "data/devintel.duckdb",
+}
+DB_PATH = os.getenv("DB_PATH") or LOCAL_DB_DEFAULT_PATHS.get(DB_BACKEND, "")
+
+
+def is_local_backend(backend=DB_BACKEND):
+    return backend in LOCAL_DB_DEFAULT_PATHS
+
+
+def local_db_url(backend=DB_BACKEND, path=DB_PATH):
+    """SQLAlchemy URL of the embedded database file."""
+    if backend not in LOCAL_DB_DEFAULT_PATHS:
+        raise ValueError(f"Not a local backend: {backend!r}")
+    return f"{backend}:///{path}"
+
+
+def enable_sqlite_transactions(engine):
+    """
+    pysqlite does not BEGIN before DDL, so an ALTER TABLE ... RENAME swap would
+    auto-commit statement by statement. Take over BEGIN so engine.begin()
+    blocks are real transactions (SQLAlchemy's documented recipe).
+    """
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    return engine
@@ -0,0 +1,276 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import pandas as pd
+
+import synth_data
+from publish_data import (
+    get_engine, load_snapshots, drop_duplicate_keys, build_live_frame, apply_typed_schema,
+    build_unit_events, build_project_summary, build_developer_summary, build_history_logs,
+    build_house_pricing, build_price_percentiles,
+    process_and_upload, PUBLISH_WORKERS,
+)
+from analytics import (
+    build_project_overview, calculate_kpis, compute_sales_velocity, build_search_index,
+    search_positions, create_display_name, build_spatial_index, projects_within, nearest_projects,
+)
+
+# =========================================================
+# BENCHMARK SUITE
+# =========================================================
+# Generates a synthetic snapshot tree per scale (synth_data.py), then times and
+# memory-profiles each publisher stage: ingestion, typed schema, unit events,
+# summaries, price per m² analytics, history logs, the dashboard transforms
+# (overview, KPIs, velocity, search and spatial indexes) and (optionally) a
+# full publish into a throwaway SQLite file. Generating the tree is timed as
+# synth_generate for reference only: it is test setup, not the scraper's CSV
+# writing, so it is left out of the regression check (SETUP_STAGES).
+#
+#   python benchmark.py                  # 1x and 10x (10x: ~4 GB RSS, ~2 min end to end)
+#   python benchmark.py --scales 100     # opt-in: ~17M unit rows, tens of GB of RAM
+#
+# Every run appends one JSON line per (scale, stage) to RESULTS_PATH and is
+# compared against the previous run of the same scale and stage. Timings are
+# machine-specific, so RESULTS_PATH is local (gitignored): record a baseline
+# on the machine that runs the comparison. max_rss_mb is
+# the process high-water mark after each scale; --trace adds a per-stage
+# Python allocation peak.
+RESULTS_PATH = "benchmarks/results.jsonl"
+REGRESSION_THRESHOLD = 1.25
+# Millisecond stages jitter by more than 25%; ignore slowdowns smaller than this
+MIN_REGRESSION_SECONDS = 0.05
+SETUP_STAGES = {"synth_generate"}
+SEARCH_QUERIES = ["taman", "melaka tengah", "jasin", "bukit", "residensi permai", "sdn bhd", "20001", "krubng"]
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def max_rss_mb():
+    """Process high-water mark (resource is POSIX only)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageTimer:
+    """Runs stages, recording wall time and (optionally) the tracemalloc peak of each."""
+
+    def __init__(self, trace=False, verbose=False):
+        self.trace = trace
+        self.verbose = verbose
+        self.records = []
+
+    def run(self, stage, fn, *args, rows=None, **kwargs):
+        if self.trace:
+            tracemalloc.start()
+        quiet = io.StringIO()
+        start = time.perf_counter()
+        try:
+            if self.verbose:
+                result = fn(*args, **kwargs)
+            else:
+                with redirect_stdout(quiet):
+                    result = fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace else None
+            if self.trace:
+                tracemalloc.stop()
+        if rows is None:
+            rows = len(result) if hasattr(result, "__len__") else None
+        self.records.append({
+            "stage": stage,
+            "seconds": round(seconds, 4),
+            "peak_mb": None if peak is None else round(peak / (1024 * 1024), 1),
+            "rows": rows,
+        })
+        print(f"   {stage:<18} {seconds:9.3f}s" + ("" if peak is None else f"  peak {peak / 2**20:8.1f} MB"))
+        return result
+
+
+# =========================================================
+# STAGES
+# =========================================================
+def typed_frames(df_units, snapshots):
+    """Live frames after the typed schema, as the publisher uploads them."""
+    frames = {
+        "units_detail": df_units,
+        "projects_master": drop_duplicate_keys(snapshots["projects"], "projects_master"),
+        "house_types": snapshots["houses"],
+    }
+    return {table: apply_typed_schema(build_live_frame(df, table), table)[0] for table, df in frames.items()}
+
+def summaries(df_units, df_projects):
+    df_project_summary = build_project_summary(df_units, df_projects)
+    return df_project_summary, build_developer_summary(df_project_summary)
+
+def price_analytics(live, df_project_summary):
+    df_pricing = build_house_pricing(live["house_types"], live["projects_master"], df_project_summary)
+    return df_pricing, build_price_percentiles(df_pricing)
+
+def dashboard_overview(live):
+    """Overview as the dashboard's pandas fallback builds it from units_detail + projects_master."""
+    df_units = live["units_detail"].copy()
+    df_units["Kod Projek & Nama Projek"] = create_display_name(df_units)
+    df_master = live["projects_master"].copy()
+    df_master["Kod Projek & Nama Projek"] = create_display_name(df_master)
+    return build_project_overview(df_master, df_units)
+
+def dashboard_velocity(history):
+    """Velocity over history_logs as read back from the database (text keys and dates)."""
+    return compute_sales_velocity(history.astype({"developer_name": str, "scraped_date": str}))
+
+def run_searches(index, rounds=25):
+    hits = 0
+    for _ in range(rounds):
+        for q in SEARCH_QUERIES:
+            hits += len(search_positions(index, q))
+    return hits
+
+def located_projects(df_master):
+    """Latest row per project that has coordinates (what the Map page indexes)."""
+    df = df_master.dropna(subset=["latitude", "longitude"]).sort_values("scraped_timestamp")
+    return df.drop_duplicates("project_code", keep="last").reset_index(drop=True)
+
+def run_spatial_queries(index, df_loc, rounds=200):
+    """Radius (5 km) + nearest-5 lookups centred on located projects."""
+    hits = 0
+    for i in range(min(rounds, len(df_loc))):
+        lat, lon = df_loc["latitude"].iat[i], df_loc["longitude"].iat[i]
+        hits += len(projects_within(index, lat, lon, 5.0)[0])
+        hits += len(nearest_projects(index, lat, lon, 5)[0])
+    return hits
+
+def run_scale(scale, timer, args):
+    with tempfile.TemporaryDirectory(prefix=f"bench_{scale}x_") as tmp:
+        data_dir = os.path.join(tmp, "pemaju")
+        stats = timer.run("synth_generate", synth_data.generate, tmp, scale=scale, seed=args.seed)
+        timer.records[-1]["rows"] = stats["unit_rows"]
+        print(f"   -> {stats}")
+
+        snapshots = timer.run("ingest", load_snapshots, data_dir, args.workers, None, rows=stats["unit_rows"])
+        df_units = timer.run("dedupe_units", drop_duplicate_keys, snapshots["units"], "units_detail")
+        live = timer.run("typed_schema", typed_frames, df_units, snapshots, rows=stats["unit_rows"])
+        timer.run("unit_events", build_unit_events, df_units)
+        df_project_summary, _ = timer.run("summaries", summaries, df_units, live["projects_master"], rows=stats["projects"])
+        timer.run("price_analytics", price_analytics, live, df_project_summary, rows=stats["house_rows"])
+        history = timer.run("history_logs", build_history_logs, df_units)
+
+        overview = timer.run("dash_overview", dashboard_overview, live)
+        timer.run("dash_kpis", calculate_kpis, overview, rows=len(overview))
+        timer.run("dash_velocity", dashboard_velocity, history)
+        index = timer.run("dash_search_index", build_search_index, overview, rows=len(overview))
+        timer.run("dash_search_query", run_searches, index, rows=25 * len(SEARCH_QUERIES))
+        df_loc = located_projects(live["projects_master"])
+        spatial = timer.run("dash_spatial_index", build_spatial_index, df_loc, rows=len(df_loc))
+        timer.run("dash_spatial_query", run_spatial_queries, spatial, df_loc, rows=min(200, len(df_loc)))
+        del snapshots, df_units, live, history, overview, index, df_loc, spatial
+
+        if args.e2e:
+            engine = get_engine("sqlite", os.path.join(tmp, "bench.db"))
+            timer.run("e2e_publish", process_and_upload, engine, data_dir, os.path.join(tmp, "unit_events.parquet"),
+                      rows=stats["unit_rows"])
+            engine.dispose()
+    return stats
+
+
+# =========================================================
+# RESULTS STORE + REGRESSION CHECK
+# =========================================================
+def load_results(path=RESULTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_results(records, path=RESULTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, sort_keys=True) + "\n")
+
+def compare(records, history, threshold=REGRESSION_THRESHOLD):
+    """Prints each stage against the last stored run of the same scale/stage/tracing; returns regressions."""
+    previous = {}
+    for r in history:
+        previous[(r["scale"], r["stage"], r.get("traced"))] = r
+
+    regressions = []
+    print(f"\n📊 Against previous runs (regression = slower than x{threshold}):")
+    for r in records:
+        old = previous.get((r["scale"], r["stage"], r["traced"]))
+        if r["stage"] in SETUP_STAGES:
+            print(f"   {r['scale']:>5}x {r['stage']:<18} {r['seconds']:9.3f}s  (setup, not compared)")
+            continue
+        if not old or not old["seconds"]:
+            print(f"   {r['scale']:>5}x {r['stage']:<18} {r['seconds']:9.3f}s  (no baseline)")
+            continue
+        ratio = r["seconds"] / old["seconds"]
+        regressed = ratio > threshold and r["seconds"] - old["seconds"] > MIN_REGRESSION_SECONDS
+        flag = "⚠️ REGRESSION" if regressed else ""
+        print(f"   {r['scale']:>5}x {r['stage']:<18} {r['seconds']:9.3f}s  vs {old['seconds']:.3f}s "
+              f"({old['commit'] or '?'})  x{ratio:.2f} {flag}")
+        if regressed:
+            regressions.append(r)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the publisher and dashboard transforms on synthetic data.")
+    parser.add_argument("--scales", default="1,10",
+                        help="Comma-separated multipliers of today's data volume (100 is opt-in: tens of GB of RAM)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=PUBLISH_WORKERS, help="load_snapshots process pool size")
+    parser.add_argument("--no-e2e", dest="e2e", action="store_false", help="Skip the full publish into SQLite")
+    parser.add_argument("--trace", action="store_true",
+                        help="Record each stage's tracemalloc peak (peak_mb); several times slower, so traced "
+                             "timings are only compared with other traced runs")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--no-save", dest="save", action="store_false", help="Compare only, do not store this run")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own progress output")
+    args = parser.parse_args()
+
+    run = {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "cpus": os.cpu_count(),
+        "workers": args.workers,
+        "traced": args.trace,
+    }
+    records = []
+    for scale in [float(s) for s in args.scales.split(",") if s.strip()]:
+        scale = int(scale) if scale.is_integer() else scale
+        print(f"🏁 Scale {scale}x")
+        timer = StageTimer(trace=args.trace, verbose=args.verbose)
+        run_scale(scale, timer, args)
+        rss = max_rss_mb()
+        records += [{**run, **r, "scale": scale, "max_rss_mb": rss} for r in timer.records]
+
+    regressions = compare(records, load_results(args.results), args.threshold)
+    if args.save:
+        append_results(records, args.results)
+        print(f"💾 Stored {len(records)} results in {args.results}")
+    print(f"{'⚠️' if regressions else '✅'} {len(regressions)} regression(s)")
+    sys.exit(1 if regressions else 0)
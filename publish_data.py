@@ -1,9 +1,22 @@
 import os
+import argparse
+import hashlib
+import re
+from datetime import datetime
 import pandas as pd
 import glob
-from sqlalchemy import create_engine, text
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import union_categoricals
+from sqlalchemy import create_engine, inspect, text
 from urllib.parse import quote_plus
 
+from backend import DB_BACKEND, DB_PATH, LOCAL_DB_DEFAULT_PATHS, is_local_backend, local_db_url, enable_sqlite_transactions
+from analytics import PRICE_DIMENSIONS, price_percentile_table
+from schemas import (
+    SNAPSHOT_KINDS, HOUSE_TYPE_RENAME, SCHEMA_VERSION, TYPED_COLUMNS, COORDINATE_COLUMNS, NULL_TOKENS, MALAY_MONTHS,
+    read_dtypes, categorical_columns,
+)
+
 # ================= CONFIGURE THIS =================
 # If running on GitHub Actions, use env vars. If local, use hardcoded strings (not recommended).
 DB_USER = os.getenv("DB_USER", "postgres")
@@ -15,176 +28,988 @@ DB_NAME = os.getenv("DB_NAME", "postgres")
 # Folder where your scraper saves CSVs
 DATA_DIR = "data/pemaju" 
 
-def get_engine():
+# Ingestion: parallel CSV readers, and rows per chunk (0 = read each file whole).
+# Chunking bounds the raw-text parse buffer of one file; the assembled frames
+# still hold every snapshot row, so peak memory grows with the archive.
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", os.cpu_count() or 1))
+PUBLISH_CHUNKSIZE = int(os.getenv("PUBLISH_CHUNKSIZE", "0")) or None
+
+# Local copy of the unit change events (also published to the unit_events table)
+UNIT_EVENTS_PARQUET = "data/unit_events.parquet"
+
+# Pre-database local history (see backfill_history)
+LEGACY_HISTORY_CSV = "data/history_tracker.csv"
+
+def get_engine(backend=DB_BACKEND, db_path=DB_PATH):
+    """Supabase Postgres by default; a local SQLite/DuckDB file when DB_BACKEND says so."""
+    if is_local_backend(backend):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        engine = create_engine(local_db_url(backend, db_path))
+        if backend == "sqlite":
+            enable_sqlite_transactions(engine)
+        return engine
+
     password = quote_plus(DB_PASS)
     url = f"postgresql+psycopg2://{DB_USER}:{password}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
     return create_engine(url)
 
-def clean_money(val):
-    """Converts 'RM 1,200.00' to float."""
+def ensure_local_schema(engine):
+    """Tables the dashboard writes to, which Supabase already has but a fresh local file does not."""
+    if engine.dialect.name == "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS access_logs ("
+            "user_name TEXT, organization TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);"
+        ))
+
+# Indexes behind the dashboard's Trends queries (project list + per-project series)
+HISTORY_LOG_INDEXES = {
+    "idx_history_logs_dev_project_date": "history_logs (developer_name, project_code, scraped_date)",
+}
+
+def ensure_history_indexes(conn):
+    for name, target in HISTORY_LOG_INDEXES.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target};"))
+
+# =========================================================
+# INGESTION (typed, parallel, optionally chunked)
+# =========================================================
+def snapshot_kind(file_name):
+    """Returns 'units' / 'projects' / 'houses' for a scraper CSV, else None."""
+    for kind, spec in SNAPSHOT_KINDS.items():
+        if spec["marker"] in file_name:
+            return kind
+    return None
+
+def list_snapshot_files(data_dir=DATA_DIR):
+    """Walks the data folder and returns [(kind, path), ...] in a stable order."""
+    jobs = []
+    for root, dirs, files in os.walk(data_dir):
+        for file in sorted(files):
+            kind = snapshot_kind(file)
+            if kind and file.endswith(".csv"):
+                jobs.append((kind, os.path.join(root, file)))
+    return sorted(jobs, key=lambda j: j[1])
+
+def parse_money(series):
+    """
+    Vectorised 'RM 1,200.00' -> 1200.0 (blank / junk -> NaN). The one money and
+    number parser: ingestion (price, price_spjb) and the typed schema
+    (price_sales, ...) use it, so the same cell always parses the same way.
+    """
+    s = series.astype(str).str.replace(r"(?i)rm|,|\s", "", regex=True)
+    return pd.to_numeric(s, errors="coerce")
+
+# Raw columns nothing downstream reads; never parsed, or dropped once parsed
+UNUSED_RAW_COLUMNS = {"Bil"}
+
+def prepare_snapshot(df, kind):
+    """
+    Renames raw CSV headers to DB names and adds the parsed numeric columns.
+    Raw text that is only an input (unrenamed money columns, project_name_raw)
+    is dropped so each chunk is kept as small as possible.
+    """
+    spec = SNAPSHOT_KINDS[kind]
+    for raw_col, num_col in spec["numeric"].items():
+        if raw_col in df.columns:
+            df[num_col] = parse_money(df[raw_col])
+            if raw_col not in spec["rename"]:
+                df = df.drop(columns=raw_col)
+    df = df.rename(columns=spec["rename"])
+
+    if "project_name_raw" in df.columns:
+        split = df["project_name_raw"].str.split(n=1, expand=True)
+        df["project_code"] = split[0]
+        df["project_name"] = split[1] if split.shape[1] > 1 else ""
+        df = df.drop(columns="project_name_raw")
+    return df
+
+def iter_snapshot_chunks(path, kind, chunksize=None):
+    """
+    Streams one snapshot CSV as prepared DataFrames.
+    With chunksize=None the whole file is one chunk; otherwise at most
+    `chunksize` rows of the file are held as raw text at any time (callers that
+    keep every chunk, like load_snapshots, still end up holding the whole file).
+    """
+    reader = pd.read_csv(path, dtype=read_dtypes(kind), encoding="utf-8-sig", chunksize=chunksize,
+                         usecols=lambda c: c not in UNUSED_RAW_COLUMNS)
+    chunks = [reader] if chunksize is None else reader
+    for df in chunks:
+        yield prepare_snapshot(df, kind)
+
+def _read_snapshot_file(job):
+    """Process-pool worker: reads one file (chunk by chunk) into a compact frame."""
+    kind, path, chunksize = job
+    parts = list(iter_snapshot_chunks(path, kind, chunksize))
+    return kind, parts[0] if len(parts) == 1 else concat_snapshots(parts, kind)
+
+def concat_snapshots(frames, kind):
+    """Concatenates frames while keeping categorical columns categorical."""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    for col in categorical_columns(kind):
+        parts = [f[col] for f in frames if col in f.columns]
+        if not parts:
+            continue
+        cats = union_categoricals([p.astype("category") for p in parts]).categories
+        for f in frames:
+            if col in f.columns:
+                f[col] = f[col].astype("category").cat.set_categories(cats)
+            else:
+                f[col] = pd.Categorical([None] * len(f), categories=cats)
+    return pd.concat(frames, ignore_index=True)
+
+def load_snapshots(data_dir=DATA_DIR, workers=PUBLISH_WORKERS, chunksize=PUBLISH_CHUNKSIZE):
+    """
+    Reads every snapshot CSV under data_dir with explicit dtypes.
+    Files are parsed in a process pool; returns {"units", "projects", "houses"} frames
+    holding every snapshot row (memory is bounded by the archive, not by chunksize).
+    """
+    jobs = [(kind, path, chunksize) for kind, path in list_snapshot_files(data_dir)]
+    frames = {kind: [] for kind in SNAPSHOT_KINDS}
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_read_snapshot_file, jobs))
+    else:
+        results = [_read_snapshot_file(job) for job in jobs]
+
+    for kind, df in results:
+        frames[kind].append(df)
+    return {kind: concat_snapshots(parts, kind) for kind, parts in frames.items()}
+
+
+# =========================================================
+# TYPED WAREHOUSE SCHEMA
+# =========================================================
+def _parse_area(raw):
+    bounds = raw.str.extract(r"^\s*([\d.,]+)\s*(?:-\s*([\d.,]+))?\s*$")
+    lo = parse_money(bounds[0].fillna(""))
+    hi = parse_money(bounds[1].fillna(""))
+    # '0 - 194' means the lower bound is unknown, not zero
+    return pd.concat([lo, hi], axis=1).where(lambda b: b > 0).mean(axis=1)
+
+def _parse_count(raw):
+    # '4', or the variants of one house type '3, 4' -> the smallest; '0' means not available
+    values = raw.str.extractall(r"(\d+(?:\.\d+)?)")[0].astype(float)
+    return values[values > 0].groupby(level=0).min().reindex(raw.index)
+
+def _parse_date(raw):
+    return pd.to_datetime(raw, format="%d/%m/%Y", errors="coerce")
+
+def _parse_permit_date(raw):
+    parts = raw.str.extract(r"Tamat:\s*(\d{1,2})\s+([A-Za-z]{3})\w*\s+(\d{4})")
+    month = parts[1].str.lower().map(MALAY_MONTHS)
+    iso = parts[2] + "-" + month.astype("Int64").astype(str).str.zfill(2) + "-" + parts[0].str.zfill(2)
+    return pd.to_datetime(iso, format="%Y-%m-%d", errors="coerce")
+
+TYPE_PARSERS = {
+    "money": parse_money,
+    "number": parse_money,
+    "count": _parse_count,
+    "area": _parse_area,
+    "date": _parse_date,
+    "permit_date": _parse_permit_date,
+}
+
+# 'q=lat,lng' (what the scraper stores), also '@lat,lng' / 'll=' and a URL-encoded comma
+COORDINATE_RE = r"(?:[?&](?:q|ll|query)=|@)\s*(-?\d{1,2}(?:\.\d+)?)\s*(?:,|%2C)\s*(-?\d{1,3}(?:\.\d+)?)"
+
+def _parse_coordinates(raw):
+    """Map link -> (latitude, longitude) floats; out-of-range or 0,0 -> NaN."""
+    coords = raw.str.extract(COORDINATE_RE, flags=re.IGNORECASE).astype(float)
+    coords.columns = ["latitude", "longitude"]
+    valid = coords["latitude"].between(-90, 90) & coords["longitude"].between(-180, 180)
+    valid &= ~((coords["latitude"] == 0) & (coords["longitude"] == 0))
+    return coords.where(valid)
+
+REJECT_COLUMNS = ["table_name", "column_name", "project_code", "scraped_date", "raw_value", "reason", "schema_version"]
+
+def apply_typed_schema(df, table):
+    """
+    Parses the TYPED_COLUMNS (and COORDINATE_COLUMNS) of a live frame in place (vectorised, once per publish).
+    Returns (typed_df, rejects_df). Rows without a project code are quarantined
+    (removed); unparseable values become NULL and are reported.
+    """
+    rejects = []
+
+    def reject(mask, column, reason):
+        part = df.loc[mask, [c for c in ["project_code", "scraped_date"] if c in df.columns]].copy()
+        part["raw_value"] = df.loc[mask, column].astype(object) if column in df.columns else None
+        part["table_name"] = table
+        part["column_name"] = column
+        part["reason"] = reason
+        rejects.append(part)
+
+    if "project_code" in df.columns:
+        orphan = df["project_code"].isna() | (df["project_code"].astype(str).str.strip() == "")
+        if orphan.any():
+            reject(orphan, "project_code", "missing project code (row quarantined)")
+            df = df[~orphan].reset_index(drop=True)
+
+    for col, kind in TYPED_COLUMNS.get(table, {}).items():
+        if col not in df.columns:
+            continue
+        raw = df[col].astype(str).where(df[col].notna(), "").str.strip()
+        parsed = TYPE_PARSERS[kind](raw)
+        # A literal 0 (e.g. unknown built-up area) is "not available", not malformed
+        missing = raw.str.lower().isin(NULL_TOKENS) | parse_money(raw).eq(0)
+        malformed = parsed.isna() & ~missing
+        if malformed.any():
+            reject(malformed, col, f"unparseable {kind}")
+        df[col] = parsed
+
+    for col, (lat_col, lon_col) in COORDINATE_COLUMNS.get(table, {}).items():
+        if col not in df.columns:
+            continue
+        raw = df[col].astype(str).where(df[col].notna(), "").str.strip()
+        coords = _parse_coordinates(raw)
+        malformed = coords["latitude"].isna() & ~raw.str.lower().isin(NULL_TOKENS)
+        if malformed.any():
+            reject(malformed, col, "unparseable coordinates")
+        df[lat_col] = coords["latitude"]
+        df[lon_col] = coords["longitude"]
+
+    if not rejects:
+        return df, pd.DataFrame(columns=REJECT_COLUMNS)
+    df_rejects = pd.concat(rejects, ignore_index=True)
+    df_rejects["raw_value"] = df_rejects["raw_value"].astype(str)
+    df_rejects["schema_version"] = SCHEMA_VERSION
+    return df, df_rejects.reindex(columns=REJECT_COLUMNS)
+
+def build_schema_version_frame(uploads):
+    """One row per published table: schema version and the column types actually sent."""
+    now = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    rows = []
+    for table, df in uploads.items():
+        columns = ", ".join(f"{c} {_sql_type(df[c].dtype)}" for c in df.columns)
+        rows.append({"table_name": table, "schema_version": SCHEMA_VERSION, "columns": columns, "published_at": now})
+    return pd.DataFrame(rows)
+
+
+# =========================================================
+# STAGING + ATOMIC SWAP
+# =========================================================
+# Live tables are never emptied in place. Each publish loads "<table>__staging",
+# validates it, then swaps it in with renames inside one short transaction.
+# The replaced generation is kept as "<table>__prev" for instant rollback.
+# The same transaction appends the new history_logs rows (their keys are kept
+# in HISTORY_ADDED_TABLE so a rollback can take them out again) and bumps
+# data_version, so a failed swap leaves nothing half-published.
+STAGING_SUFFIX = "__staging"
+PREVIOUS_SUFFIX = "__prev"
+HISTORY_ADDED_TABLE = "history_logs__last_publish"
+
+# Columns uploaded per live table
+LIVE_TABLE_COLUMNS = {
+    "units_detail": [
+        "project_code", "project_name", "pemaju_name", "permit_no", "lot_no", "unit_no",
+        "price_sales", "status", "bumi_quota", "scraped_date", "scraped_timestamp",
+    ],
+    "projects_master": [
+        "project_code", "project_name", "pemaju_name", "permit_no",
+        "status_overall", "development_info", "location_url", "location_district",
+        "location_state", "permit_valid_date", "scraped_date", "scraped_timestamp",
+        "latitude", "longitude",
+    ],
+    "house_types": list(HOUSE_TYPE_RENAME.values()),
+    "unit_events": [
+        "event_date", "prev_date", "project_code", "pemaju_name", "lot_no", "unit_no",
+        "event_type", "old_value", "new_value", "price",
+    ],
+    "project_summary": [
+        "pemaju_name", "project_code", "project_name", "status_overall", "location_district", "location_state",
+        "total_units", "units_sold", "units_unsold", "sales_value", "units_bumi", "units_bumi_sold",
+        "units_non_bumi", "take_up_rate", "scraped_date",
+    ],
+    "developer_summary": [
+        "pemaju_name", "projects", "total_units", "units_sold", "units_unsold", "sales_value",
+        "units_bumi", "units_bumi_sold", "units_non_bumi", "take_up_rate", "bumi_share", "last_scraped_date",
+    ],
+    "house_pricing": [
+        "project_code", "project_name", "pemaju_name", "location_district", "house_type",
+        "num_rooms", "built_up_size", "total_units", "price_min", "price_max", "price_mid",
+        "psm_min", "psm_max", "psm_mid", "take_up_rate", "scraped_date",
+    ],
+    "price_percentiles": [
+        "dimension", "group_name", "house_types", "projects", "units",
+        "psm_p10", "psm_p25", "psm_p50", "psm_p75", "psm_p90", "psm_mean", "price_p50",
+    ],
+    "publish_rejects": REJECT_COLUMNS,
+    "schema_version": ["table_name", "schema_version", "columns", "published_at"],
+}
+
+# Natural key per live table (None = no uniqueness check, house types repeat legitimately)
+LIVE_TABLE_KEYS = {
+    "units_detail": ["project_code", "lot_no", "unit_no", "scraped_date"],
+    "projects_master": ["project_code", "scraped_date"],
+    "house_types": None,
+    "unit_events": ["project_code", "lot_no", "unit_no", "event_date", "event_type"],
+    "project_summary": ["pemaju_name", "project_code", "project_name"],
+    "developer_summary": ["pemaju_name"],
+    "house_pricing": None,
+    "price_percentiles": ["dimension", "group_name"],
+    "publish_rejects": None,
+    "schema_version": ["table_name"],
+}
+
+def _sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(dtype):
+        return "DOUBLE PRECISION"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    return "TEXT"
+
+def table_exists(conn, table):
+    return inspect(conn).has_table(table)
+
+def drop_duplicate_keys(df, table):
+    """Drops repeated natural keys (e.g. a project scraped twice in one run)."""
+    key = LIVE_TABLE_KEYS.get(table)
+    if df.empty or not key or not all(c in df.columns for c in key):
+        return df
+    dup = df.duplicated(subset=key, keep="first")
+    if dup.any():
+        print(f"   ⚠️ {table}: dropped {int(dup.sum())} duplicate rows on {key}")
+        df = df[~dup].reset_index(drop=True)
+    return df
+
+def build_live_frame(df, table):
+    cols = [c for c in LIVE_TABLE_COLUMNS[table] if c in df.columns]
+    return df[cols].copy()
+
+def _align_staging_columns(conn, staging, df):
+    """Adds new columns and retypes columns whose type changed (staging is empty, so USING NULL)."""
+    existing = {c["name"]: str(c["type"]).upper() for c in inspect(conn).get_columns(staging)}
+    for col in df.columns:
+        target = _sql_type(df[col].dtype)
+        if col not in existing:
+            conn.execute(text(f'ALTER TABLE "{staging}" ADD COLUMN "{col}" {target};'))
+        elif target != "TEXT" and not existing[col].startswith(target):
+            conn.execute(text(f'ALTER TABLE "{staging}" ALTER COLUMN "{col}" TYPE {target} USING NULL;'))
+
+def load_staging(engine, table, df):
+    """(Re)creates <table>__staging shaped like the live table and bulk loads df into it."""
+    staging = table + STAGING_SUFFIX
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{staging}";'))
+        if conn.dialect.name == "postgresql" and table_exists(conn, table):
+            # Same defaults, identity and indexes as live; typed columns follow the frame
+            conn.execute(text(f'CREATE TABLE "{staging}" (LIKE "{table}" INCLUDING ALL);'))
+            _align_staging_columns(conn, staging, df)
+        # Otherwise (new table / embedded backend) to_sql creates it from the frame's dtypes
+        df.to_sql(staging, conn, if_exists="append", index=False)
+    print(f"   -> Staged {len(df)} rows in {staging}")
+
+def validate_staging(engine, table, expected_rows):
+    """Row count must match what we loaded and the natural key must be unique."""
+    staging = table + STAGING_SUFFIX
+    key = LIVE_TABLE_KEYS.get(table)
+    with engine.connect() as conn:
+        n = conn.execute(text(f'SELECT COUNT(*) FROM "{staging}";')).scalar()
+        if n != expected_rows:
+            raise RuntimeError(f"{staging}: expected {expected_rows} rows, found {n}")
+        if key:
+            cols = ", ".join(f'"{c}"' for c in key)
+            dups = conn.execute(text(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM "{staging}" GROUP BY {cols} HAVING COUNT(*) > 1) d;'
+            )).scalar()
+            if dups:
+                raise RuntimeError(f"{staging}: {dups} duplicate keys on {key}")
+    print(f"   -> Validated {staging} ({n} rows)")
+
+def swap_staging(engine, tables, history_df=None, source_hash=None):
+    """
+    Promotes every staged table in one transaction; old live tables become __prev.
+    history_df rows with new (project_code, scraped_date) keys are appended and
+    data_version is bumped (to source_hash) in the same transaction.
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Never queue behind a long dashboard read for more than a few seconds
+            conn.execute(text("SET LOCAL lock_timeout = '5s';"))
+        for table in tables:
+            # The generation before last only goes once this swap is sure to commit
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table}{PREVIOUS_SUFFIX}";'))
+            if table_exists(conn, table):
+                conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{table}{PREVIOUS_SUFFIX}";'))
+            conn.execute(text(f'ALTER TABLE "{table}{STAGING_SUFFIX}" RENAME TO "{table}";'))
+        print(f"   -> Swapped live tables: {', '.join(tables)}")
+
+        if history_df is not None:
+            new_rows = new_history_rows(conn, history_df)
+            new_rows.to_sql("history_logs", conn, if_exists="append", index=False)
+            ensure_history_indexes(conn)
+            new_rows[HISTORY_KEY].to_sql(HISTORY_ADDED_TABLE, conn, if_exists="replace", index=False)
+            print(f"   -> Added {len(new_rows)} logs to history_logs ({len(history_df) - len(new_rows)} already logged)")
+        if source_hash is not None:
+            write_data_version(conn, source_hash)
+
+def rollback_publish(engine, tables=tuple(LIVE_TABLE_COLUMNS)):
+    """
+    Swaps the __prev generation back in (and keeps the rolled-back one as __prev)
+    for every table that has one, and deletes the history_logs rows the
+    rolled-back publish appended. Rolling back twice restores the live tables
+    but not those history rows; the next publish appends them again.
+    """
+    with engine.begin() as conn:
+        tables = [t for t in tables if table_exists(conn, t + PREVIOUS_SUFFIX)]
+        if not tables:
+            raise RuntimeError("No previous generation to roll back to")
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SET LOCAL lock_timeout = '5s';"))
+        for table in tables:
+            tmp = table + STAGING_SUFFIX
+            conn.execute(text(f'DROP TABLE IF EXISTS "{tmp}";'))
+            conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{tmp}";'))
+            conn.execute(text(f'ALTER TABLE "{table}{PREVIOUS_SUFFIX}" RENAME TO "{table}";'))
+            conn.execute(text(f'ALTER TABLE "{tmp}" RENAME TO "{table}{PREVIOUS_SUFFIX}";'))
+        print(f"⏪ Rolled back: {', '.join(tables)}")
+
+        if table_exists(conn, HISTORY_ADDED_TABLE) and table_exists(conn, "history_logs"):
+            removed = conn.execute(text(
+                f'DELETE FROM history_logs WHERE EXISTS (SELECT 1 FROM "{HISTORY_ADDED_TABLE}" a '
+                f'WHERE a.project_code = history_logs.project_code AND a.scraped_date = history_logs.scraped_date);'
+            )).rowcount
+            conn.execute(text(f'DROP TABLE "{HISTORY_ADDED_TABLE}";'))
+            print(f"   -> Removed {removed} history_logs rows added by the rolled-back publish")
+        write_data_version(conn, hashlib.sha256(b"rollback").hexdigest())
+
+
+# =========================================================
+# DATA VERSION (dashboard cache key)
+# =========================================================
+# One-row table bumped at the very end of every publish / rollback. The
+# dashboard polls it cheaply and keys all of its caches on "version", so
+# cached data lives until the next publish instead of a fixed TTL.
+def snapshot_hash(data_dir=DATA_DIR):
+    """sha256 over the snapshot files (path + size) this publish was built from."""
+    h = hashlib.sha256()
+    for kind, path in list_snapshot_files(data_dir):
+        h.update(f"{os.path.relpath(path, data_dir)}:{os.path.getsize(path)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+def write_data_version(conn, source_hash):
+    """Replaces the data_version row inside the caller's transaction."""
+    published_at = datetime.now()
+    version = f"{published_at:%Y%m%d%H%M%S}-{source_hash[:12]}"
+    df = pd.DataFrame([{"version": version, "published_at": published_at, "snapshot_hash": source_hash}])
+    df.to_sql("data_version", conn, if_exists="replace", index=False)
+    print(f"   -> data_version = {version}")
+    return version
+
+def bump_data_version(engine, source_hash):
+    with engine.begin() as conn:
+        return write_data_version(conn, source_hash)
+
+
+# =========================================================
+# UNIT CHANGE EVENTS (CDC between consecutive snapshots)
+# =========================================================
+UNIT_KEY = ["project_code", "lot_no", "unit_no"]
+
+def _changed(new, old):
+    """Elementwise 'value differs', treating NaN == NaN as unchanged."""
+    return ~((new == old) | (new.isna() & old.isna()))
+
+def _as_text(series):
+    """str() of each value, keeping missing values as NULL rather than 'nan'."""
+    return series.astype(object).where(series.notna(), None).map(lambda v: v if v is None else str(v))
+
+def build_unit_events(df_units):
+    """
+    Diffs every unit against its previous snapshot (per project code, lot and unit no)
+    and returns one row per change:
+      new_unit           unit appears in a project that already had an earlier snapshot
+      sold               status moved to 'Telah Dijual'
+      status_change      any other status move (e.g. cancellation)
+      price_change       Harga Jualan changed
+      spjb_change        Harga SPJB changed
+      bumi_quota_change  Kuota Bumi changed
+    A project's first snapshot is its baseline and emits nothing.
+    """
+    cols = LIVE_TABLE_COLUMNS["unit_events"]
+    needed = UNIT_KEY + ["scraped_date", "status", "bumi_quota", "price"]
+    if df_units.empty or not all(c in df_units.columns for c in needed):
+        return pd.DataFrame(columns=cols)
+
+    keep = needed + [c for c in ["pemaju_name", "price_spjb"] if c in df_units.columns]
+    df = df_units[keep].copy()
+    for col in ["pemaju_name", "price_spjb"]:
+        if col not in df.columns:
+            df[col] = None
+    df["scraped_date"] = df["scraped_date"].astype(str)  # ISO dates sort as text
+    df["status"] = df["status"].astype(str).str.strip()
+    df["bumi_quota"] = df["bumi_quota"].astype(str).str.strip()
+    df = df.sort_values(UNIT_KEY + ["scraped_date"], kind="mergesort").reset_index(drop=True)
+
+    tracked = ["scraped_date", "status", "bumi_quota", "price", "price_spjb"]
+    prev = df.groupby(UNIT_KEY, sort=False, dropna=False)[tracked].shift()
+    seen_before = prev["scraped_date"].notna()
+    project_start = df.groupby("project_code")["scraped_date"].transform("min")
+
+    new_status = df["status"].str.lower()
+    status_moved = seen_before & (new_status != prev["status"].str.lower())
+    is_sold_now = new_status.str.contains("telah dijual", na=False)
+
+    rules = [
+        ("new_unit", ~seen_before & (df["scraped_date"] > project_start), None, "status"),
+        ("sold", status_moved & is_sold_now, "status", "status"),
+        ("status_change", status_moved & ~is_sold_now, "status", "status"),
+        ("price_change", seen_before & _changed(df["price"], prev["price"]), "price", "price"),
+        ("spjb_change", seen_before & _changed(df["price_spjb"], prev["price_spjb"]), "price_spjb", "price_spjb"),
+        ("bumi_quota_change", seen_before & (df["bumi_quota"] != prev["bumi_quota"]), "bumi_quota", "bumi_quota"),
+    ]
+
+    parts = []
+    for event_type, mask, old_col, new_col in rules:
+        if not mask.any():
+            continue
+        part = df.loc[mask, UNIT_KEY + ["pemaju_name", "price"]].copy()
+        part["event_date"] = df.loc[mask, "scraped_date"]
+        part["prev_date"] = prev.loc[mask, "scraped_date"]
+        part["event_type"] = event_type
+        part["old_value"] = _as_text(prev.loc[mask, old_col]) if old_col else None
+        part["new_value"] = _as_text(df.loc[mask, new_col])
+        parts.append(part)
+
+    if not parts:
+        return pd.DataFrame(columns=cols)
+    events = pd.concat(parts, ignore_index=True)
+    events = events.sort_values(["event_date", "project_code", "unit_no", "event_type"], kind="mergesort")
+    return events.reindex(columns=cols).reset_index(drop=True)
+
+def save_unit_events_parquet(df_events, path=UNIT_EVENTS_PARQUET):
     try:
-        if pd.isna(val): return 0.0
-        s = str(val).replace("RM", "").replace(",", "").strip()
-        return float(s)
-    except:
-        return 0.0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df_events.to_parquet(path, index=False)
+        print(f"   -> Wrote {len(df_events)} events to {path}")
+    except ImportError:
+        print("   ⚠️ pyarrow not installed, skipping local unit_events parquet")
+
 
-def process_and_upload():
+# =========================================================
+# AGGREGATES (history logs + materialized summaries)
+# =========================================================
+def add_unit_flags(df):
+    """is_sold / is_unsold / is_bumi and sold_price (price counted only when sold)."""
+    df = df.copy()
+    status = df["status"].astype(str).str.lower()
+    df["is_sold"] = status.str.contains("telah dijual")
+    df["is_unsold"] = status.str.contains("belum dijual")
+    df["is_bumi"] = df["bumi_quota"].astype(str).str.lower().str.strip() == "ya"
+    # Price was parsed once at ingestion; only sold units count towards sales value
+    df["sold_price"] = df["price"].fillna(0.0).where(df["is_sold"], 0.0)
+    return df
+
+def build_history_logs(df_units):
+    """Per project, per scraped_date unit counts (the history_logs rows)."""
+    df_calc = add_unit_flags(df_units)
+
+    # Group by Project
+    history_df = df_calc.groupby(["project_code", "project_name", "pemaju_name", "scraped_date"], as_index=False, observed=True).agg(
+        total_units=("unit_no", "count"),
+        units_sold=("is_sold", "sum"),
+        units_bumi=("is_bumi", "sum"),
+        sales_value=("sold_price", "sum")
+    )
+    
+    history_df["units_unsold"] = history_df["total_units"] - history_df["units_sold"]
+    history_df["take_up_rate"] = (history_df["units_sold"] / history_df["total_units"]) * 100
+    
+    # Rename for DB
+    return history_df.rename(columns={"pemaju_name": "developer_name"})
+
+def latest_snapshot(df, key="project_code"):
+    """Keeps only the rows of each project's most recent scraped_date."""
+    dates = df["scraped_date"].astype(str)
+    return df[dates == dates.groupby(df[key]).transform("max")]
+
+def build_project_summary(df_units, df_projects):
+    """
+    One row per project from its latest snapshot: take-up, sales value and bumi split,
+    with district/state/status from the latest projects_master row.
+    """
+    df = add_unit_flags(latest_snapshot(df_units))
+    df["is_bumi_sold"] = df["is_bumi"] & df["is_sold"]
+    df["scraped_date"] = df["scraped_date"].astype(str)
+    summary = df.groupby(["pemaju_name", "project_code", "project_name"], as_index=False, observed=True).agg(
+        total_units=("unit_no", "count"),
+        units_sold=("is_sold", "sum"),
+        units_unsold=("is_unsold", "sum"),
+        sales_value=("sold_price", "sum"),
+        units_bumi=("is_bumi", "sum"),
+        units_bumi_sold=("is_bumi_sold", "sum"),
+        scraped_date=("scraped_date", "max"),
+    )
+    summary["pemaju_name"] = summary["pemaju_name"].astype(str)
+    summary["units_non_bumi"] = summary["total_units"] - summary["units_bumi"]
+    summary["take_up_rate"] = (summary["units_sold"] / summary["total_units"] * 100).fillna(0).round(1)
+
+    master_cols = ["project_code", "status_overall", "location_district", "location_state"]
+    if not df_projects.empty and all(c in df_projects.columns for c in master_cols):
+        dfm = df_projects.sort_values("scraped_timestamp").drop_duplicates("project_code", keep="last")
+        dfm = dfm[master_cols].copy()
+        for col in master_cols[1:]:
+            dfm[col] = dfm[col].astype(object)
+        summary = summary.merge(dfm, on="project_code", how="left")
+    return summary.sort_values(["pemaju_name", "project_code"]).reset_index(drop=True)
+
+def build_developer_summary(df_project_summary):
+    """Developer-level roll-up of project_summary (what the KPI cards show)."""
+    dev = df_project_summary.groupby("pemaju_name", as_index=False).agg(
+        projects=("project_code", "nunique"),
+        total_units=("total_units", "sum"),
+        units_sold=("units_sold", "sum"),
+        units_unsold=("units_unsold", "sum"),
+        sales_value=("sales_value", "sum"),
+        units_bumi=("units_bumi", "sum"),
+        units_bumi_sold=("units_bumi_sold", "sum"),
+        units_non_bumi=("units_non_bumi", "sum"),
+        last_scraped_date=("scraped_date", "max"),
+    )
+    dev["take_up_rate"] = (dev["units_sold"] / dev["total_units"] * 100).fillna(0).round(1)
+    dev["bumi_share"] = (dev["units_bumi"] / dev["total_units"] * 100).fillna(0).round(1)
+    return dev.sort_values("pemaju_name").reset_index(drop=True)
+
+
+def build_house_pricing(df_houses, df_projects, df_project_summary):
+    """
+    One row per house type of each project's latest snapshot (typed house_types),
+    with developer / district from the latest projects_master row, the project's
+    take-up rate, and price per m² (RM) at the minimum, maximum and mid price.
+    Zero prices and sizes mean "not available".
+    """
+    df = latest_snapshot(df_houses).copy()
+    df["scraped_date"] = df["scraped_date"].astype(str)
+    df["house_type"] = df["house_type"].astype(str)
+
+    master_cols = ["project_code", "pemaju_name", "location_district"]
+    if not df_projects.empty and all(c in df_projects.columns for c in master_cols):
+        dfm = df_projects.sort_values("scraped_timestamp").drop_duplicates("project_code", keep="last")
+        df = df.merge(dfm[master_cols].astype(object), on="project_code", how="left")
+    if not df_project_summary.empty:
+        df = df.merge(df_project_summary[["project_code", "take_up_rate"]].drop_duplicates("project_code"),
+                      on="project_code", how="left")
+
+    prices = df[["price_min", "price_max"]].where(lambda p: p > 0)
+    size = df["built_up_size"].where(df["built_up_size"] > 0)
+    df["price_min"], df["price_max"] = prices["price_min"], prices["price_max"]
+    df["price_mid"] = prices.mean(axis=1)
+    for col in ["min", "max", "mid"]:
+        df[f"psm_{col}"] = (df[f"price_{col}"] / size).round(2)
+    return df.reindex(columns=LIVE_TABLE_COLUMNS["house_pricing"]).reset_index(drop=True)
+
+def build_price_percentiles(df_pricing):
+    """analytics.price_percentile_table for the whole market and each PRICE_DIMENSIONS column."""
+    parts = [price_percentile_table(df_pricing).assign(dimension="market")]
+    for col in PRICE_DIMENSIONS.values():
+        parts.append(price_percentile_table(df_pricing, col).assign(dimension=col))
+    return pd.concat(parts, ignore_index=True).reindex(columns=LIVE_TABLE_COLUMNS["price_percentiles"])
+
+
+# =========================================================
+# HISTORY BACKFILL (rebuild history_logs from the archive)
+# =========================================================
+# history_logs is only ever appended to by publishes (new project/date keys
+# only), so it misses dates that were scraped before it existed, keeps the
+# duplicates older publishes appended and never sees the legacy
+# data/history_tracker.csv. backfill_history rebuilds it:
+#   1. every archived UNIT_DETAILS snapshot is read once, one snapshot date
+#      per process-pool task, into per-project, per-date rows
+#   2. existing history_logs rows and the legacy CSV fill in dates no archived
+#      snapshot covers (snapshots > existing rows > legacy CSV); legacy rows
+#      whose counts contradict each other are logged and skipped
+#   3. one transaction keeps the old table as history_logs__prev, then
+#      replaces the rows and (re)creates the Trends index
+HISTORY_COLUMNS = [
+    "project_code", "project_name", "developer_name", "scraped_date", "total_units",
+    "units_sold", "units_bumi", "sales_value", "units_unsold", "take_up_rate",
+]
+HISTORY_KEY = ["project_code", "scraped_date"]
+HISTORY_SUMS = ["total_units", "units_sold", "units_bumi", "sales_value"]
+
+LEGACY_HISTORY_RENAME = {
+    "Date": "scraped_date", "Developer": "developer_name", "Project": "project_label",
+    "Total_Units": "total_units", "Sold_Units": "units_sold", "Unsold_Units": "units_unsold",
+    "Take_Up_Rate": "take_up_rate",
+}
+# Take_Up_Rate is rounded to 1 decimal; a wider gap means the row's counts are off
+LEGACY_TAKE_UP_TOLERANCE = 0.5
+LEGACY_REJECTS_SHOWN = 10
+
+def _finish_history(df):
+    """Derived columns and column order of history_logs rows."""
+    df["units_unsold"] = df["total_units"] - df["units_sold"]
+    df["take_up_rate"] = (df["units_sold"] / df["total_units"]) * 100
+    return df.reindex(columns=HISTORY_COLUMNS)
+
+SNAPSHOT_DATE_RE = re.compile(r"_(\d{8})\.csv$")
+
+def _snapshot_history(job):
+    """
+    Process-pool worker: history_logs rows of one snapshot date. A project's units
+    can be spread over several developers' files of the same date, so the date's
+    files are combined and deduped on the unit key exactly as a publish does.
+    """
+    paths, chunksize = job
+    frames = []
+    for path in paths:
+        for df in iter_snapshot_chunks(path, "units", chunksize):
+            if "pemaju_name" not in df.columns:
+                # Early scraper layout without the developer column (a publish drops these rows too)
+                print(f"   ⚠️ {os.path.basename(path)}: no developer column, skipped")
+                break
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    df = build_history_logs(drop_duplicate_keys(pd.concat(frames, ignore_index=True), "units_detail"))
+    df["scraped_date"] = df["scraped_date"].astype(str)
+    df["developer_name"] = df["developer_name"].astype(str)
+    return _finish_history(df)
+
+def stream_snapshot_history(data_dir=DATA_DIR, workers=PUBLISH_WORKERS, chunksize=PUBLISH_CHUNKSIZE):
+    """history_logs rows for every archived unit snapshot, built one snapshot date at a time."""
+    by_date = {}
+    for kind, path in list_snapshot_files(data_dir):
+        if kind == "units":
+            match = SNAPSHOT_DATE_RE.search(os.path.basename(path))
+            by_date.setdefault(match.group(1) if match else path, []).append(path)
+    jobs = [(paths, chunksize) for _, paths in sorted(by_date.items())]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_snapshot_history, jobs))
+    else:
+        parts = [_snapshot_history(job) for job in jobs]
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    df = pd.concat(parts, ignore_index=True)
+    # A date missing from a file name falls back to the Scraped_Date column; later files win
+    return df.drop_duplicates(HISTORY_KEY, keep="last").reset_index(drop=True)
+
+def _parse_history_dates(raw):
+    # The legacy tracker mixes ISO dates with US-style ones ('12/21/2025')
+    iso = pd.to_datetime(raw, format="%Y-%m-%d", errors="coerce")
+    us = pd.to_datetime(raw, format="%m/%d/%Y", errors="coerce")
+    return iso.fillna(us).dt.strftime("%Y-%m-%d")
+
+def load_legacy_history(path=LEGACY_HISTORY_CSV, developer_names=None):
+    """
+    data/history_tracker.csv as history_logs rows. Rows whose sold + unsold is not
+    the total, or whose Take_Up_Rate does not match sold / total, are logged and
+    left out. The tracker's developer names carry no code, so they are replaced
+    by the name published for the same developer code (the project code prefix)
+    where one is known.
+    """
+    if not path or not os.path.exists(path):
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    df = pd.read_csv(path, dtype=str, encoding="utf-8-sig").rename(columns=LEGACY_HISTORY_RENAME)
+    split = df["project_label"].fillna("").str.strip().str.split(n=1, expand=True).reindex(columns=[0, 1])
+    df["project_code"], df["project_name"] = split[0], split[1].fillna("")
+    df["scraped_date"] = _parse_history_dates(df["scraped_date"].fillna("").str.strip())
+    counts = ["total_units", "units_sold", "units_unsold", "take_up_rate"]
+    for col in counts:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    bad = df["project_code"].isna() | df["scraped_date"].isna() | df[counts].isna().any(axis=1)
+    if bad.any():
+        print(f"   ⚠️ {path}: skipped {int(bad.sum())} unreadable rows")
+        df = df[~bad].copy()
+
+    # A row whose own counts disagree is not merged (e.g. Sold_Units from one
+    # date next to the Take_Up_Rate of another)
+    take_up = (df["units_sold"] / df["total_units"] * 100).where(df["total_units"] > 0, 0.0)
+    checks = {
+        "sold + unsold != total": df["units_sold"] + df["units_unsold"] != df["total_units"],
+        f"take-up off by > {LEGACY_TAKE_UP_TOLERANCE} pp": (take_up - df["take_up_rate"]).abs() > LEGACY_TAKE_UP_TOLERANCE,
+    }
+    rejected = pd.Series(False, index=df.index)
+    for reason, failed in checks.items():
+        if failed.any():
+            print(f"   ⚠️ {path}: rejected {int(failed.sum())} rows, {reason}")
+        rejected |= failed
+    for r in df[rejected].head(LEGACY_REJECTS_SHOWN).itertuples():
+        print(f"      {r.scraped_date} {r.project_label}: total={r.total_units:g} sold={r.units_sold:g} "
+              f"unsold={r.units_unsold:g} take-up={r.take_up_rate:g}")
+    if rejected.sum() > LEGACY_REJECTS_SHOWN:
+        print(f"      ... and {int(rejected.sum()) - LEGACY_REJECTS_SHOWN} more")
+    df = df[~rejected].copy()
+
+    if developer_names:
+        dev_code = df["project_code"].str.split("-", n=1).str[0]
+        df["developer_name"] = dev_code.map(developer_names).fillna(df["developer_name"])
+    df["units_bumi"] = float("nan")
+    df["sales_value"] = float("nan")
+    df[["total_units", "units_sold"]] = df[["total_units", "units_sold"]].astype(int)
+    return _finish_history(df)
+
+def read_history_logs(engine):
+    """Current history_logs rows (empty if the table does not exist yet)."""
+    with engine.connect() as conn:
+        if not table_exists(conn, "history_logs"):
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        df = pd.read_sql(text("SELECT * FROM history_logs;"), conn)
+    df["scraped_date"] = df["scraped_date"].astype(str).str[:10]
+    return df.reindex(columns=HISTORY_COLUMNS)
+
+def new_history_rows(conn, df):
+    """Rows of df whose (project_code, scraped_date) history_logs does not hold yet."""
+    df = df.drop_duplicates(HISTORY_KEY, keep="last")
+    if not table_exists(conn, "history_logs"):
+        return df
+    existing = pd.read_sql(text("SELECT DISTINCT project_code, scraped_date FROM history_logs;"), conn)
+    have = pd.MultiIndex.from_arrays([existing["project_code"].astype(str), existing["scraped_date"].astype(str).str[:10]])
+    mine = pd.MultiIndex.from_arrays([df["project_code"].astype(str), df["scraped_date"].astype(str).str[:10]])
+    return df[~mine.isin(have)]
+
+def merge_history(sources):
+    """Concatenates history sources in priority order and keeps the first row per project and date."""
+    df = pd.concat([s for s in sources if not s.empty], ignore_index=True)
+    if df.empty:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    df = df.drop_duplicates(HISTORY_KEY, keep="first")
+    return df.sort_values(["developer_name", "project_code", "scraped_date"], kind="stable").reset_index(drop=True)
+
+def replace_history_logs(engine, df):
+    """history_logs := df in one transaction; the previous rows stay in history_logs__prev."""
+    prev = "history_logs" + PREVIOUS_SUFFIX
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{prev}";'))
+        if table_exists(conn, "history_logs"):
+            conn.execute(text(f'CREATE TABLE "{prev}" AS SELECT * FROM history_logs;'))
+            conn.execute(text("DELETE FROM history_logs;"))
+        df.to_sql("history_logs", conn, if_exists="append", index=False, chunksize=10000)
+        # The rebuilt rows no longer belong to the last publish; a rollback leaves them alone
+        conn.execute(text(f'DROP TABLE IF EXISTS "{HISTORY_ADDED_TABLE}";'))
+        ensure_history_indexes(conn)
+    print(f"   -> history_logs now holds {len(df)} rows (previous rows kept in {prev})")
+
+def backfill_history(engine=None, data_dir=DATA_DIR, legacy_path=LEGACY_HISTORY_CSV, keep_existing=True):
+    print("🗂️ Backfilling history_logs from archived snapshots...")
+    engine = engine or get_engine()
+
+    df_snap = stream_snapshot_history(data_dir)
+    print(f"   -> {len(df_snap)} project/date rows from {df_snap['scraped_date'].nunique()} snapshot dates")
+
+    df_existing = read_history_logs(engine) if keep_existing else pd.DataFrame(columns=HISTORY_COLUMNS)
+    print(f"   -> {len(df_existing)} existing history_logs rows")
+
+    known = pd.concat([df_snap, df_existing], ignore_index=True)
+    developer_names = dict(zip(known["project_code"].astype(str).str.split("-", n=1).str[0], known["developer_name"]))
+    df_legacy = load_legacy_history(legacy_path, developer_names)
+    print(f"   -> {len(df_legacy)} legacy rows from {legacy_path or '(none)'}")
+
+    history = merge_history([df_snap, df_existing, df_legacy])
+    print(f"   -> {len(history)} rows after dedupe on {HISTORY_KEY} "
+          f"({len(df_snap) + len(df_existing) + len(df_legacy) - len(history)} dropped)")
+    replace_history_logs(engine, history)
+    bump_data_version(engine, snapshot_hash(data_dir))
+    print("✅ Done!")
+    return history
+
+
+# =========================================================
+# PUBLISH
+# =========================================================
+def process_and_upload(engine=None, data_dir=DATA_DIR, events_path=UNIT_EVENTS_PARQUET):
     print("🚀 Starting Publisher...")
-    engine = get_engine()
+    engine = engine or get_engine()
+    ensure_local_schema(engine)
 
     # 1. READ ALL CSV FILES
     # ---------------------------------------------------------
-    all_units = []
-    all_projects = []
-    all_houses = []
-
-    for root, dirs, files in os.walk(DATA_DIR):
-        for file in files:
-            full_path = os.path.join(root, file)
-            
-            # --- A. UNIT DETAILS ---
-            if "_MELAKA_UNIT_DETAILS_" in file:
-                df = pd.read_csv(full_path)
-                rename_map = {
-                    "Kod Projek & Nama Projek": "project_name_raw",
-                    "Kod Pemaju & Nama Pemaju": "pemaju_name",
-                    "No. Permit": "permit_no",
-                    "No Unit": "unit_no",
-                    "Harga Jualan (RM)": "price_sales",
-                    "Status Jualan": "status",
-                    "Kuota Bumi": "bumi_quota",
-                    "Scraped_Date": "scraped_date",
-                    "Scraped_Timestamp": "scraped_timestamp"
-                }
-                df = df.rename(columns=rename_map)
-                
-                if "project_name_raw" in df.columns:
-                    split = df["project_name_raw"].str.split(n=1, expand=True)
-                    df["project_code"] = split[0]
-                    df["project_name"] = split[1] if split.shape[1] > 1 else ""
-                all_units.append(df)
-
-            # --- B. PROJECTS MASTER ---
-            elif "_MELAKA_ALL_PROJECTS_" in file:
-                df = pd.read_csv(full_path)
-                rename_map = {
-                    "Kod Projek & Nama Projek": "project_name_raw",
-                    "Kod Pemaju & Nama Pemaju": "pemaju_name",
-                    "No. Permit": "permit_no",
-                    "Status Projek Keseluruhan": "status_overall",
-                    "Maklumat Pembangunan": "development_info",
-                    "Daerah Projek": "location_district",
-                    "Negeri Projek": "location_state",
-                    "Tarikh Sah Laku Permit Terkini": "permit_valid_date",
-                    "Scraped_Date": "scraped_date",
-                    "Scraped_Timestamp": "scraped_timestamp"
-                }
-                df = df.rename(columns=rename_map)
-                
-                if "project_name_raw" in df.columns:
-                    split = df["project_name_raw"].str.split(n=1, expand=True)
-                    df["project_code"] = split[0]
-                    df["project_name"] = split[1] if split.shape[1] > 1 else ""
-                all_projects.append(df)
-
-            # --- C. HOUSE TYPES ---
-            elif "_MELAKA_HOUSE_TYPE_" in file:
-                df = pd.read_csv(full_path)
-                # We will rename these later in bulk
-                all_houses.append(df)
-
-    # Combine into single DataFrames
-    df_units_final = pd.concat(all_units, ignore_index=True) if all_units else pd.DataFrame()
-    df_projects_final = pd.concat(all_projects, ignore_index=True) if all_projects else pd.DataFrame()
-    df_houses_final = pd.concat(all_houses, ignore_index=True) if all_houses else pd.DataFrame()
+    print(f"📥 Reading snapshots (workers={PUBLISH_WORKERS}, chunksize={PUBLISH_CHUNKSIZE or 'off'})...")
+    snapshots = load_snapshots(data_dir)
+    df_units_final = drop_duplicate_keys(snapshots["units"], "units_detail")
+    df_projects_final = drop_duplicate_keys(snapshots["projects"], "projects_master")
+    df_houses_final = snapshots["houses"]
 
     if df_units_final.empty:
         print("⚠️ No unit data found. Aborting.")
         return
 
-    # 2. UPDATE LIVE TABLES (WIPE & REPLACE)
+    # 2. LOAD STAGING, VALIDATE, SWAP INTO LIVE
     # ---------------------------------------------------------
-    print("🔄 Updating Live Tables (Wiping old data)...")
-    with engine.begin() as conn:
-        conn.execute(text("TRUNCATE TABLE units_detail RESTART IDENTITY;"))
-        conn.execute(text("TRUNCATE TABLE projects_master RESTART IDENTITY;"))
-        conn.execute(text("TRUNCATE TABLE house_types RESTART IDENTITY;"))
-    
-    # --- 2a. UPLOAD UNITS DETAIL ---
-    valid_unit_cols = ["project_code", "project_name", "pemaju_name", "permit_no", "unit_no", "price_sales", "status", "bumi_quota", "scraped_date", "scraped_timestamp"]
-    # Filter to only columns that exist
-    cols_to_use = [c for c in valid_unit_cols if c in df_units_final.columns]
-    df_units_upload = df_units_final[cols_to_use].copy()
-    
-    df_units_upload.to_sql("units_detail", engine, if_exists="append", index=False)
-    print(f"   -> Uploaded {len(df_units_upload)} rows to units_detail")
-    
-    # --- 2b. UPLOAD PROJECTS MASTER ---
+    uploads = {"units_detail": build_live_frame(df_units_final, "units_detail")}
     if not df_projects_final.empty:
-        valid_proj_cols = [
-            "project_code", "project_name", "pemaju_name", "permit_no", 
-            "status_overall", "development_info", "location_district", 
-            "location_state", "permit_valid_date", "scraped_date", "scraped_timestamp"
-        ]
-        cols_to_use = [c for c in valid_proj_cols if c in df_projects_final.columns]
-        df_projects_upload = df_projects_final[cols_to_use].copy()
-        
-        df_projects_upload.to_sql("projects_master", engine, if_exists="append", index=False)
-        print(f"   -> Uploaded {len(df_projects_upload)} rows to projects_master")
-
-    # --- 2c. UPLOAD HOUSE TYPES ---
+        uploads["projects_master"] = build_live_frame(df_projects_final, "projects_master")
     if not df_houses_final.empty:
-         # Rename columns here
-         rename_house = {
-            "Kod Projek": "project_code", "Nama Projek": "project_name", 
-            "Jenis Rumah": "house_type", "Bil Tingkat": "num_floors", 
-            "Bil Bilik": "num_rooms", "Bil Tandas": "num_bathrooms",
-            "Keluasan Binaan (Mps)": "built_up_size", "Bil.Unit": "total_units",
-            "Harga Minimum (RM)": "price_min", "Harga Maksimum (RM)": "price_max",
-            "Peratus Sebenar %": "percent_actual", "Status Komponen": "component_status",
-            "Tarikh CCC/CFO": "date_ccc_cfo", "Tarikh VP": "date_vp",
-            "Scraped_Date": "scraped_date", "Scraped_Timestamp": "scraped_timestamp"
-         }
-         df_houses_final = df_houses_final.rename(columns=rename_house)
-         
-         valid_house_cols = list(rename_house.values())
-         cols_to_use = [c for c in valid_house_cols if c in df_houses_final.columns]
-         df_houses_upload = df_houses_final[cols_to_use].copy()
-
-         df_houses_upload.to_sql("house_types", engine, if_exists="append", index=False)
-         print(f"   -> Uploaded {len(df_houses_upload)} rows to house_types")
-
-
-    # 3. GENERATE & UPLOAD HISTORY LOGS
+        uploads["house_types"] = build_live_frame(df_houses_final, "house_types")
+
+    print(f"🧱 Applying typed schema (v{SCHEMA_VERSION})...")
+    all_rejects = []
+    for table in list(uploads):
+        uploads[table], df_rej = apply_typed_schema(uploads[table], table)
+        all_rejects.append(df_rej)
+    df_rejects = pd.concat(all_rejects, ignore_index=True)
+    print(f"   -> {len(df_rejects)} rejected values ({df_rejects['reason'].value_counts().to_dict()})")
+
+    print("🧾 Diffing unit snapshots...")
+    df_events = build_unit_events(df_units_final)
+    uploads["unit_events"] = df_events
+    print(f"   -> {len(df_events)} unit events ({df_events['event_type'].value_counts().to_dict()})")
+
+    print("🧮 Building project / developer summaries...")
+    df_project_summary = build_project_summary(df_units_final, uploads.get("projects_master", pd.DataFrame()))
+    uploads["project_summary"] = build_live_frame(df_project_summary, "project_summary")
+    uploads["developer_summary"] = build_live_frame(build_developer_summary(df_project_summary), "developer_summary")
+    print(f"   -> {len(uploads['project_summary'])} projects, {len(uploads['developer_summary'])} developers")
+
+    if "house_types" in uploads:
+        print("📐 Building price per m² analytics...")
+        df_pricing = build_house_pricing(uploads["house_types"], uploads.get("projects_master", pd.DataFrame()), df_project_summary)
+        uploads["house_pricing"] = df_pricing
+        uploads["price_percentiles"] = build_price_percentiles(df_pricing)
+        print(f"   -> {int(df_pricing['psm_mid'].notna().sum())} of {len(df_pricing)} house types priced per m²")
+
+    uploads["publish_rejects"] = df_rejects
+    uploads["schema_version"] = build_schema_version_frame(uploads)
+
+    # 3. GENERATE HISTORY LOGS
     # ---------------------------------------------------------
     print("📈 Generating History Logs...")
     
-    # Calculate stats from the fresh df_units_final
-    df_calc = df_units_final.copy()
-    df_calc["is_sold"] = df_calc["status"].astype(str).str.lower().str.contains("telah dijual")
-    df_calc["is_bumi"] = df_calc["bumi_quota"].astype(str).str.lower().str.strip() == "ya"
-    df_calc["price"] = df_calc["price_sales"].apply(clean_money)
+    # Calculate stats from the fresh df_units_final. history_logs is never
+    # truncated: every archived date is rebuilt each run, and only keys not
+    # logged yet are appended (inside the swap transaction below).
+    history_df = build_history_logs(df_units_final)
 
-    # Group by Project
-    history_df = df_calc.groupby(["project_code", "project_name", "pemaju_name", "scraped_date"], as_index=False).agg(
-        total_units=("unit_no", "count"),
-        units_sold=("is_sold", "sum"),
-        units_bumi=("is_bumi", "sum"),
-        sales_value=("price", lambda x: x[df_calc.loc[x.index, "is_sold"]].sum())
-    )
-    
-    history_df["units_unsold"] = history_df["total_units"] - history_df["units_sold"]
-    history_df["take_up_rate"] = (history_df["units_sold"] / history_df["total_units"]) * 100
-    
-    # Rename for DB
-    history_df = history_df.rename(columns={"pemaju_name": "developer_name"})
-    
-    # Append to History Table (Do NOT truncate this one!)
-    history_df.to_sql("history_logs", engine, if_exists="append", index=False)
-    print(f"   -> Added {len(history_df)} logs to history_logs")
+    # 4. STAGE, SWAP, APPEND HISTORY, BUMP DATA VERSION - one transaction, all or nothing
+    # ---------------------------------------------------------
+    print("🔄 Loading staging tables...")
+    for table, df in uploads.items():
+        load_staging(engine, table, df)
+    for table, df in uploads.items():
+        validate_staging(engine, table, len(df))
+    swap_staging(engine, list(uploads), history_df, snapshot_hash(data_dir))
+    save_unit_events_parquet(df_events, events_path)
 
     print("✅ Done!")
 
 if __name__ == "__main__":
-    process_and_upload()
+    parser = argparse.ArgumentParser(description="Publish scraped CSVs to the database.")
+    parser.add_argument("--rollback", action="store_true", help="Swap the previous generation of live tables back in")
+    parser.add_argument("--backfill-history", action="store_true", help="Rebuild history_logs from every archived snapshot (+ legacy CSV)")
+    parser.add_argument("--legacy-history", default=LEGACY_HISTORY_CSV, help="Legacy history CSV merged by --backfill-history ('' to skip)")
+    parser.add_argument("--no-existing-history", dest="keep_existing", action="store_false",
+                        help="With --backfill-history, drop history_logs rows no snapshot or legacy row covers")
+    parser.add_argument("--backend", default=DB_BACKEND, choices=["postgres", "sqlite", "duckdb"], help="Target database (default: $DB_BACKEND or postgres)")
+    parser.add_argument("--db-path", default=None, help="Database file for sqlite/duckdb backends")
+    args = parser.parse_args()
+
+    db_path = args.db_path or (DB_PATH if args.backend == DB_BACKEND else LOCAL_DB_DEFAULT_PATHS.get(args.backend, ""))
+    engine = get_engine(args.backend, db_path)
+    if args.rollback:
+        rollback_publish(engine)
+    elif args.backfill_history:
+        backfill_history(engine, legacy_path=args.legacy_history, keep_existing=args.keep_existing)
+    else:
+        process_and_upload(engine)
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# =========================================================
+# SHARED ADAPTIVE RATE LIMITER
+# =========================================================
+# One token bucket for every scraper worker on the machine. The bucket lives in
+# a small JSON file guarded by an OS file lock, so threads and separate
+# processes pointing at the same path draw from the same budget.
+#
+# The refill rate adapts (AIMD) to what the workers observe:
+#   - every fast success adds RATE_STEP requests/sec, up to max_rate
+#   - a timeout / error halves the rate, down to min_rate
+#   - a latency average above target_latency trims it by 10%
+# Decreases are spaced by DECREASE_INTERVAL so one slow spell seen by many
+# workers at once only backs off once. The learned rate is kept in the file and
+# carries over to the next run.
+RATE_STEP = 0.02
+BACKOFF = 0.5
+SLOWDOWN = 0.9
+DECREASE_INTERVAL = 5.0
+LATENCY_ALPHA = 0.2
+MAX_SLEEP = 1.0
+
+
+class _FileLock:
+    """Exclusive lock on <path>.lock (flock on POSIX, msvcrt on Windows)."""
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self.f = None
+
+    def __enter__(self):
+        self.f = open(self.path, "a+b")
+        if fcntl:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        else:
+            self.f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl:
+                fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+            else:
+                self.f.seek(0)
+                msvcrt.locking(self.f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.f.close()
+
+
+class RateLimiter:
+    """Token bucket shared through `path`; acquire() before a request, record() what it did."""
+
+    def __init__(self, path, rate=0.5, burst=3, min_rate=0.1, max_rate=2.0, target_latency=5.0):
+        self.path = path
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.initial_rate = min(max(rate, min_rate), max_rate)
+        self._thread_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _fresh_state(self):
+        return {"rate": self.initial_rate, "tokens": float(self.burst), "updated": time.time(),
+                "latency": None, "last_decrease": 0.0, "requests": 0, "failures": 0}
+
+    @contextmanager
+    def _state(self):
+        """Yields the shared state dict under both locks and writes it back."""
+        with self._thread_lock, _FileLock(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = self._fresh_state()
+            # Config may have changed since the file was written
+            state["rate"] = min(max(state.get("rate", self.initial_rate), self.min_rate), self.max_rate)
+            yield state
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+
+    def acquire(self, cost=1.0):
+        """Blocks until `cost` tokens are available; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._state() as state:
+                now = time.time()
+                elapsed = max(0.0, now - state["updated"])
+                state["tokens"] = min(float(self.burst), state["tokens"] + elapsed * state["rate"])
+                state["updated"] = now
+                if state["tokens"] >= cost:
+                    state["tokens"] -= cost
+                    state["requests"] += 1
+                    return waited
+                pause = (cost - state["tokens"]) / state["rate"]
+            pause = min(pause, MAX_SLEEP)
+            time.sleep(pause)
+            waited += pause
+
+    def record(self, latency=None, ok=True):
+        """Feeds one observation (seconds, success) back into the shared rate."""
+        with self._state() as state:
+            now = time.time()
+            if latency is not None:
+                prev = state["latency"]
+                state["latency"] = latency if prev is None else prev + LATENCY_ALPHA * (latency - prev)
+            old = state["rate"]
+            can_decrease = now - state["last_decrease"] >= DECREASE_INTERVAL
+            if not ok:
+                state["failures"] += 1
+                if can_decrease:
+                    state["rate"] = max(self.min_rate, old * BACKOFF)
+            elif state["latency"] is not None and state["latency"] > self.target_latency:
+                if can_decrease:
+                    state["rate"] = max(self.min_rate, old * SLOWDOWN)
+            else:
+                state["rate"] = min(self.max_rate, old + RATE_STEP)
+            if state["rate"] < old:
+                state["last_decrease"] = now
+                logging.info(f"ℹ️ Rate limit {old:.2f} -> {state['rate']:.2f} req/s "
+                             f"({'failure' if not ok else 'slow responses'})")
+
+    @contextmanager
+    def observe(self):
+        """Times the enclosed wait/request and records it; an exception counts as a failure."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(time.perf_counter() - start, ok=False)
+            raise
+        self.record(time.perf_counter() - start, ok=True)
+
+    @contextmanager
+    def throttled(self, cost=1.0):
+        """acquire() then observe() the enclosed request."""
+        self.acquire(cost)
+        with self.observe():
+            yield
+
+    def status(self):
+        """Current shared rate, latency average and counters."""
+        with self._state() as state:
+            return dict(state)
@@ -0,0 +1,200 @@
+# =========================================================
+# OUTPUT SCHEMAS (LOCKED ORDER)
+# =========================================================
+# Shared by the scraper (writes the CSVs) and the publisher (reads them back),
+# so both sides always agree on the column layout.
+
+# ✅ Master CSV DOES NOT include the house-type table columns
+PROJECT_MASTER_HEADERS = [
+    "Bil",
+    "Kod Projek & Nama Projek",
+    "Kod Pemaju & Nama Pemaju",
+    "No. Permit",
+    "Status Projek Keseluruhan",
+    "Maklumat Pembangunan",
+    "Lokasi Projek",
+    "Daerah Projek",
+    "Negeri Projek",
+    "Tarikh Sah Laku Permit Terkini",
+    "Scraped_Date",
+    "Scraped_Timestamp",
+]
+
+# ✅ House type CSV: follow the schema you wanted
+HOUSE_TYPE_HEADERS = [
+    "Kod Projek",
+    "Nama Projek",
+    "Jenis Rumah",
+    "Bil Tingkat",
+    "Bil Bilik",
+    "Bil Tandas",
+    "Keluasan Binaan (Mps)",
+    "Bil.Unit",
+    "Harga Minimum (RM)",
+    "Harga Maksimum (RM)",
+    "Peratus Sebenar %",
+    "Status Komponen",
+    "Tarikh CCC/CFO",
+    "Tarikh VP",
+    "Scraped_Date",
+    "Scraped_Timestamp",
+]
+
+UNIT_DETAILS_HEADERS = [
+    "Bil",
+    "Kod Projek & Nama Projek",
+    "Kod Pemaju & Nama Pemaju",
+    "No. Permit",
+
+    "No PT/Lot/Plot",
+    "No Unit",
+    "Harga Jualan (RM)",
+    "Harga SPJB (RM)",
+    "Status Jualan",
+    "Kuota Bumi",
+
+    "Scraped_Date",
+    "Scraped_Timestamp",
+]
+
+
+# =========================================================
+# CSV HEADER -> DB COLUMN
+# =========================================================
+UNIT_DETAILS_RENAME = {
+    "Kod Projek & Nama Projek": "project_name_raw",
+    "Kod Pemaju & Nama Pemaju": "pemaju_name",
+    "No. Permit": "permit_no",
+    "No PT/Lot/Plot": "lot_no",
+    "No Unit": "unit_no",
+    "Harga Jualan (RM)": "price_sales",
+    "Status Jualan": "status",
+    "Kuota Bumi": "bumi_quota",
+    "Scraped_Date": "scraped_date",
+    "Scraped_Timestamp": "scraped_timestamp",
+}
+
+PROJECT_MASTER_RENAME = {
+    "Kod Projek & Nama Projek": "project_name_raw",
+    "Kod Pemaju & Nama Pemaju": "pemaju_name",
+    "No. Permit": "permit_no",
+    "Status Projek Keseluruhan": "status_overall",
+    "Maklumat Pembangunan": "development_info",
+    "Lokasi Projek": "location_url",
+    "Daerah Projek": "location_district",
+    "Negeri Projek": "location_state",
+    "Tarikh Sah Laku Permit Terkini": "permit_valid_date",
+    "Scraped_Date": "scraped_date",
+    "Scraped_Timestamp": "scraped_timestamp",
+}
+
+HOUSE_TYPE_RENAME = {
+    "Kod Projek": "project_code", "Nama Projek": "project_name",
+    "Jenis Rumah": "house_type", "Bil Tingkat": "num_floors",
+    "Bil Bilik": "num_rooms", "Bil Tandas": "num_bathrooms",
+    "Keluasan Binaan (Mps)": "built_up_size", "Bil.Unit": "total_units",
+    "Harga Minimum (RM)": "price_min", "Harga Maksimum (RM)": "price_max",
+    "Peratus Sebenar %": "percent_actual", "Status Komponen": "component_status",
+    "Tarikh CCC/CFO": "date_ccc_cfo", "Tarikh VP": "date_vp",
+    "Scraped_Date": "scraped_date", "Scraped_Timestamp": "scraped_timestamp",
+}
+
+
+# =========================================================
+# READ SCHEMAS (publisher ingestion)
+# =========================================================
+# Every snapshot kind the publisher understands, keyed by the marker in the
+# CSV file name. Columns listed in "categorical" are low-cardinality and are
+# read straight into pandas categoricals; "numeric" maps a money/count header
+# to the parsed float column added next to it. Anything else is read as text,
+# so nothing is left to pandas type inference.
+SNAPSHOT_KINDS = {
+    "units": {
+        "marker": "_UNIT_DETAILS_",
+        "headers": UNIT_DETAILS_HEADERS,
+        "rename": UNIT_DETAILS_RENAME,
+        "categorical": ["Kod Pemaju & Nama Pemaju", "Status Jualan", "Kuota Bumi", "Scraped_Date"],
+        "numeric": {"Harga Jualan (RM)": "price", "Harga SPJB (RM)": "price_spjb"},
+    },
+    "projects": {
+        "marker": "_ALL_PROJECTS_",
+        "headers": PROJECT_MASTER_HEADERS,
+        "rename": PROJECT_MASTER_RENAME,
+        "categorical": [
+            "Kod Pemaju & Nama Pemaju", "Status Projek Keseluruhan", "Maklumat Pembangunan",
+            "Daerah Projek", "Negeri Projek", "Scraped_Date",
+        ],
+        "numeric": {},
+    },
+    "houses": {
+        "marker": "_HOUSE_TYPE_",
+        "headers": HOUSE_TYPE_HEADERS,
+        "rename": HOUSE_TYPE_RENAME,
+        "categorical": ["Jenis Rumah", "Status Komponen", "Scraped_Date"],
+        "numeric": {},
+    },
+}
+
+
+def read_dtypes(kind: str) -> dict:
+    """Explicit read_csv dtype map for a snapshot kind (no inference)."""
+    spec = SNAPSHOT_KINDS[kind]
+    return {h: ("category" if h in spec["categorical"] else str) for h in spec["headers"]}
+
+
+def categorical_columns(kind: str) -> list:
+    """Categorical columns of a snapshot kind, after renaming to DB names."""
+    spec = SNAPSHOT_KINDS[kind]
+    return [spec["rename"].get(c, c) for c in spec["categorical"]]
+
+
+# =========================================================
+# WAREHOUSE SCHEMA (typed live tables)
+# =========================================================
+# Bump SCHEMA_VERSION whenever TYPED_COLUMNS changes. The publisher records it
+# in the schema_version table next to the data it describes.
+SCHEMA_VERSION = 3
+
+# Columns the publisher parses into numbers/dates before upload, per live table.
+#   money       'RM 1,200.00' / '1,200.00'          -> float
+#   number      '100.00'                            -> float
+#   count       '4' or a list of variants '3, 4'    -> float (smallest non-zero value)
+#   area        '86' or a range '154 - 161'         -> float (midpoint of the non-zero bounds)
+#   date        '17/08/2017'                        -> timestamp
+#   permit_date 'Mula: 01 Nov 2016  Tamat: 31 Okt 2017' -> timestamp of 'Tamat' (permit expiry)
+# Blank and '-' mean "not available" and become NULL; anything else that fails
+# to parse becomes NULL and is reported in publish_rejects.
+TYPED_COLUMNS = {
+    "units_detail": {
+        "price_sales": "money",
+    },
+    "projects_master": {
+        "permit_valid_date": "permit_date",
+    },
+    "house_types": {
+        "num_floors": "count",
+        "num_rooms": "count",
+        "num_bathrooms": "count",
+        "total_units": "number",
+        "built_up_size": "area",
+        "price_min": "money",
+        "price_max": "money",
+        "percent_actual": "number",
+        "date_ccc_cfo": "date",
+        "date_vp": "date",
+    },
+}
+
+# Map links parsed into coordinate columns, per live table:
+#   'https://maps.google.com/maps?q=2.305556,102.188889' -> latitude 2.305556, longitude 102.188889
+# The link itself is kept; new columns only, so SCHEMA_VERSION is unchanged.
+COORDINATE_COLUMNS = {
+    "projects_master": {"location_url": ("latitude", "longitude")},
+}
+
+NULL_TOKENS = {"", "-", "--", "—", "n/a", "na", "nan", "none", "tiada"}
+
+MALAY_MONTHS = {
+    "jan": 1, "feb": 2, "mac": 3, "apr": 4, "mei": 5, "jun": 6,
+    "jul": 7, "ogo": 8, "sep": 9, "okt": 10, "nov": 11, "dis": 12,
+}
@@ -0,0 +1,253 @@
+import os
+import re
+import sys
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+# =========================================================
+# SCRAPE LOG ANALYTICS
+# =========================================================
+# Mines the per-developer scraper logs (logs/KPKT_SCRAPE_<pemaju>_<ts>.log,
+# written by teduh_scraper_v2.setup_logging_for_pemaju) into compact tables:
+#   runs.csv      one row per log file: duration, projects, unit rows,
+#                 rows/sec, ERROR lines, regression flags vs the previous run
+#   projects.csv  one row per project visit with its step durations
+# Logs are read line by line, so memory stays flat however many runs pile up.
+#
+#   python scrape_logs.py --log-dir logs --out-dir logs/stats
+LOG_DIR = "logs"
+OUT_DIR = "logs/stats"
+LOG_FILE_RE = re.compile(r"^KPKT_SCRAPE_(?P<pemaju>.+)_(?P<batch>\d{8}_\d{6})\.log$")
+LINE_RE = re.compile(r"^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) \| (?P<level>[A-Z]+) \| (?P<msg>.*)$")
+OPEN_RE = re.compile(r"\[(?P<n>\d+)\] Open: (?P<label>.+)$")
+UNIT_ROWS_RE = re.compile(r"Unit rows scraped = (?P<rows>\d+)")
+SUMMARY_RE = re.compile(r"SUMMARY: Projects=(?P<projects>\d+), HouseTypes=(?P<house_types>\d+), UnitRows=(?P<unit_rows>\d+)")
+
+# Milestones of a project visit; each step lasts from the previous milestone to its own
+PROJECT_STEPS = [
+    ("open_detail", "Opened project detail"),
+    ("project_info", "Maklumat Projek scraped"),
+    ("status", "Status table rows"),
+    ("units", "Unit details scraped"),
+    ("return", "Returned to listing"),
+]
+SEARCH_DONE = "Results table loaded"
+RUN_DONE = "DONE pemaju scrape"
+
+REGRESSION_THRESHOLD = 1.25
+# Runs are minutes long; ignore slowdowns below this
+MIN_REGRESSION_SECONDS = 30
+
+
+def parse_ts(raw):
+    return datetime.strptime(raw, "%Y-%m-%d %H:%M:%S,%f")
+
+def iter_log_lines(path):
+    """Yields (timestamp, level, message); traceback continuation lines are skipped."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            m = LINE_RE.match(line.rstrip("\r\n"))
+            if m:
+                yield parse_ts(m["ts"]), m["level"], m["msg"]
+
+def list_log_files(log_dir=LOG_DIR):
+    """[(path, pemaju, batch), ...] for every scraper log, oldest batch first."""
+    jobs = []
+    for file in os.listdir(log_dir) if os.path.isdir(log_dir) else []:
+        m = LOG_FILE_RE.match(file)
+        if m:
+            jobs.append((os.path.join(log_dir, file), m["pemaju"], m["batch"]))
+    return sorted(jobs, key=lambda j: (j[2], j[1]))
+
+
+# =========================================================
+# PARSER
+# =========================================================
+def _new_project(n, label, ts):
+    code, _, name = label.partition(" ")
+    return {"seq": int(n), "project_code": code, "project_name": name.strip(), "start": ts,
+            "last_mark": ts, "unit_rows": 0, "errors": 0, "completed": False}
+
+def _close_project(project, end):
+    project["seconds"] = (end - project.pop("start")).total_seconds()
+    project.pop("last_mark")
+    return project
+
+def parse_log(path, pemaju, batch):
+    """Streams one log; returns (run row, [project rows])."""
+    run = {"pemaju": pemaju, "batch": batch, "log_file": os.path.basename(path), "start": None, "end": None,
+           "setup_seconds": None, "errors": 0, "completed": False, "projects": 0, "unit_rows": 0,
+           "summary_projects": None, "summary_unit_rows": None}
+    projects, current, ts = [], None, None
+
+    for ts, level, msg in iter_log_lines(path):
+        if run["start"] is None:
+            run["start"] = ts
+        is_error = level in ("ERROR", "CRITICAL")
+        run["errors"] += is_error
+
+        opened = OPEN_RE.search(msg)
+        if opened:
+            if current:
+                projects.append(_close_project(current, ts))
+            current = _new_project(opened["n"], opened["label"], ts)
+            continue
+        if current is None:
+            if SEARCH_DONE in msg and run["setup_seconds"] is None:
+                run["setup_seconds"] = (ts - run["start"]).total_seconds()
+            summary = SUMMARY_RE.search(msg)
+            if summary:
+                run["summary_projects"] = int(summary["projects"])
+                run["summary_unit_rows"] = int(summary["unit_rows"])
+            run["completed"] |= RUN_DONE in msg
+            continue
+
+        current["errors"] += is_error
+        rows = UNIT_ROWS_RE.search(msg)
+        if rows:
+            current["unit_rows"] += int(rows["rows"])
+        for step, marker in PROJECT_STEPS:
+            if marker in msg:
+                current[f"{step}_s"] = (ts - current["last_mark"]).total_seconds()
+                current["last_mark"] = ts
+                if step == "return":
+                    projects.append(_close_project(dict(current, completed=True), ts))
+                    current = None
+                break
+        else:
+            # Pagination / summary lines end a visit that never returned to the listing
+            if "next page" in msg.lower() or SUMMARY_RE.search(msg) or RUN_DONE in msg:
+                projects.append(_close_project(current, ts))
+                current = None
+                summary = SUMMARY_RE.search(msg)
+                if summary:
+                    run["summary_projects"] = int(summary["projects"])
+                    run["summary_unit_rows"] = int(summary["unit_rows"])
+                run["completed"] |= RUN_DONE in msg
+
+    if current:
+        projects.append(_close_project(current, ts))
+    run["end"] = ts
+    run["seconds"] = (ts - run["start"]).total_seconds() if run["start"] else None
+    run["projects"] = len(projects)
+    run["unit_rows"] = run["summary_unit_rows"] if run["summary_unit_rows"] is not None \
+        else sum(p["unit_rows"] for p in projects)
+    for p in projects:
+        p.update(pemaju=pemaju, batch=batch)
+    return run, projects
+
+
+# =========================================================
+# TABLES + REGRESSION CHECK
+# =========================================================
+def flag_regressions(df_runs, threshold=REGRESSION_THRESHOLD, min_seconds=MIN_REGRESSION_SECONDS):
+    """Compares each run with the same developer's previous run (by batch)."""
+    df = df_runs.sort_values(["pemaju", "batch"]).copy()
+    prev = df.groupby("pemaju", observed=True)[["seconds", "error_rate"]].shift()
+    df["prev_seconds"] = prev["seconds"]
+    df["prev_error_rate"] = prev["error_rate"]
+    df["duration_regressed"] = (df["seconds"] > df["prev_seconds"] * threshold) & \
+        (df["seconds"] - df["prev_seconds"] > min_seconds)
+    df["errors_regressed"] = df["error_rate"] > df["prev_error_rate"]
+    df["regressed"] = df["duration_regressed"] | df["errors_regressed"] | ~df["completed"]
+    return df.sort_values(["batch", "pemaju"]).reset_index(drop=True)
+
+def analyse_logs(log_dir=LOG_DIR, threshold=REGRESSION_THRESHOLD):
+    """(df_runs, df_projects) for every log in log_dir."""
+    runs, projects = [], []
+    for path, pemaju, batch in list_log_files(log_dir):
+        run, visits = parse_log(path, pemaju, batch)
+        runs.append(run)
+        projects += visits
+
+    df_runs = pd.DataFrame(runs)
+    if df_runs.empty:
+        return df_runs, pd.DataFrame(projects)
+    df_runs["rows_per_sec"] = (df_runs["unit_rows"] / df_runs["seconds"]).round(2)
+    df_runs["seconds_per_project"] = (df_runs["seconds"] / df_runs["projects"]).round(1)
+    df_runs["error_rate"] = df_runs["errors"] / df_runs["projects"].clip(lower=1)
+    df_runs = flag_regressions(df_runs, threshold)
+
+    step_cols = [f"{step}_s" for step, _ in PROJECT_STEPS]
+    df_projects = pd.DataFrame(projects).reindex(columns=[
+        "batch", "pemaju", "seq", "project_code", "project_name", "seconds", *step_cols,
+        "unit_rows", "errors", "completed",
+    ])
+    df_projects["rows_per_sec"] = (df_projects["unit_rows"] / df_projects["seconds"]).round(2)
+    for col in ["batch", "pemaju"]:
+        df_runs[col] = df_runs[col].astype("category")
+        df_projects[col] = df_projects[col].astype("category")
+    return df_runs, df_projects
+
+def developer_summary(df_runs):
+    """Per developer: run count, median/last duration, rows/sec and error totals."""
+    return df_runs.sort_values("batch").groupby("pemaju", observed=True).agg(
+        runs=("batch", "size"),
+        median_seconds=("seconds", "median"),
+        last_seconds=("seconds", "last"),
+        median_rows_per_sec=("rows_per_sec", "median"),
+        errors=("errors", "sum"),
+        regressions=("regressed", "sum"),
+    ).reset_index()
+
+def project_summary(df_projects):
+    """Per project: visits, median visit and step durations, errors."""
+    step_cols = [f"{step}_s" for step, _ in PROJECT_STEPS]
+    df = df_projects.astype({"pemaju": "string"})
+    return df.groupby(["project_code", "project_name"], observed=True).agg(
+        visits=("seconds", "size"),
+        developers=("pemaju", "nunique"),
+        median_seconds=("seconds", "median"),
+        **{f"median_{c}": (c, "median") for c in step_cols},
+        median_unit_rows=("unit_rows", "median"),
+        errors=("errors", "sum"),
+    ).reset_index().sort_values("median_seconds", ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-run, per-developer and per-project timings from scraper logs.")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--out-dir", default=OUT_DIR, help="Where runs.csv / developers.csv / projects.csv go ('' to skip)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="A run regresses when slower than the previous one by this factor")
+    parser.add_argument("--top", type=int, default=10, help="Slowest projects to print")
+    args = parser.parse_args()
+
+    print(f"🔎 Reading scraper logs from {args.log_dir}...")
+    df_runs, df_projects = analyse_logs(args.log_dir, args.threshold)
+    if df_runs.empty:
+        print("⚠️ No KPKT_SCRAPE_*.log files found")
+        sys.exit(0)
+    df_devs = developer_summary(df_runs)
+    df_proj = project_summary(df_projects)
+    print(f"   -> {len(df_runs)} runs, {df_runs['pemaju'].nunique()} developers, {len(df_projects)} project visits, "
+          f"{int(df_runs['errors'].sum())} ERROR lines")
+
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        batches = df_runs.groupby("batch", observed=True).agg(
+            developers=("pemaju", "size"), seconds=("seconds", "sum"), unit_rows=("unit_rows", "sum"),
+            errors=("errors", "sum"), regressed=("regressed", "sum"))
+        print("\n📅 Per batch:")
+        print(batches.to_string())
+        print("\n🏢 Per developer:")
+        print(df_devs.to_string(index=False))
+        print(f"\n🐢 Slowest {args.top} projects (median visit):")
+        print(df_proj.head(args.top).to_string(index=False))
+
+    flagged = df_runs[df_runs["regressed"]]
+    print(f"\n{'⚠️' if len(flagged) else '✅'} {len(flagged)} run(s) regressed against the developer's previous run")
+    for r in flagged.itertuples():
+        why = [w for w, hit in [
+            (f"duration {r.prev_seconds:.0f}s -> {r.seconds:.0f}s", r.duration_regressed),
+            (f"errors/project {r.prev_error_rate:.2f} -> {r.error_rate:.2f}", r.errors_regressed),
+            ("did not finish", not r.completed),
+        ] if hit]
+        print(f"   {r.batch} {r.pemaju}: {'; '.join(why)}")
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        for name, df in [("runs", df_runs), ("developers", df_devs), ("projects", df_projects)]:
+            df.to_csv(os.path.join(args.out_dir, f"{name}.csv"), index=False)
+        print(f"💾 Saved runs.csv, developers.csv, projects.csv to {args.out_dir}")
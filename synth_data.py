@@ -0,0 +1,221 @@
+import os
+import csv
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from schemas import PROJECT_MASTER_HEADERS, HOUSE_TYPE_HEADERS, UNIT_DETAILS_HEADERS
+
+# =========================================================
+# SYNTHETIC SNAPSHOT GENERATOR
+# =========================================================
+# Writes a data/pemaju-style tree of weekly UNIT_DETAILS / ALL_PROJECTS /
+# HOUSE_TYPE CSVs that follow the scraper's header schemas and value formats,
+# at any scale, for publisher / dashboard benchmarks (see benchmark.py).
+#
+#   python synth_data.py --out /tmp/synth --scale 10
+#
+# scale=1 is roughly today's Melaka coverage: 36 developers, ~7 projects each,
+# ~175 units per project, 8 weekly snapshots with each developer re-scraped in
+# about half of the weeks (~190k unit rows in ~300 files).
+BASE_DEVELOPERS = 36
+PROJECTS_PER_DEVELOPER = 7
+UNITS_PER_PROJECT = 150
+WEEKS = 8
+SCRAPE_RATE = 0.45
+START_DATE = "2025-12-15"
+
+# Value pools, weighted like the real snapshots
+PROJECT_STATUSES = [("Siap Dengan CCC", 60), ("Lancar", 18), ("Siap Dengan CFO", 9), ("Belum Mula", 3),
+                    ("Permit Telah Dibatalkan", 1), ("Lewat", 1)]
+DISTRICTS = [("Melaka Tengah", 55), ("Jasin", 23), ("Alor Gajah", 19), ("-", 3)]
+HOUSE_TYPES = [("Rumah Teres", 55), ("Rumah Berkembar", 20), ("Rumah Sesebuah", 15), ("Rumah Kluster", 5),
+               ("Rumah Bandar", 2), ("Pangsapuri Servis", 2), ("Rumah Pangsa/Kondo", 1)]
+COMPONENT_STATUSES = [("Siap Dengan CCC", 60), ("Siap Dengan CFO", 17), ("Lancar", 15), ("-", 6), ("Belum Mula", 2)]
+NAME_PREFIXES = ["TAMAN", "BANDAR", "RESIDENSI", "TAMAN DESA", "TAMAN BUKIT", "KOTA", "PANGSAPURI"]
+NAME_WORDS = ["BERTAM", "KATIL", "BERUANG", "CHENG", "AYER KEROH", "KRUBONG", "DURIAN TUNGGAL", "MERLIMAU",
+              "SERKAM", "TANGGA BATU", "PAYA RUMPUT", "BATU BERENDAM", "KLEBANG", "UMBAI", "JASIN", "SETIA",
+              "INDAH", "JAYA", "PERMAI", "HEIGHTS", "AVENUE", "UTAMA", "MUTIARA", "BESTARI"]
+MALAY_MONTHS = ["Jan", "Feb", "Mac", "Apr", "Mei", "Jun", "Jul", "Ogo", "Sep", "Okt", "Nov", "Dis"]
+
+
+def _pick(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights=weights)[0]
+
+def _rm(value, prefix="RM "):
+    return f"{prefix}{value:,.2f}"
+
+def _malay_date(d):
+    return f"{d.day:02d} {MALAY_MONTHS[d.month - 1]} {d.year}"
+
+
+# =========================================================
+# WORLD MODEL (developers -> projects -> house types -> units)
+# =========================================================
+def build_world(rng, developers, projects_per_developer, units_per_project, start):
+    """Static developers / projects / units; sales then evolve week by week."""
+    world = []
+    for d in range(developers):
+        dev_code = 20000 + d
+        dev_name = f"{dev_code} SYNTH {rng.choice(NAME_WORDS)} DEVELOPMENT SDN. BHD."
+        dev = {"key": f"SYNTH {d:05d}", "name": dev_name, "projects": []}
+        n_projects = max(1, int(rng.gauss(projects_per_developer, projects_per_developer / 3)))
+        for p in range(1, n_projects + 1):
+            code = f"{dev_code}-{p}"
+            permit_start = start - timedelta(days=rng.randint(30, 900))
+            project = {
+                "code": code,
+                "name": f"{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)}",
+                "permit": f"{code}/{permit_start:%m-%Y}/{rng.randint(100, 999):04d}(N)-(L)",
+                "status": _pick(rng, PROJECT_STATUSES),
+                "phased": rng.random() < 0.95,
+                "location": (f"https://maps.google.com/maps?q={rng.uniform(2.10, 2.45):.6f},{rng.uniform(102.05, 102.55):.6f}"
+                             if rng.random() < 0.8 else ""),
+                "district": _pick(rng, DISTRICTS),
+                "permit_dates": f"Mula: {_malay_date(permit_start)}   Tamat: {_malay_date(permit_start + timedelta(days=730))}",
+                # weekly probability that an unsold unit is sold
+                "velocity": rng.choice([0.0, 0.002, 0.01, 0.03, 0.08]),
+                "house_types": [],
+                "units": [],
+            }
+            n_units = max(4, int(rng.lognormvariate(0, 0.6) * units_per_project))
+            n_types = min(rng.randint(1, 4), n_units)
+            cuts = sorted(rng.sample(range(1, n_units), n_types - 1)) if n_types > 1 else []
+            bounds = [0] + cuts + [n_units]
+            lot = rng.randint(10000, 90000)
+            for t in range(n_types):
+                base = rng.uniform(150_000, 900_000)
+                size = rng.randint(70, 280)
+                project["house_types"].append({
+                    "type": _pick(rng, HOUSE_TYPES),
+                    "floors": rng.choice([1, 1, 2, 2, 3]),
+                    "rooms": rng.choice([2, 3, 3, 4, 4, 5]),
+                    "baths": rng.choice([1, 2, 2, 3, 4]),
+                    "size": f"{size}" if rng.random() < 0.8 else f"{size} - {size + rng.randint(1, 20)}",
+                    "units": bounds[t + 1] - bounds[t],
+                    "price_min": base,
+                    "price_max": base * rng.uniform(1.0, 1.4),
+                    "percent": rng.choice([0.0, 40.0, 57.5, 100.0, 100.0]),
+                    "component": _pick(rng, COMPONENT_STATUSES),
+                    "ccc": "-" if rng.random() < 0.4 else f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2005, 2025)}",
+                })
+                for _ in range(bounds[t + 1] - bounds[t]):
+                    lot += 1
+                    price = round(rng.uniform(base, base * 1.4), -2)
+                    project["units"].append({
+                        "lot": f"HSD {lot}",
+                        "unit": f"PT {lot + 1000}",
+                        "price": price,
+                        "bumi": rng.random() < 0.35,
+                        "sold": rng.random() < 0.85,
+                    })
+            dev["projects"].append(project)
+        world.append(dev)
+    return world
+
+def advance_week(rng, world):
+    """Sells some unsold units (per-project velocity) and reprices a few."""
+    for dev in world:
+        for project in dev["projects"]:
+            for u in project["units"]:
+                if not u["sold"] and rng.random() < project["velocity"]:
+                    u["sold"] = True
+                elif rng.random() < 0.002:
+                    u["price"] = round(u["price"] * rng.uniform(0.95, 1.08), -2)
+
+
+# =========================================================
+# CSV ASSEMBLY (same layout as the scraper's write_csv)
+# =========================================================
+def write_csv(path, headers, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.DictWriter(f, fieldnames=headers)
+        w.writeheader()
+        for r in rows:
+            w.writerow({h: r.get(h, "") for h in headers})
+
+def snapshot_rows(dev, scraped_date, scraped_ts):
+    master, houses, units = [], [], []
+    for i, p in enumerate(dev["projects"], 1):
+        kod_nama = f"{p['code']} {p['name']}"
+        stamp = {"Scraped_Date": scraped_date, "Scraped_Timestamp": scraped_ts}
+        master.append({
+            "Bil": i, "Kod Projek & Nama Projek": kod_nama, "Kod Pemaju & Nama Pemaju": dev["name"],
+            "No. Permit": p["permit"], "Status Projek Keseluruhan": p["status"],
+            "Maklumat Pembangunan": "Berfasa" if p["phased"] else "Tidak Berfasa",
+            "Lokasi Projek": p["location"], "Daerah Projek": p["district"], "Negeri Projek": "Melaka",
+            "Tarikh Sah Laku Permit Terkini": p["permit_dates"], **stamp,
+        })
+        for h in p["house_types"]:
+            houses.append({
+                "Kod Projek": p["code"], "Nama Projek": p["name"], "Jenis Rumah": h["type"],
+                "Bil Tingkat": h["floors"], "Bil Bilik": h["rooms"], "Bil Tandas": h["baths"],
+                "Keluasan Binaan (Mps)": h["size"], "Bil.Unit": h["units"],
+                "Harga Minimum (RM)": _rm(h["price_min"], ""), "Harga Maksimum (RM)": _rm(h["price_max"], ""),
+                "Peratus Sebenar %": f"{h['percent']:.2f}", "Status Komponen": h["component"],
+                "Tarikh CCC/CFO": h["ccc"], "Tarikh VP": h["ccc"] if h["percent"] == 100.0 else "-", **stamp,
+            })
+        for u in p["units"]:
+            units.append({
+                "Bil": len(units) + 1, "Kod Projek & Nama Projek": kod_nama,
+                "Kod Pemaju & Nama Pemaju": dev["name"], "No. Permit": p["permit"],
+                "No PT/Lot/Plot": u["lot"], "No Unit": u["unit"], "Harga Jualan (RM)": _rm(u["price"]),
+                "Harga SPJB (RM)": _rm(u["price"]) if u["sold"] else "-",
+                "Status Jualan": "Telah Dijual" if u["sold"] else "Belum Dijual",
+                "Kuota Bumi": "Ya" if u["bumi"] else "Tidak", **stamp,
+            })
+    return master, houses, units
+
+def generate(out_dir, scale=1.0, developers=None, projects_per_developer=PROJECTS_PER_DEVELOPER,
+             units_per_project=UNITS_PER_PROJECT, weeks=WEEKS, start_date=START_DATE, seed=42,
+             scrape_rate=SCRAPE_RATE):
+    """
+    Writes out_dir/pemaju/<developer>/<developer>_MELAKA_<KIND>_<YYYYMMDD>.csv for
+    each week a developer is scraped (every developer in week one, then
+    scrape_rate of them). Returns row / file counts.
+    """
+    rng = random.Random(seed)
+    developers = developers or max(1, round(BASE_DEVELOPERS * scale))
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    world = build_world(rng, developers, projects_per_developer, units_per_project, start)
+
+    stats = {"developers": developers, "projects": sum(len(d["projects"]) for d in world),
+             "weeks": weeks, "files": 0, "unit_rows": 0, "project_rows": 0, "house_rows": 0}
+    for week in range(weeks):
+        day = start + timedelta(days=7 * week)
+        for dev in world:
+            if week and rng.random() > scrape_rate:
+                continue
+            ts = day.replace(hour=rng.randint(8, 20), minute=rng.randint(0, 59), second=rng.randint(0, 59))
+            master, houses, units = snapshot_rows(dev, f"{day:%Y-%m-%d}", f"{ts:%Y-%m-%d %H:%M:%S}")
+            folder = os.path.join(out_dir, "pemaju", dev["key"])
+            prefix = os.path.join(folder, f"{dev['key']}_MELAKA")
+            write_csv(f"{prefix}_ALL_PROJECTS_{day:%Y%m%d}.csv", PROJECT_MASTER_HEADERS, master)
+            write_csv(f"{prefix}_HOUSE_TYPE_{day:%Y%m%d}.csv", HOUSE_TYPE_HEADERS, houses)
+            write_csv(f"{prefix}_UNIT_DETAILS_{day:%Y%m%d}.csv", UNIT_DETAILS_HEADERS, units)
+            stats["files"] += 3
+            stats["unit_rows"] += len(units)
+            stats["project_rows"] += len(master)
+            stats["house_rows"] += len(houses)
+        advance_week(rng, world)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic scraper snapshots at scale.")
+    parser.add_argument("--out", required=True, help="Output root (snapshots go to <out>/pemaju/...)")
+    parser.add_argument("--scale", type=float, default=1.0, help=f"Multiplier on {BASE_DEVELOPERS} developers")
+    parser.add_argument("--developers", type=int, default=None, help="Exact developer count (overrides --scale)")
+    parser.add_argument("--projects-per-developer", type=int, default=PROJECTS_PER_DEVELOPER)
+    parser.add_argument("--units-per-project", type=int, default=UNITS_PER_PROJECT)
+    parser.add_argument("--weeks", type=int, default=WEEKS)
+    parser.add_argument("--start-date", default=START_DATE)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"🏗️ Generating synthetic snapshots in {args.out} ...")
+    stats = generate(args.out, args.scale, args.developers, args.projects_per_developer,
+                     args.units_per_project, args.weeks, args.start_date, args.seed)
+    print(f"✅ {stats}")
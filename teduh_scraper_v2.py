@@ -22,6 +22,9 @@ from selenium.common.exceptions import (
 )
 from webdriver_manager.chrome import ChromeDriverManager
 
+from schemas import PROJECT_MASTER_HEADERS, HOUSE_TYPE_HEADERS, UNIT_DETAILS_HEADERS
+from rate_limiter import RateLimiter
+
 
 # =========================================================
 # CONFIG (EDIT THESE VALUES ONLY)
@@ -37,6 +40,13 @@ CONFIG = {
     "DELAY_PAGE_LOAD": 3.5,
     "MAX_WAIT_SECONDS": 30,
 
+    # Shared rate limit for page loads and clicks (all workers using the same ROOT_DIR share it)
+    "RATE_PER_SEC": 0.5,        # starting rate; adapts between the min and max below
+    "RATE_MIN": 0.1,
+    "RATE_MAX": 2.0,
+    "RATE_BURST": 3,
+    "TARGET_LATENCY": 5.0,      # slow down when waits average longer than this (seconds)
+
     # Input list
     "PEMAJU_LIST_TXT": "pemaju_list.txt",
 
@@ -50,62 +60,14 @@ SCRAPE_TIMESTAMP = NOW.strftime("%Y-%m-%d %H:%M:%S")
 DATE_SUFFIX = NOW.strftime("%Y%m%d")
 TIME_SUFFIX = NOW.strftime("%Y%m%d_%H%M%S")
 
-
-# =========================================================
-# OUTPUT SCHEMAS (LOCKED ORDER)
-# =========================================================
-# ✅ Master CSV DOES NOT include the house-type table columns
-PROJECT_MASTER_HEADERS = [
-    "Bil",
-    "Kod Projek & Nama Projek",
-    "Kod Pemaju & Nama Pemaju",
-    "No. Permit",
-    "Status Projek Keseluruhan",
-    "Maklumat Pembangunan",
-    "Lokasi Projek",
-    "Daerah Projek",
-    "Negeri Projek",
-    "Tarikh Sah Laku Permit Terkini",
-    "Scraped_Date",
-    "Scraped_Timestamp",
-]
-
-# ✅ House type CSV: follow the schema you wanted
-HOUSE_TYPE_HEADERS = [
-    "Kod Projek",
-    "Nama Projek",
-    "Jenis Rumah",
-    "Bil Tingkat",
-    "Bil Bilik",
-    "Bil Tandas",
-    "Keluasan Binaan (Mps)",
-    "Bil.Unit",
-    "Harga Minimum (RM)",
-    "Harga Maksimum (RM)",
-    "Peratus Sebenar %",
-    "Status Komponen",
-    "Tarikh CCC/CFO",
-    "Tarikh VP",
-    "Scraped_Date",
-    "Scraped_Timestamp",
-]
-
-UNIT_DETAILS_HEADERS = [
-    "Bil",
-    "Kod Projek & Nama Projek",
-    "Kod Pemaju & Nama Pemaju",
-    "No. Permit",
-
-    "No PT/Lot/Plot",
-    "No Unit",
-    "Harga Jualan (RM)",
-    "Harga SPJB (RM)",
-    "Status Jualan",
-    "Kuota Bumi",
-
-    "Scraped_Date",
-    "Scraped_Timestamp",
-]
+LIMITER = RateLimiter(
+    os.path.join(CONFIG["ROOT_DIR"], "rate_limit.json"),
+    rate=CONFIG["RATE_PER_SEC"],
+    burst=CONFIG["RATE_BURST"],
+    min_rate=CONFIG["RATE_MIN"],
+    max_rate=CONFIG["RATE_MAX"],
+    target_latency=CONFIG["TARGET_LATENCY"],
+)
 
 
 # =========================================================
@@ -128,6 +90,7 @@ def ensure_dir(p: str):
     os.makedirs(p, exist_ok=True)
 
 def safe_click(driver, element):
+    LIMITER.acquire()
     try:
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
         time.sleep(CONFIG["DELAY_CLICK"] / 2)
@@ -136,13 +99,20 @@ def safe_click(driver, element):
         driver.execute_script("arguments[0].click();", element)
     time.sleep(CONFIG["DELAY_CLICK"])
 
-def wait_clickable(driver, locator, timeout=None):
+def wait_clickable(driver, locator, timeout=None, observe=True):
+    # observe=False for probes that are expected to miss (not a sign of a slow server)
     timeout = timeout or CONFIG["MAX_WAIT_SECONDS"]
-    return WebDriverWait(driver, timeout).until(EC.element_to_be_clickable(locator))
+    if not observe:
+        return WebDriverWait(driver, timeout).until(EC.element_to_be_clickable(locator))
+    with LIMITER.observe():
+        return WebDriverWait(driver, timeout).until(EC.element_to_be_clickable(locator))
 
-def wait_visible(driver, locator, timeout=None):
+def wait_visible(driver, locator, timeout=None, observe=True):
     timeout = timeout or CONFIG["MAX_WAIT_SECONDS"]
-    return WebDriverWait(driver, timeout).until(EC.visibility_of_element_located(locator))
+    if not observe:
+        return WebDriverWait(driver, timeout).until(EC.visibility_of_element_located(locator))
+    with LIMITER.observe():
+        return WebDriverWait(driver, timeout).until(EC.visibility_of_element_located(locator))
 
 
 # =========================================================
@@ -206,7 +176,8 @@ def setup_logging_for_pemaju(log_dir: str, pemaju_key: str):
 # FORM ACTIONS (UPDATED ROBUST VERSION)
 # =========================================================
 def perform_search(driver, keyword: str):
-    driver.get(CONFIG["BASE_URL"])
+    with LIMITER.throttled():
+        driver.get(CONFIG["BASE_URL"])
     time.sleep(CONFIG["DELAY_PAGE_LOAD"])
     ok(f"Opened {CONFIG['BASE_URL']}")
 
@@ -268,6 +239,7 @@ def perform_search(driver, keyword: str):
             info(f"⏳ Attempt {attempt+1}: Waiting for results table...")
 
     if not found_match:
+        LIMITER.record(ok=False)
         fail(f"⚠️ WARNING: Time out waiting for '{keyword}'. The scraper will try to process whatever is there.")
     
     # Ensure table is visible before returning
@@ -335,7 +307,7 @@ def close_project_detail(driver):
 # =========================================================
 def click_side_tab(driver, tab_text_lower: str):
     xp = f"//span[contains(translate(normalize-space(.),'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'{tab_text_lower}')]/ancestor::*[self::button or self::a][1]"
-    tab = wait_clickable(driver, (By.XPATH, xp), timeout=12)
+    tab = wait_clickable(driver, (By.XPATH, xp), timeout=12, observe=False)
     safe_click(driver, tab)
     time.sleep(CONFIG["DELAY_CLICK"])
     ok(f"Tab opened: {tab_text_lower}")
@@ -427,7 +399,7 @@ def extract_status_header_fields(driver):
 def extract_status_table_rows(driver):
     rows_out = []
     try:
-        table = wait_visible(driver, (By.XPATH, "//table[contains(@class,'table-status')]"), timeout=15)
+        table = wait_visible(driver, (By.XPATH, "//table[contains(@class,'table-status')]"), timeout=15, observe=False)
     except Exception:
         table = wait_visible(driver, (By.XPATH, "//div[contains(@class,'status-table-wrap')]//table"), timeout=15)
 
@@ -459,7 +431,7 @@ def extract_status_table_rows(driver):
 # UNIT MODAL
 # =========================================================
 def open_unit_modal(driver):
-    btn = wait_clickable(driver, (By.XPATH, "//button[contains(.,'Lihat Terperinci Unit') or contains(.,'LIHAT TERPERINCI UNIT')]"), timeout=12)
+    btn = wait_clickable(driver, (By.XPATH, "//button[contains(.,'Lihat Terperinci Unit') or contains(.,'LIHAT TERPERINCI UNIT')]"), timeout=12, observe=False)
     safe_click(driver, btn)
     time.sleep(CONFIG["DELAY_PAGE_LOAD"])
     ok("Unit modal opened")
@@ -471,7 +443,7 @@ def ensure_paparan_senarai(driver):
             ok("Paparan Senarai already active")
             return True
 
-        btn = wait_clickable(driver, (By.XPATH, "//button[contains(@class,'view-btn') and @title='Paparan Senarai']"), timeout=10)
+        btn = wait_clickable(driver, (By.XPATH, "//button[contains(@class,'view-btn') and @title='Paparan Senarai']"), timeout=10, observe=False)
         safe_click(driver, btn)
         time.sleep(CONFIG["DELAY_CLICK"])
         ok("Clicked Paparan Senarai")
@@ -731,6 +703,9 @@ def scrape_one_pemaju(pemaju_name: str):
 
         ok(f"SUMMARY: Projects={len(project_master_rows)}, HouseTypes={len(house_type_rows)}, UnitRows={len(unit_detail_rows)}")
         ok("DONE pemaju scrape")
+        limit = LIMITER.status()
+        info(f"Rate limit {limit['rate']:.2f} req/s, wait latency ~{limit['latency'] or 0:.1f}s, "
+             f"{limit['failures']}/{limit['requests']} failures/requests (shared)")
 
     except Exception as e:
         fail(f"Fatal pemaju scrape error: {e}")
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+from analytics import (
+    MARKET_LABEL, PRICE_DIMENSIONS, build_comparison, build_search_index, build_spatial_index,
+    compute_sales_velocity, nearest_projects, price_percentile_table, price_segments, projects_within,
+    search_positions,
+)
+from publish_data import LIVE_TABLE_COLUMNS, build_price_percentiles
+
+
+def pricing_frame(psm):
+    n = len(psm)
+    return pd.DataFrame({
+        "project_code": [f"1-{i}" for i in range(n)],
+        "psm_mid": psm,
+        "price_mid": [300000.0] * n,
+        "total_units": [10] * n,
+        "location_district": ["Jasin"] * n,
+        "house_type": ["Teres"] * n,
+        "pemaju_name": ["1 DEV SDN BHD"] * n,
+        "num_rooms": [3] * n,
+        "take_up_rate": [50.0] * n,
+    })
+
+
+# =========================================================
+# PRICE PER M²
+# =========================================================
+def test_price_percentile_table_weights_by_units():
+    df = pricing_frame([1000.0, 2000.0, 3000.0])
+    df["total_units"] = [1, 1, 8]
+    table = price_percentile_table(df)
+    assert table["group_name"].tolist() == ["All"]
+    assert table["units"].iat[0] == 10
+    assert table["psm_p50"].iat[0] == 3000.0
+
+def test_price_percentile_table_empty_and_unknown_prices():
+    for df in (pricing_frame([]), pricing_frame([np.nan, np.nan])):
+        for dim in (None, *PRICE_DIMENSIONS.values()):
+            assert price_percentile_table(df, dim).empty
+        percentiles = build_price_percentiles(df)
+        assert percentiles.empty
+        assert list(percentiles.columns) == LIVE_TABLE_COLUMNS["price_percentiles"]
+        assert price_segments(df)["psm_p50"].isna().all()
+
+
+# =========================================================
+# SALES VELOCITY
+# =========================================================
+def test_compute_sales_velocity_windows():
+    hist = pd.DataFrame({
+        "developer_name": ["1 DEV"] * 4,
+        "project_code": ["1-1"] * 4,
+        "project_name": ["TAMAN A"] * 4,
+        "scraped_date": ["2025-01-01", "2025-01-25", "2025-01-25", "2025-02-01"],
+        "units_sold": [10, 15, 16, 20],
+        "total_units": [100] * 4,
+    })
+    out = compute_sales_velocity(hist)
+    assert len(out) == 1
+    row = out.iloc[0]
+    assert row["units_unsold"] == 80
+    assert row["history_days"] == 31
+    assert row["sold_7d"] == 4      # vs the last 2025-01-25 row (duplicates keep the last)
+    assert row["sold_30d"] == 10    # vs 2025-01-01, the latest snapshot on or before 30 days back
+    assert row["sold_90d"] == 0     # no snapshot that far back counts as 0
+
+def test_compute_sales_velocity_empty():
+    cols = ["developer_name", "project_code", "project_name", "scraped_date", "units_sold", "total_units"]
+    out = compute_sales_velocity(pd.DataFrame(columns=cols))
+    assert out.empty and "sold_30d" in out.columns
+
+
+# =========================================================
+# SEARCH INDEX
+# =========================================================
+def search_frame():
+    return pd.DataFrame({
+        "Kod Projek & Nama Projek": ["31199-1 TAMAN BANDAR BAHARU KIJAL", "7305-25 TAMAN DESA BERTAM", "20165-8 RESIDENSI KOTA SYAHBANDAR"],
+        "Pemaju": ["ANJURAN LAGENDA SDN BHD", "SCIENTEX SDN BHD", "PARKLAND SDN BHD"],
+        "Daerah": ["Melaka Tengah", "Alor Gajah", "Melaka Tengah"],
+    })
+
+def test_search_positions_terms_and_typos():
+    index = build_search_index(search_frame())
+    assert search_positions(index, "taman").tolist() == [0, 1]
+    assert search_positions(index, "taman melaka").tolist() == [0]
+    assert search_positions(index, "bandar").tolist() == [0, 2]  # inside "syahbandar" too
+    assert search_positions(index, "meaka").tolist() == [0, 2]  # typo
+    assert search_positions(index, "zzzz").tolist() == []
+
+def test_search_positions_short_terms_blank_and_punctuation():
+    df = search_frame()
+    index = build_search_index(df)
+    # 1-2 char terms are substrings, like the original str.contains search
+    expected = np.flatnonzero(df.apply(lambda c: c.str.lower().str.contains("x", regex=False)).any(axis=1))
+    assert search_positions(index, "x").tolist() == expected.tolist()
+    assert search_positions(index, "ah").tolist() == [0, 1, 2]
+    assert search_positions(index, "   ").tolist() == [0, 1, 2]
+    assert search_positions(index, "&&").tolist() == []
+
+
+# =========================================================
+# COMPARISON
+# =========================================================
+def test_build_comparison_market_includes_unknown_groups():
+    df = pd.DataFrame({
+        "Kod Projek & Nama Projek": ["1-1 A", "1-2 B", "2-1 C", "3-1 D"],
+        "Daerah": pd.Categorical(["Jasin", "Jasin", "Alor Gajah", None]),
+        "Total Unit": [10, 20, 40, 30],
+        "Unit Terjual": [5, 5, 10, 30],
+        "Unit Belum Jual": [5, 15, 30, 0],
+        "Jumlah Jualan (RM)": [1.0e6, 1.0e6, 2.0e6, 6.0e6],
+        "Unit Bumi": [2, 4, 8, 6],
+        "Unit Non Bumi": [8, 16, 32, 24],
+    })
+    matrix = build_comparison(df, "Daerah", ["Jasin", "Alor Gajah"])
+    assert matrix.index.tolist() == ["Jasin", "Alor Gajah", MARKET_LABEL]
+    assert matrix.attrs["n_groups"] == 2
+    market = matrix.loc[MARKET_LABEL]
+    assert (market["projects"], market["units"], market["sold"]) == (4, 100, 50)
+    assert market["take_up"] == 50.0
+    assert matrix.loc["Jasin", "rank_take_up"] == 1
+    assert matrix.loc["Alor Gajah", "rank_sales_rm"] == 1
+
+
+# =========================================================
+# SPATIAL INDEX
+# =========================================================
+def test_spatial_index_radius_and_nearest():
+    df = pd.DataFrame({
+        "latitude": [2.19, 2.20, 2.30, np.nan, 2.80],
+        "longitude": [102.25, 102.26, 102.25, 102.25, 101.90],
+    })
+    index = build_spatial_index(df)
+    pos, dist = projects_within(index, 2.19, 102.25, 5.0)
+    assert pos.tolist() == [0, 1]
+    assert dist[0] == 0.0 and 1.0 < dist[1] < 2.0
+
+    pos, dist = nearest_projects(index, 2.19, 102.25, k=3)
+    assert pos.tolist() == [0, 1, 2]
+    assert np.all(np.diff(dist) >= 0)
+    # Missing coordinates are never indexed; eligible filters the candidates
+    eligible = np.array([False, True, True, True, True])
+    assert nearest_projects(index, 2.19, 102.25, k=10, eligible=eligible)[0].tolist() == [1, 2, 4]
+
+def test_spatial_index_empty():
+    index = build_spatial_index(pd.DataFrame({"latitude": [np.nan], "longitude": [np.nan]}))
+    assert projects_within(index, 2.19, 102.25, 5.0)[0].size == 0
+    assert nearest_projects(index, 2.19, 102.25)[0].size == 0
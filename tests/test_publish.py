@@ -0,0 +1,250 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import synth_data
+from analytics import (
+    OVERVIEW_AS_OF_SQL, PROJECT_OVERVIEW_SQL, PROJECT_SUMMARY_COLUMNS, build_project_overview,
+    create_display_name, finalize_project_overview,
+)
+from publish_data import (
+    HISTORY_ADDED_TABLE, HISTORY_COLUMNS, LIVE_TABLE_COLUMNS, PREVIOUS_SUFFIX, STAGING_SUFFIX, TYPE_PARSERS,
+    _parse_coordinates, backfill_history, build_unit_events, get_engine, load_legacy_history, parse_money,
+    process_and_upload, rollback_publish, table_exists,
+)
+
+
+# =========================================================
+# PARSERS
+# =========================================================
+def test_parse_money():
+    raw = pd.Series(["RM 1,200.00", "350,000", " rm12 ", "", "-", "RM 1,200.00 (promo)", None])
+    out = parse_money(raw)
+    assert out.iloc[:3].tolist() == [1200.0, 350000.0, 12.0]
+    assert out.iloc[3:].isna().all()
+
+def test_typed_parsers():
+    area = TYPE_PARSERS["area"](pd.Series(["86", "154 - 161", "0 - 194", "x"]))
+    assert area.iloc[:3].tolist() == [86.0, 157.5, 194.0]
+    assert np.isnan(area.iloc[3])
+
+    count = TYPE_PARSERS["count"](pd.Series(["4", "3, 4", "0", "-"]))
+    assert count.iloc[:2].tolist() == [4.0, 3.0]
+    assert count.iloc[2:].isna().all()
+
+    assert TYPE_PARSERS["date"](pd.Series(["17/08/2017"])).iloc[0] == pd.Timestamp("2017-08-17")
+    permit = TYPE_PARSERS["permit_date"](pd.Series(["Mula: 01 Nov 2016  Tamat: 31 Okt 2017", "-"]))
+    assert permit.iloc[0] == pd.Timestamp("2017-10-31")
+    assert pd.isna(permit.iloc[1])
+
+def test_parse_coordinates():
+    coords = _parse_coordinates(pd.Series([
+        "https://maps.google.com/maps?q=2.305556,102.188889",
+        "https://www.google.com/maps/@2.2,102.3,15z",
+        "https://maps.google.com/maps?q=0,0",
+        "https://maps.google.com/maps?q=95.1,102.1",
+        "",
+    ]))
+    assert coords.iloc[0].tolist() == [2.305556, 102.188889]
+    assert coords.iloc[1].tolist() == [2.2, 102.3]
+    assert coords.iloc[2:].isna().all().all()
+
+
+# =========================================================
+# UNIT EVENTS
+# =========================================================
+def test_build_unit_events():
+    def unit(date, unit_no, status, price, bumi="Tidak"):
+        return {"project_code": "1-1", "lot_no": "PT 1", "unit_no": unit_no, "pemaju_name": "1 DEV",
+                "scraped_date": date, "status": status, "bumi_quota": bumi, "price": price, "price_spjb": price}
+    df = pd.DataFrame([
+        unit("2025-01-01", "A1", "Belum Dijual", 300000.0),
+        unit("2025-01-01", "A2", "Belum Dijual", 300000.0),
+        unit("2025-01-08", "A1", "Telah Dijual", 300000.0),
+        unit("2025-01-08", "A2", "Belum Dijual", 290000.0, bumi="Ya"),
+        unit("2025-01-08", "A3", "Belum Dijual", 310000.0),
+    ])
+    events = build_unit_events(df)
+    assert list(events.columns) == LIVE_TABLE_COLUMNS["unit_events"]
+    got = sorted(zip(events["unit_no"], events["event_type"]))
+    assert got == [("A1", "sold"), ("A2", "bumi_quota_change"), ("A2", "price_change"),
+                   ("A2", "spjb_change"), ("A3", "new_unit")]
+    # The first snapshot of a project is its baseline
+    assert build_unit_events(df[df["scraped_date"] == "2025-01-01"]).empty
+
+
+# =========================================================
+# SMOKE: synthetic tree -> local SQLite publish, swap, rollback
+# =========================================================
+@pytest.fixture
+def published(tmp_path):
+    stats = synth_data.generate(str(tmp_path), developers=3, projects_per_developer=2, units_per_project=20,
+                                weeks=3, scrape_rate=1.0, seed=7)
+    engine = get_engine("sqlite", str(tmp_path / "test.db"))
+    data_dir = str(tmp_path / "pemaju")
+    events_path = str(tmp_path / "unit_events.parquet")
+    process_and_upload(engine, data_dir, events_path)
+    yield engine, data_dir, events_path, stats
+    engine.dispose()
+
+def scalar(engine, sql):
+    with engine.connect() as conn:
+        return conn.execute(text(sql)).scalar()
+
+def test_publish_into_sqlite(published):
+    engine, _, events_path, stats = published
+    with engine.connect() as conn:
+        for table in LIVE_TABLE_COLUMNS:
+            assert table_exists(conn, table), table
+            assert not table_exists(conn, table + STAGING_SUFFIX), table
+    assert scalar(engine, "SELECT COUNT(*) FROM units_detail") == stats["unit_rows"]
+    assert scalar(engine, "SELECT COUNT(*) FROM unit_events WHERE event_type = 'sold'") > 0
+    assert os.path.exists(events_path)
+    assert scalar(engine, "SELECT COUNT(*) FROM project_summary") == stats["projects"]
+    assert scalar(engine, "SELECT COUNT(*) FROM developer_summary") == stats["developers"]
+    # history_logs: one row per project per snapshot date
+    assert scalar(engine, "SELECT COUNT(*) FROM history_logs") == stats["projects"] * stats["weeks"]
+    assert scalar(engine, "SELECT COUNT(DISTINCT project_code || scraped_date) FROM history_logs") == \
+        stats["projects"] * stats["weeks"]
+    assert scalar(engine, "SELECT COUNT(*) FROM data_version") == 1
+
+def test_republish_swap_and_rollback(published):
+    engine, data_dir, events_path, stats = published
+    with pytest.raises(RuntimeError):
+        rollback_publish(engine)  # first publish: nothing to roll back to
+
+    n_history = stats["projects"] * stats["weeks"]
+    last_date = scalar(engine, "SELECT MAX(scraped_date) FROM history_logs")
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM history_logs WHERE scraped_date = :d"), {"d": last_date})
+        conn.execute(text("DROP TABLE unit_events"))  # as if unit_events were a new table
+    version = scalar(engine, "SELECT version FROM data_version")
+
+    process_and_upload(engine, data_dir, events_path)
+    assert scalar(engine, "SELECT COUNT(*) FROM history_logs") == n_history
+    assert scalar(engine, f"SELECT COUNT(*) FROM {HISTORY_ADDED_TABLE}") == stats["projects"]
+    with engine.connect() as conn:
+        assert table_exists(conn, "units_detail" + PREVIOUS_SUFFIX)
+        assert not table_exists(conn, "unit_events" + PREVIOUS_SUFFIX)
+
+    rollback_publish(engine)
+    # Tables with a previous generation are swapped back; the rolled-back history rows go
+    assert scalar(engine, "SELECT COUNT(*) FROM units_detail") == stats["unit_rows"]
+    assert scalar(engine, "SELECT COUNT(*) FROM history_logs") == n_history - stats["projects"]
+    assert scalar(engine, "SELECT version FROM data_version") != version
+    with engine.connect() as conn:
+        assert table_exists(conn, "unit_events")
+        assert not table_exists(conn, HISTORY_ADDED_TABLE)
+
+
+# =========================================================
+# HISTORY BACKFILL
+# =========================================================
+LEGACY_HEADER = "Date,Developer,Project,Total_Units,Sold_Units,Unsold_Units,Take_Up_Rate\n"
+
+def test_load_legacy_history_rejects_inconsistent_rows(tmp_path):
+    path = tmp_path / "history_tracker.csv"
+    path.write_text(LEGACY_HEADER + "\n".join([
+        "12/21/2025,FIXMAX,19373-1 TAMAN VISTA,131,131,0,100",
+        "2025-12-14,FIXMAX,19373-1 TAMAN VISTA,131,120,11,91.6",
+        "12/1/2025,FIXMAX,19373-1 TAMAN VISTA,131,21,110,100",   # take-up of another date
+        "12/7/2025,FIXMAX,19373-1 TAMAN VISTA,131,100,11,76.3",  # sold + unsold != total
+        "12/8/2025,FIXMAX,19373-1 TAMAN VISTA,131,x,11,76.3",    # unreadable
+    ]) + "\n", encoding="utf-8")
+    df = load_legacy_history(str(path), {"19373": "19373 FIXMAX SDN BHD"})
+    assert df["scraped_date"].tolist() == ["2025-12-21", "2025-12-14"]
+    assert df["units_unsold"].tolist() == [0, 11]
+    assert set(df["developer_name"]) == {"19373 FIXMAX SDN BHD"}
+    assert list(df.columns) == HISTORY_COLUMNS
+
+def test_backfill_history_priority_dedupe_and_rerun(published, tmp_path):
+    engine, data_dir, _, stats = published
+    n_snapshot = stats["projects"] * stats["weeks"]
+    with engine.connect() as conn:
+        first = conn.execute(text("SELECT * FROM history_logs ORDER BY project_code, scraped_date LIMIT 1")).mappings().one()
+    code, name, developer = first["project_code"], first["project_name"], first["developer_name"]
+    label = f"{code} {name}"
+    with engine.begin() as conn:
+        # A snapshot date overwritten by hand, a date only history_logs knows, and a duplicate row
+        conn.execute(text("UPDATE history_logs SET units_sold = 0 WHERE project_code = :c AND scraped_date = :d"),
+                     {"c": code, "d": first["scraped_date"]})
+        for _ in range(2):
+            conn.execute(text("INSERT INTO history_logs (project_code, project_name, developer_name, scraped_date, "
+                              "total_units, units_sold, units_unsold, take_up_rate) "
+                              "VALUES (:c, :n, :dev, '2020-01-01', 10, 4, 6, 40.0)"),
+                         {"c": code, "n": name, "dev": developer})
+    legacy = tmp_path / "history_tracker.csv"
+    legacy.write_text(LEGACY_HEADER + "\n".join([
+        f"{first['scraped_date']},OLD NAME,{label},10,1,9,10",  # snapshot date: the snapshot wins
+        f"1/1/2020,OLD NAME,{label},10,2,8,20",                # history_logs date: the existing row wins
+        f"6/1/2019,OLD NAME,{label},10,3,7,30",                # only the legacy CSV has it
+        f"6/8/2019,OLD NAME,{label},10,3,7,99",                # rejected
+    ]) + "\n", encoding="utf-8")
+
+    history = backfill_history(engine, data_dir, str(legacy))
+    assert len(history) == n_snapshot + 2
+    assert not history.duplicated(["project_code", "scraped_date"]).any()
+    sold = history[history["project_code"] == code].set_index("scraped_date")["units_sold"]
+    assert sold["2019-06-01"] == 3
+    assert sold["2020-01-01"] == 4
+    assert sold[str(first["scraped_date"])] == first["units_sold"]
+    assert "2019-06-08" not in sold.index
+    assert history.loc[history["scraped_date"] == "2019-06-01", "developer_name"].tolist() == [developer]
+    assert scalar(engine, "SELECT COUNT(*) FROM history_logs") == n_snapshot + 2
+
+    # Rerunning rebuilds the same rows
+    again = backfill_history(engine, data_dir, str(legacy))
+    assert scalar(engine, "SELECT COUNT(*) FROM history_logs") == n_snapshot + 2
+    pd.testing.assert_frame_equal(again, history)
+
+
+# =========================================================
+# DASHBOARD OVERVIEW: summary table / SQL / pandas fallback agree
+# =========================================================
+def test_overview_sql_matches_pandas(published):
+    engine = published[0]
+    with engine.connect() as conn:
+        from_sql = finalize_project_overview(pd.read_sql(text(PROJECT_OVERVIEW_SQL), conn))
+        df_summary = pd.read_sql(text("SELECT * FROM project_summary"), conn)
+        df_master = pd.read_sql(text("SELECT * FROM projects_master"), conn)
+        df_units = pd.read_sql(text("SELECT * FROM units_detail"), conn)
+    df_summary["Kod Projek & Nama Projek"] = create_display_name(df_summary)
+    from_summary = finalize_project_overview(df_summary.rename(columns=PROJECT_SUMMARY_COLUMNS))
+    df_master["Kod Projek & Nama Projek"] = create_display_name(df_master)
+    df_units["Kod Projek & Nama Projek"] = create_display_name(df_units)
+    from_pandas = build_project_overview(df_master, df_units)
+
+    assert len(from_pandas) == published[3]["projects"]
+    assert from_pandas["Unit Terjual"].sum() > 0
+    pd.testing.assert_frame_equal(from_sql, from_pandas, check_dtype=False)
+    pd.testing.assert_frame_equal(from_summary, from_pandas, check_dtype=False)
+
+def overview_as_of(conn, as_of):
+    df = pd.read_sql(text(OVERVIEW_AS_OF_SQL), conn, params={"as_of": as_of})
+    df["Kod Projek & Nama Projek"] = create_display_name(df)
+    return finalize_project_overview(df.rename(columns=PROJECT_SUMMARY_COLUMNS))
+
+def test_overview_as_of_sql(published):
+    engine, _, _, stats = published
+    with engine.connect() as conn:
+        dates = pd.read_sql(text("SELECT DISTINCT scraped_date FROM history_logs ORDER BY 1"), conn)["scraped_date"]
+        df_summary = pd.read_sql(text("SELECT * FROM project_summary"), conn)
+        history = pd.read_sql(text("SELECT * FROM history_logs"), conn)
+        latest = overview_as_of(conn, dates.iloc[-1])
+        first = overview_as_of(conn, dates.iloc[0])
+        assert overview_as_of(conn, "1900-01-01").empty
+    df_summary["Kod Projek & Nama Projek"] = create_display_name(df_summary)
+    current = finalize_project_overview(df_summary.rename(columns=PROJECT_SUMMARY_COLUMNS))
+
+    # As of the last snapshot it is the current overview, except that Unit Belum Jual is total - sold
+    pd.testing.assert_frame_equal(latest.drop(columns="Unit Belum Jual"), current.drop(columns="Unit Belum Jual"),
+                                  check_dtype=False)
+    assert (latest["Unit Belum Jual"] == latest["Total Unit"] - latest["Unit Terjual"]).all()
+    # As of the first snapshot: that date's history rows only
+    first_rows = history[history["scraped_date"] == dates.iloc[0]]
+    assert len(first) == stats["projects"]
+    assert first["Unit Terjual"].sum() == first_rows["units_sold"].sum()
+    assert first["Unit Terjual"].sum() < latest["Unit Terjual"].sum()
@@ -0,0 +1,106 @@
+import multiprocessing
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import BACKOFF, DECREASE_INTERVAL, RATE_STEP, SLOWDOWN, RateLimiter
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() just moves the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+# =========================================================
+# TOKEN BUCKET
+# =========================================================
+def test_bucket_burst_then_refill(tmp_path, clock):
+    limiter = RateLimiter(str(tmp_path / "rate.json"), rate=2.0, burst=2, max_rate=2.0)
+    assert limiter.acquire() == 0 and limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(0.5)   # one token at 2 req/s
+    clock.sleep(10)                                  # refills up to burst only
+    assert limiter.acquire() == 0 and limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(0.5)
+    assert limiter.status()["requests"] == 6
+
+
+# =========================================================
+# AIMD
+# =========================================================
+def test_aimd_increase_and_decrease_bounds(tmp_path, clock):
+    limiter = RateLimiter(str(tmp_path / "rate.json"), rate=1.0, min_rate=0.2, max_rate=1.05, target_latency=5.0)
+    limiter.record(1.0)
+    assert limiter.status()["rate"] == pytest.approx(1.0 + RATE_STEP)
+    for _ in range(10):
+        limiter.record(1.0)
+    assert limiter.status()["rate"] == 1.05          # capped at max_rate
+
+    limiter.record(ok=False)
+    assert limiter.status()["rate"] == pytest.approx(1.05 * BACKOFF)
+    limiter.record(ok=False)                         # within DECREASE_INTERVAL: backs off once
+    assert limiter.status()["rate"] == pytest.approx(1.05 * BACKOFF)
+    for _ in range(5):
+        clock.sleep(DECREASE_INTERVAL)
+        limiter.record(ok=False)
+    status = limiter.status()
+    assert status["rate"] == 0.2 and status["failures"] == 7   # floored at min_rate
+
+def test_aimd_slow_responses(tmp_path, clock):
+    limiter = RateLimiter(str(tmp_path / "rate.json"), rate=1.0, target_latency=5.0)
+    limiter.record(20.0)                             # latency average above target
+    assert limiter.status()["rate"] == pytest.approx(SLOWDOWN)
+    clock.sleep(DECREASE_INTERVAL)
+    with pytest.raises(TimeoutError):
+        with limiter.observe():
+            raise TimeoutError
+    assert limiter.status()["rate"] == pytest.approx(SLOWDOWN * BACKOFF)
+
+def test_rate_carries_over_and_respects_new_bounds(tmp_path, clock):
+    path = str(tmp_path / "rate.json")
+    RateLimiter(path, rate=1.0).record(ok=False)
+    assert RateLimiter(path, rate=1.0).status()["rate"] == pytest.approx(BACKOFF)
+    assert RateLimiter(path, rate=1.0, min_rate=0.8).status()["rate"] == 0.8
+
+
+# =========================================================
+# SHARED BETWEEN PROCESSES
+# =========================================================
+def _worker(path, n, stamps):
+    limiter = RateLimiter(path, rate=10.0, burst=1, max_rate=10.0)
+    for _ in range(n):
+        limiter.acquire()
+        stamps.put(time.time())
+
+def test_processes_share_one_bucket(tmp_path):
+    path = str(tmp_path / "rate.json")
+    ctx = multiprocessing.get_context("spawn")
+    stamps = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, 5, stamps)) for _ in range(2)]
+    for p in procs:
+        p.start()
+    got = sorted(stamps.get(timeout=60) for _ in range(10))
+    for p in procs:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+    # One bucket (burst 1, 10 req/s) for both: grants are 1/10 s apart (half that
+    # leaves room for a worker descheduled before it stamps) and none are lost
+    assert min(b - a for a, b in zip(got, got[1:])) >= 0.5 / 10
+    assert RateLimiter(path, rate=10.0, burst=1, max_rate=10.0).status()["requests"] == 10
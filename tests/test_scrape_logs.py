@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from scrape_logs import analyse_logs, developer_summary, parse_log, project_summary
+
+
+def write_log(log_dir, pemaju, batch, visit_seconds, finish=True, errors=0):
+    """A scraper log with one project visit per entry of visit_seconds."""
+    t = datetime.strptime(batch, "%Y%m%d_%H%M%S")
+    lines = []
+
+    def log(msg, level="INFO", after=0):
+        nonlocal t
+        t += timedelta(seconds=after)
+        lines.append(f"{t:%Y-%m-%d %H:%M:%S},000 | {level} | {msg}")
+
+    log(f"START pemaju scrape: {pemaju}")
+    log("Results table loaded", after=10)
+    for n, seconds in enumerate(visit_seconds, 1):
+        step = seconds / 5
+        log(f"[{n}] Open: 1-{n} TAMAN {n}")
+        log("Opened project detail", after=step)
+        log("Maklumat Projek scraped", after=step)
+        log("Status table rows = 3", after=step)
+        log("Unit rows scraped = 20")
+        log("Unit details scraped", after=step)
+        log("Returned to listing", after=step)
+    for _ in range(errors):
+        log("Timeout waiting for modal", level="ERROR")
+        lines.append("Traceback (most recent call last):")
+    if finish:
+        log(f"SUMMARY: Projects={len(visit_seconds)}, HouseTypes=3, UnitRows={20 * len(visit_seconds)}", after=1)
+        log(f"DONE pemaju scrape: {pemaju}")
+    path = log_dir / f"KPKT_SCRAPE_{pemaju}_{batch}.log"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def test_parse_log_steps_and_summary(tmp_path):
+    path = write_log(tmp_path, "1_DEV", "20250101_080000", [100, 50])
+    run, projects = parse_log(str(path), "1_DEV", "20250101_080000")
+    assert run["completed"] and run["errors"] == 0
+    assert run["setup_seconds"] == 10
+    assert (run["projects"], run["unit_rows"], run["summary_projects"]) == (2, 40, 2)
+    assert run["seconds"] == 10 + 100 + 50 + 1
+    assert [p["project_code"] for p in projects] == ["1-1", "1-2"]
+    assert projects[0]["seconds"] == 100 and projects[0]["units_s"] == 20
+    assert projects[1]["unit_rows"] == 20 and projects[1]["completed"]
+
+def test_analyse_logs_flags_regressions(tmp_path):
+    write_log(tmp_path, "1_DEV", "20250101_080000", [100, 100])
+    write_log(tmp_path, "1_DEV", "20250108_080000", [100, 110])       # +10s: within the threshold
+    write_log(tmp_path, "1_DEV", "20250115_080000", [200, 200])       # 2x slower
+    write_log(tmp_path, "2_DEV", "20250101_080000", [60])
+    write_log(tmp_path, "2_DEV", "20250108_080000", [60], errors=2)   # new ERROR lines
+    write_log(tmp_path, "2_DEV", "20250115_080000", [60], finish=False)
+    (tmp_path / "unrelated.log").write_text("not a scraper log\n")
+
+    df_runs, df_projects = analyse_logs(str(tmp_path))
+    assert len(df_runs) == 6 and len(df_projects) == 9
+    flags = {(r.pemaju, r.batch): (r.duration_regressed, r.errors_regressed, r.regressed)
+             for r in df_runs.itertuples()}
+    assert flags[("1_DEV", "20250101_080000")] == (False, False, False)
+    assert flags[("1_DEV", "20250108_080000")] == (False, False, False)
+    assert flags[("1_DEV", "20250115_080000")] == (True, False, True)
+    assert flags[("2_DEV", "20250108_080000")] == (False, True, True)
+    assert flags[("2_DEV", "20250115_080000")][2]  # did not finish
+
+    devs = developer_summary(df_runs).set_index("pemaju")
+    assert devs.loc["1_DEV", "runs"] == 3 and devs.loc["1_DEV", "regressions"] == 1
+    assert devs.loc["2_DEV", "errors"] == 2
+    projects = project_summary(df_projects)
+    first = projects[projects["project_code"] == "1-1"].iloc[0]
+    assert (first["visits"], first["developers"]) == (6, 2)
+
+def test_analyse_logs_empty(tmp_path):
+    df_runs, df_projects = analyse_logs(str(tmp_path / "missing"))
+    assert df_runs.empty and df_projects.empty